@@ -1,6 +1,7 @@
 import logging
 
 from pcapi.admin.base_configuration import BaseAdminView
+from pcapi.models.feature import publish_features_change
 
 
 logger = logging.getLogger(__name__)
@@ -21,3 +22,8 @@ class FeatureView(BaseAdminView):
     def on_model_change(self, form, model, is_created):
         logger.info("Activated or deactivated feature flag", extra={"feature": model.name, "active": model.isActive})
         return super().on_model_change(form=form, model=model, is_created=is_created)
+
+    def after_model_change(self, form, model, is_created):
+        # Other processes would otherwise see the change once their snapshot expires.
+        publish_features_change()
+        return super().after_model_change(form=form, model=model, is_created=is_created)
@@ -0,0 +1,32 @@
+"""add_booking_outbox_event
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3b9e4f5c8a21"
+down_revision = "5ff1b52e2f08"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "booking_outbox_event",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("bookingId", sa.BigInteger(), nullable=False),
+        sa.Column("type", sa.Text(), nullable=False),
+        sa.Column("dateCreated", sa.DateTime(), nullable=False),
+        sa.Column("availableAt", sa.DateTime(), nullable=False),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("lastError", sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(["bookingId"], ["booking.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_booking_outbox_event_bookingId"), "booking_outbox_event", ["bookingId"], unique=False)
+    op.create_index(op.f("ix_booking_outbox_event_availableAt"), "booking_outbox_event", ["availableAt"], unique=False)
+
+
+def downgrade():
+    op.drop_table("booking_outbox_event")
@@ -0,0 +1,25 @@
+"""add_deposit_spending
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7d2c1e0b4f93"
+down_revision = "3b9e4f5c8a21"
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = ("dnSpentAmount", "dnDigitalSpentAmount", "dnPhysicalSpentAmount", "dnUsedAmount")
+
+
+def upgrade():
+    # Amounts are computed afterwards, with the `recompute_deposit_spending` command.
+    for column in COLUMNS:
+        op.add_column("deposit", sa.Column(column, sa.Numeric(10, 2), nullable=False, server_default="0"))
+
+
+def downgrade():
+    for column in COLUMNS:
+        op.drop_column("deposit", column)
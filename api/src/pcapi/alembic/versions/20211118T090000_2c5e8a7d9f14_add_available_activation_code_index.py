@@ -0,0 +1,26 @@
+"""add_available_activation_code_index
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "2c5e8a7d9f14"
+down_revision = "7d2c1e0b4f93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("COMMIT")
+    op.execute(
+        """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS
+            "ix_activation_code_available_stockId"
+            ON activation_code ("stockId", id)
+            WHERE "bookingId" IS NULL
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("ix_activation_code_available_stockId", table_name="activation_code")
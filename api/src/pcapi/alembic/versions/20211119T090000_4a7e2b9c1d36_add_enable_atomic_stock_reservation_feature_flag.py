@@ -0,0 +1,20 @@
+"""add_enable_atomic_stock_reservation_feature_flag
+"""
+from pcapi.models import feature
+
+
+# revision identifiers, used by Alembic.
+revision = "4a7e2b9c1d36"
+down_revision = "2c5e8a7d9f14"
+branch_labels = None
+depends_on = None
+
+FLAG = feature.FeatureToggle.ENABLE_ATOMIC_STOCK_RESERVATION
+
+
+def upgrade() -> None:
+    feature.add_feature_to_database(FLAG)
+
+
+def downgrade() -> None:
+    feature.remove_feature_from_database(FLAG)
@@ -0,0 +1,20 @@
+"""add_use_denormalized_deposit_spending_feature_flag
+"""
+from pcapi.models import feature
+
+
+# revision identifiers, used by Alembic.
+revision = "8b3f6d1e5a72"
+down_revision = "4a7e2b9c1d36"
+branch_labels = None
+depends_on = None
+
+FLAG = feature.FeatureToggle.USE_DENORMALIZED_DEPOSIT_SPENDING
+
+
+def upgrade() -> None:
+    feature.add_feature_to_database(FLAG)
+
+
+def downgrade() -> None:
+    feature.remove_feature_from_database(FLAG)
@@ -1,6 +1,8 @@
 import ftplib
-from io import BytesIO
 import logging
+import tempfile
+from typing import Iterator
+from typing import Optional
 from typing import Pattern
 from zipfile import ZipFile
 
@@ -10,6 +12,10 @@ from pcapi.domain.titelive import put_today_file_at_end_of_list
 
 logger = logging.getLogger(__name__)
 
+# The same connection is used for the whole synchronization, see
+# `connect_to_titelive_ftp()` and `close_titelive_ftp()`.
+_ftp_connection: Optional[ftplib.FTP] = None
+
 
 def get_titelive_ftp():
     if settings.TITELIVE_FTP_URI is None:
@@ -17,22 +23,86 @@ def get_titelive_ftp():
     return ftplib.FTP(settings.TITELIVE_FTP_URI)
 
 
-def connect_to_titelive_ftp():
+def connect_to_titelive_ftp() -> ftplib.FTP:
+    """Return an authenticated connection to the TiteLive FTP server.
+
+    The connection is reused by subsequent calls, as long as it is
+    alive, until `close_titelive_ftp()` is called.
+    """
+    global _ftp_connection  # pylint: disable=global-statement
+    if _ftp_connection is not None:
+        try:
+            _ftp_connection.voidcmd("NOOP")
+            return _ftp_connection
+        except ftplib.all_errors:
+            logger.info("Lost connection to TiteLive FTP server, reconnecting")
+            close_titelive_ftp()
+
     ftp_titelive = get_titelive_ftp()
     if settings.TITELIVE_FTP_USER is None or settings.TITELIVE_FTP_PWD is None:
         raise ValueError("Informations de connexion au FTP Titelive non spécifiée.")
     ftp_titelive.login(settings.TITELIVE_FTP_USER, settings.TITELIVE_FTP_PWD)
+    _ftp_connection = ftp_titelive
     return ftp_titelive
 
 
+def close_titelive_ftp() -> None:
+    global _ftp_connection  # pylint: disable=global-statement
+    if _ftp_connection is None:
+        return
+    try:
+        _ftp_connection.quit()
+    except ftplib.all_errors:
+        _ftp_connection.close()
+    _ftp_connection = None
+
+
 def get_zip_file_from_ftp(zip_file_name: str, folder_name: str) -> ZipFile:
-    data_file = BytesIO()
-    data_file.name = zip_file_name
+    """Download a ZIP archive and return it.
+
+    The archive is kept in memory if it is small enough, and spooled
+    to a temporary file otherwise (see `TITELIVE_FTP_SPOOL_MAX_SIZE`).
+    """
+    # The temporary file is deleted when it is garbage-collected, i.e.
+    # when the caller drops the returned `ZipFile`.
+    data_file = tempfile.SpooledTemporaryFile(  # pylint: disable=consider-using-with
+        max_size=settings.TITELIVE_FTP_SPOOL_MAX_SIZE
+    )
     file_path = "RETR " + folder_name + "/" + zip_file_name
     logger.info("Downloading file %s", file_path)
     connect_to_titelive_ftp().retrbinary(file_path, data_file.write)
+    data_file.seek(0)
     # FIXME: this should be a with statement. Requires titelive sync to be rewritten
-    return ZipFile(data_file, "r")  # pylint: disable=consider-using-with
+    zip_file = ZipFile(data_file, "r")  # pylint: disable=consider-using-with
+    zip_file.filename = zip_file_name
+    return zip_file
+
+
+def stream_lines_from_ftp(file_name: str, folder_name: str, encoding: str) -> Iterator[str]:
+    """Yield lines of a text file as they are downloaded.
+
+    The connection cannot be used for anything else until the
+    iteration is over (or the generator is closed).
+    """
+    ftp_titelive = connect_to_titelive_ftp()
+    file_path = "RETR " + folder_name + "/" + file_name
+    logger.info("Streaming file %s", file_path)
+    transfer_complete = False
+    try:
+        with ftp_titelive.transfercmd(file_path) as data_connection:
+            with data_connection.makefile("r", encoding=encoding) as lines:
+                yield from lines
+        transfer_complete = True
+    finally:
+        # If the iteration was interrupted, the server answers with a
+        # transfer error, or not at all. Start over with a new
+        # connection in that case.
+        try:
+            ftp_titelive.voidresp()
+        except ftplib.all_errors:
+            if transfer_complete:
+                raise
+            close_titelive_ftp()
 
 
 def get_files_to_process_from_titelive_ftp(titelive_folder_name: str, date_regexp: Pattern[str]) -> list[str]:
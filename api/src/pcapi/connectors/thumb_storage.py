@@ -1,3 +1,8 @@
+from concurrent import futures
+import multiprocessing
+from typing import Any
+from typing import Optional
+
 from pcapi import settings
 from pcapi.core import object_storage
 from pcapi.models.db import Model
@@ -28,3 +33,77 @@ def remove_thumb(
         bucket="thumbs",
         object_id=model_with_thumb.get_thumb_storage_id(image_index),
     )
+
+
+class ThumbPool:
+    """Create thumbs in the background.
+
+    Images are standardized in a pool of worker processes (or in the
+    upload threads if `processes` is 0) and uploaded by a pool of
+    threads. At most `max_pending` thumbs are processed at the same
+    time: `submit()` blocks until a slot is available, so that memory
+    usage stays bounded.
+    """
+
+    def __init__(self, processes: int, threads: int, max_pending: int):
+        if processes:
+            # Pools are created by provider synchronizations, that may
+            # run in worker threads (see `local_providers.sync_scheduler`).
+            # Forking a multithreaded process may deadlock on locks held
+            # by other threads (logging, database pool, etc.), and would
+            # share their connections: start fresh processes instead.
+            self.image_executor = futures.ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self.image_executor = None
+        self.upload_executor = futures.ThreadPoolExecutor(max_workers=threads)
+        self.max_pending = max_pending
+        self.pending: dict[futures.Future, Any] = {}
+        self.done: list[tuple[Any, Optional[Exception]]] = []
+
+    def __enter__(self) -> "ThumbPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+    def submit(self, image_as_bytes: bytes, storage_ids: list[str], context: Any = None) -> None:
+        """Standardize the image and store it under each of the given
+        storage ids. `context` is returned as is by `collect()`.
+        """
+        while len(self.pending) >= self.max_pending:
+            completed, _ = futures.wait(self.pending, return_when=futures.FIRST_COMPLETED)
+            self._move_to_done(completed)
+        future = self.upload_executor.submit(self._create_thumbs, image_as_bytes, storage_ids)
+        self.pending[future] = context
+
+    def collect(self) -> list[tuple[Any, Optional[Exception]]]:
+        """Wait for all submitted thumbs and return the context of each
+        of them, along with the exception that has been raised (if any).
+        """
+        self._move_to_done(futures.wait(self.pending).done)
+        done, self.done = self.done, []
+        return done
+
+    def shutdown(self) -> None:
+        self.upload_executor.shutdown()
+        if self.image_executor:
+            self.image_executor.shutdown()
+
+    def _move_to_done(self, completed: set[futures.Future]) -> None:
+        for future in completed:
+            self.done.append((self.pending.pop(future), future.exception()))
+
+    def _create_thumbs(self, image_as_bytes: bytes, storage_ids: list[str]) -> None:
+        if self.image_executor:
+            image_as_bytes = self.image_executor.submit(standardize_image, image_as_bytes).result()
+        else:
+            image_as_bytes = standardize_image(image_as_bytes)
+        for storage_id in storage_ids:
+            object_storage.store_public_object(
+                bucket=settings.BASE_BUCKET_NAME,
+                object_id=storage_id,
+                blob=image_as_bytes,
+                content_type="image/jpeg",
+            )
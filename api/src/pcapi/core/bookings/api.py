@@ -10,19 +10,27 @@ from PIL import Image
 import pytz
 import qrcode
 import qrcode.image.svg
+import redis
+import sqlalchemy as sqla
 
 from pcapi.core import search
 from pcapi.core.bookings import constants
 from pcapi.core.bookings.models import Booking
 from pcapi.core.bookings.models import BookingCancellationReasons
+from pcapi.core.bookings.models import BookingOutboxEvent
+from pcapi.core.bookings.models import BookingOutboxEventType
 from pcapi.core.bookings.models import BookingStatus
 from pcapi.core.bookings.models import IndividualBooking
 from pcapi.core.bookings.repository import generate_booking_token
 from pcapi.core.educational.models import EducationalBooking
 from pcapi.core.educational.models import EducationalBookingStatus
+from pcapi.core.offerers import api as offerers_api
+from pcapi.core.offers import exceptions as offers_exceptions
 from pcapi.core.offers import repository as offers_repository
 from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import Stock
+from pcapi.core.payments import repository as payments_repository
+from pcapi.core.users import repository as users_repository
 from pcapi.core.users.external import update_external_user
 from pcapi.core.users.models import User
 from pcapi.domain import user_emails
@@ -32,6 +40,7 @@ from pcapi.models.feature import FeatureToggle
 from pcapi.repository import repository
 from pcapi.repository import transaction
 from pcapi.utils.mailing import MailServiceException
+from pcapi.workers.booking_outbox_job import process_booking_outbox_job
 from pcapi.workers.push_notification_job import send_cancel_booking_notification
 from pcapi.workers.user_emails_job import send_booking_cancellation_emails_to_user_and_offerer_job
 
@@ -47,6 +56,10 @@ QR_CODE_PASS_CULTURE_VERSION = "v3"
 QR_CODE_VERSION = 2
 QR_CODE_BOX_SIZE = 5
 QR_CODE_BOX_BORDER = 1
+BOOKING_OUTBOX_BATCH_SIZE = 100
+BOOKING_OUTBOX_MAX_ATTEMPTS = 5
+BOOKING_OUTBOX_LEASE = datetime.timedelta(minutes=5)
+BOOKING_OUTBOX_RETRY_DELAY = datetime.timedelta(minutes=1)  # multiplied by the number of attempts
 
 
 def book_offer(
@@ -56,63 +69,14 @@ def book_offer(
 ) -> Booking:
     """
     Return a booking or raise an exception if it's not possible.
-    Update a user's credit information on Batch.
+    Confirmation emails and the update of the user's credit
+    information on Batch are run later (see `process_booking_outbox()`).
     """
-    # The call to transaction here ensures we free the FOR UPDATE lock
-    # on the stock if validation issues an exception
-    with transaction():
-        stock = offers_repository.get_and_lock_stock(stock_id=stock_id)
-        validation.check_offer_is_not_educational(stock)
-        validation.check_can_book_free_offer(beneficiary, stock)
-        validation.check_offer_already_booked(beneficiary, stock.offer)
-        validation.check_quantity(stock.offer, quantity)
-        validation.check_stock_is_bookable(stock, quantity)
-        total_amount = quantity * stock.price
-        validation.check_expenses_limits(beneficiary, total_amount, stock.offer)
-
-        from pcapi.core.offers.api import is_activation_code_applicable  # To avoid import loops
-
-        if is_activation_code_applicable(stock):
-            validation.check_activation_code_available(stock)
-
-        # FIXME (dbaty, 2020-10-20): if we directly set relations (for
-        # example with `booking.user = beneficiary`) instead of foreign keys,
-        # the session tries to add the object when `get_user_expenses()`
-        # is called because autoflush is enabled. As such, the PostgreSQL
-        # exceptions (tooManyBookings and insufficientFunds) may raise at
-        # this point and will bubble up. If we want them to be caught, we
-        # have to set foreign keys, so that the session is NOT autoflushed
-        # in `get_user_expenses` and is only committed in `repository.save()`
-        # where exceptions are caught. Since we are using flask-sqlalchemy,
-        # I don't think that we should use autoflush, nor should we use
-        # the `pcapi.repository.repository` module.
-        booking = Booking(
-            userId=beneficiary.id,
-            stockId=stock.id,
-            amount=stock.price,
-            quantity=quantity,
-            token=generate_booking_token(),
-            venueId=stock.offer.venueId,
-            offererId=stock.offer.venue.managingOffererId,
-        )
-
-        booking.dateCreated = datetime.datetime.utcnow()
-        booking.cancellationLimitDate = compute_cancellation_limit_date(stock.beginningDatetime, booking.dateCreated)
-
-        if is_activation_code_applicable(stock):
-            booking.activationCode = offers_repository.get_available_activation_code(stock)
-
-            if FeatureToggle.AUTO_ACTIVATE_DIGITAL_BOOKINGS.is_active():
-                booking.mark_as_used()
-
-        individual_booking = IndividualBooking(
-            booking=booking,
-            depositId=beneficiary.deposit.id if beneficiary.has_active_deposit else None,
-            userId=beneficiary.id,
-        )
-        stock.dnBookedQuantity += booking.quantity
-
-        repository.save(individual_booking, stock)
+    if FeatureToggle.ENABLE_ATOMIC_STOCK_RESERVATION.is_active():
+        stock, individual_booking = _book_offer_with_atomic_reservation(beneficiary, stock_id, quantity)
+    else:
+        stock, individual_booking = _book_offer_with_stock_lock(beneficiary, stock_id, quantity)
+    booking = individual_booking.booking
 
     logger.info(
         "Beneficiary booked an offer",
@@ -125,20 +89,220 @@ def book_offer(
         },
     )
 
+    search.async_index_offer_ids([stock.offerId])
+    offerers_api.invalidate_venues_stats([booking.offererId])
+
     try:
+        process_booking_outbox_job.delay()
+    except redis.exceptions.RedisError:
+        # Events will be processed by the `process_booking_outbox` cron.
+        logger.exception("Could not enqueue processing of booking outbox", extra={"booking": booking.id})
+
+    return booking
+
+
+def _book_offer_with_stock_lock(beneficiary: User, stock_id: int, quantity: int) -> tuple[Stock, IndividualBooking]:
+    # The call to transaction here ensures we free the FOR UPDATE lock
+    # on the stock if validation issues an exception
+    with transaction():
+        stock = offers_repository.get_and_lock_stock(stock_id=stock_id)
+        _check_can_book(beneficiary, stock, quantity)
+        individual_booking = _build_individual_booking(beneficiary, stock, quantity)
+        _update_deposit_spending(beneficiary, stock, individual_booking.booking)
+        stock.dnBookedQuantity += quantity
+        repository.save(individual_booking, stock, *_build_outbox_events(individual_booking.booking))
+    return stock, individual_booking
+
+
+def _book_offer_with_atomic_reservation(
+    beneficiary: User, stock_id: int, quantity: int
+) -> tuple[Stock, IndividualBooking]:
+    """Book an offer without locking the stock while the booking is
+    validated.
+
+    The beneficiary is locked instead, so that concurrent bookings of
+    the same beneficiary are serialized and cannot both pass the
+    checks. All checks (including the expensive
+    `check_expenses_limits()`) are done first. The quantity is then
+    reserved with a single conditional UPDATE that fails if the stock
+    has been sold out in the meantime. The stock row is only locked by
+    this UPDATE, until the booking is committed: concurrent bookings of
+    the same stock are thus serialized from the reservation to the
+    commit. The activation code, if any, is claimed while the stock row
+    is locked.
+    """
+    with transaction():
+        users_repository.get_and_lock_user(beneficiary.id)
+        stock = Stock.query.filter_by(id=stock_id).populate_existing().one_or_none()
+        if not stock:
+            raise offers_exceptions.StockDoesNotExist()
+        _check_can_book(beneficiary, stock, quantity)
+        if not offers_repository.reserve_stock_quantity(stock.id, quantity):
+            raise exceptions.StockIsNotBookable()
+        # The UPDATE does not synchronize the session: reload the
+        # booked quantity.
+        db.session.refresh(stock)
+        individual_booking = _build_individual_booking(beneficiary, stock, quantity)
+        _update_deposit_spending(beneficiary, stock, individual_booking.booking)
+        repository.save(individual_booking, *_build_outbox_events(individual_booking.booking))
+    return stock, individual_booking
+
+
+def _check_can_book(beneficiary: User, stock: Stock, quantity: int) -> None:
+    validation.check_offer_is_not_educational(stock)
+    validation.check_can_book_free_offer(beneficiary, stock)
+    validation.check_offer_already_booked(beneficiary, stock.offer)
+    validation.check_quantity(stock.offer, quantity)
+    validation.check_stock_is_bookable(stock, quantity)
+    total_amount = quantity * stock.price
+    validation.check_expenses_limits(beneficiary, total_amount, stock.offer)
+
+    from pcapi.core.offers.api import is_activation_code_applicable  # To avoid import loops
+
+    if is_activation_code_applicable(stock):
+        validation.check_activation_code_available(stock)
+
+
+def _build_individual_booking(beneficiary: User, stock: Stock, quantity: int) -> IndividualBooking:
+    from pcapi.core.offers.api import is_activation_code_applicable  # To avoid import loops
+
+    # FIXME (dbaty, 2020-10-20): if we directly set relations (for
+    # example with `booking.user = beneficiary`) instead of foreign keys,
+    # the session tries to add the object when `get_user_expenses()`
+    # is called because autoflush is enabled. As such, the PostgreSQL
+    # exceptions (tooManyBookings and insufficientFunds) may raise at
+    # this point and will bubble up. If we want them to be caught, we
+    # have to set foreign keys, so that the session is NOT autoflushed
+    # in `get_user_expenses` and is only committed in `repository.save()`
+    # where exceptions are caught. Since we are using flask-sqlalchemy,
+    # I don't think that we should use autoflush, nor should we use
+    # the `pcapi.repository.repository` module.
+    booking = Booking(
+        userId=beneficiary.id,
+        stockId=stock.id,
+        amount=stock.price,
+        quantity=quantity,
+        token=generate_booking_token(),
+        venueId=stock.offer.venueId,
+        offererId=stock.offer.venue.managingOffererId,
+    )
+
+    booking.dateCreated = datetime.datetime.utcnow()
+    booking.cancellationLimitDate = compute_cancellation_limit_date(stock.beginningDatetime, booking.dateCreated)
+
+    if is_activation_code_applicable(stock):
+        # The stock row is locked by the caller until the booking is
+        # committed, so that concurrent bookings of the same stock wait
+        # for each other. The code is locked too, and skipped by any
+        # other claim, so that it is never handed out twice.
+        booking.activationCode = offers_repository.claim_available_activation_code(stock)
+        if not booking.activationCode:
+            raise exceptions.NoActivationCodeAvailable()
+
+        if FeatureToggle.AUTO_ACTIVATE_DIGITAL_BOOKINGS.is_active():
+            booking.mark_as_used()
+
+    return IndividualBooking(
+        booking=booking,
+        depositId=beneficiary.deposit.id if beneficiary.has_active_deposit else None,
+        userId=beneficiary.id,
+    )
+
+
+def _update_deposit_spending(beneficiary: User, stock: Stock, booking: Booking) -> None:
+    if beneficiary.has_active_deposit:
+        beneficiary.deposit.update_spending(booking.total_amount, stock.offer, spent=1, used=int(booking.isUsed))
+
+
+def _build_outbox_events(booking: Booking) -> list[BookingOutboxEvent]:
+    # Emails and updates of external services are recorded in the
+    # same transaction, and run later by `process_booking_outbox()`.
+    return [BookingOutboxEvent(booking=booking, type=event_type) for event_type in BookingOutboxEventType]
+
+
+def _run_booking_outbox_event(event: BookingOutboxEvent) -> None:
+    individual_booking = event.booking.individualBooking
+    if event.type == BookingOutboxEventType.OFFERER_CONFIRMATION_EMAIL:
         user_emails.send_individual_booking_confirmation_email_to_offerer(individual_booking)
-    except MailServiceException as error:
-        logger.exception("Could not send booking=%s confirmation email to offerer: %s", booking.id, error)
-    try:
+    elif event.type == BookingOutboxEventType.BENEFICIARY_CONFIRMATION_EMAIL:
         user_emails.send_individual_booking_confirmation_email_to_beneficiary(individual_booking)
-    except MailServiceException as error:
-        logger.exception("Could not send booking=%s confirmation email to beneficiary: %s", booking.id, error)
+    elif event.type == BookingOutboxEventType.UPDATE_EXTERNAL_USER:
+        update_external_user(individual_booking.user)
+    else:
+        raise ValueError(f"Unexpected booking outbox event type: {event.type}")
 
-    search.async_index_offer_ids([stock.offerId])
 
-    update_external_user(individual_booking.user)
+def _process_booking_outbox_event(event: BookingOutboxEvent) -> None:
+    try:
+        _run_booking_outbox_event(event)
+    except Exception as exc:  # pylint: disable=broad-except
+        db.session.rollback()
+        logger.exception(
+            "Could not process booking outbox event",
+            extra={
+                "event": event.id,
+                "booking": event.bookingId,
+                "type": event.type.value,
+                "attempts": event.attempts,
+            },
+        )
+        event.availableAt = datetime.datetime.utcnow() + BOOKING_OUTBOX_RETRY_DELAY * event.attempts
+        event.lastError = f"{exc.__class__.__name__}: {exc}"
+        db.session.commit()
+        return
+
+    db.session.delete(event)
+    db.session.commit()
+
 
-    return individual_booking.booking
+def process_booking_outbox() -> int:
+    """Run pending booking outbox events and return how many events
+    have been processed (successfully or not).
+
+    Events are claimed by pushing back their `availableAt` date, so
+    that several workers can process the outbox at the same time. If
+    a worker dies, the events it had claimed are processed again once
+    BOOKING_OUTBOX_LEASE has elapsed. Failed events are retried up to
+    BOOKING_OUTBOX_MAX_ATTEMPTS times.
+    """
+    processed = 0
+    while True:
+        now = datetime.datetime.utcnow()
+        events = (
+            BookingOutboxEvent.query.filter(
+                BookingOutboxEvent.availableAt <= now,
+                BookingOutboxEvent.attempts < BOOKING_OUTBOX_MAX_ATTEMPTS,
+            )
+            .order_by(BookingOutboxEvent.id)
+            .limit(BOOKING_OUTBOX_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not events:
+            return processed
+        for event in events:
+            event.availableAt = now + BOOKING_OUTBOX_LEASE
+            event.attempts += 1
+        db.session.commit()
+
+        for event in events:
+            _process_booking_outbox_event(event)
+        processed += len(events)
+
+
+def get_booking_outbox_status() -> dict:
+    """Return the number of pending and failed events, and how far
+    behind the outbox is (i.e. the age of the oldest pending event,
+    in seconds).
+    """
+    pending = BookingOutboxEvent.attempts < BOOKING_OUTBOX_MAX_ATTEMPTS
+    pending_count, failed_count, oldest_date = db.session.query(
+        sqla.func.count(BookingOutboxEvent.id).filter(pending),
+        sqla.func.count(BookingOutboxEvent.id).filter(sqla.not_(pending)),
+        sqla.func.min(BookingOutboxEvent.dateCreated).filter(pending),
+    ).one()
+    lag = (datetime.datetime.utcnow() - oldest_date).total_seconds() if oldest_date else 0
+    return {"pending_events": pending_count, "failed_events": failed_count, "lag": lag}
 
 
 def _cancel_booking(booking: Booking, reason: BookingCancellationReasons) -> None:
@@ -172,6 +336,7 @@ def _cancel_booking(booking: Booking, reason: BookingCancellationReasons) -> Non
         update_external_user(booking.individualBooking.user)
 
     search.async_index_offer_ids([booking.stock.offerId])
+    offerers_api.invalidate_venues_stats([booking.offererId])
 
 
 def _cancel_bookings_from_stock(stock: Stock, reason: BookingCancellationReasons) -> list[Booking]:
@@ -191,7 +356,9 @@ def _cancel_bookings_from_stock(stock: Stock, reason: BookingCancellationReasons
                 booking.cancellationReason = reason
                 stock.dnBookedQuantity -= booking.quantity
                 deleted_bookings.append(booking)
+        offerer_ids = {booking.offererId for booking in deleted_bookings}
         repository.save(*deleted_bookings)
+    offerers_api.invalidate_venues_stats(offerer_ids)
 
     for booking in deleted_bookings:
         if booking.individualBooking is not None:
@@ -264,6 +431,7 @@ def mark_as_used(booking: Booking) -> None:
     booking.mark_as_used()
     repository.save(booking)
     logger.info("Booking was marked as used", extra={"bookingId": booking.id})
+    offerers_api.invalidate_venues_stats([booking.offererId])
 
     if booking.individualBookingId is not None:
         update_external_user(booking.individualBooking.user)
@@ -292,6 +460,7 @@ def mark_as_used_with_uncancelling(booking: Booking) -> None:
     db.session.add(booking)
     db.session.commit()
     logger.info("Booking was uncancelled and marked as used", extra={"bookingId": booking.id})
+    offerers_api.invalidate_venues_stats([booking.offererId])
 
     if booking.individualBookingId is not None:
         update_external_user(booking.individualBooking.user)
@@ -319,6 +488,7 @@ def mark_as_unused(booking: Booking) -> None:
     booking.mark_as_unused_set_confirmed()
     repository.save(booking)
     logger.info("Booking was marked as unused", extra={"booking": booking.id})
+    offerers_api.invalidate_venues_stats([booking.offererId])
 
     if booking.individualBookingId is not None:
         update_external_user(booking.individualBooking.user)
@@ -433,9 +603,17 @@ def auto_mark_as_used_after_event() -> None:
         .filter(or_(EducationalBooking.status != EducationalBookingStatus.REFUSED, EducationalBooking.status.is_(None)))
     )
     # fmt: on
+    deposit_ids = [
+        deposit_id
+        for deposit_id, in individual_bookings.join(Booking.individualBooking)
+        .filter(IndividualBooking.depositId.isnot(None))
+        .with_entities(IndividualBooking.depositId)
+        .distinct()
+    ]
     n_individual_updated = individual_bookings.update(
         {"isUsed": True, "status": BookingStatus.USED, "dateUsed": now}, synchronize_session=False
     )
+    payments_repository.recompute_deposit_spending(deposit_ids)
     db.session.commit()
 
     n_educational_updated = educational_bookings.update(
@@ -45,6 +45,16 @@ class BookingFactory(BaseFactory):
             db.session.add(self)
             db.session.flush()
 
+    @factory.post_generation
+    def deposit_spending(self, create, extracted, **kwargs):
+        # Like `api.book_offer()`, update the denormalized spending of the deposit.
+        if self.isCancelled or self.individualBooking is None or self.individualBooking.deposit is None:
+            return
+        self.individualBooking.deposit.update_spending(
+            self.total_amount, self.stock.offer, spent=1, used=int(self.isUsed)
+        )
+        db.session.commit()
+
     @classmethod
     def _create(cls, model_class, *args, **kwargs):
         if not kwargs.get("isCancelled", False):
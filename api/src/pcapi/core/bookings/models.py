@@ -13,6 +13,7 @@ from sqlalchemy import ForeignKey
 from sqlalchemy import Integer
 from sqlalchemy import Numeric
 from sqlalchemy import String
+from sqlalchemy import Text
 from sqlalchemy import and_
 from sqlalchemy import event
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -26,7 +27,9 @@ from pcapi.core.categories import subcategories
 from pcapi.core.educational.models import EducationalBooking
 from pcapi.core.offers.models import Mediation
 from pcapi.models.db import Model
+from pcapi.models.db import db
 from pcapi.models.pc_object import PcObject
+import pcapi.utils.db as db_utils
 from pcapi.utils.human_ids import humanize
 
 
@@ -159,11 +162,14 @@ class Booking(PcObject, Model):
             raise exceptions.BookingHasAlreadyBeenUsed()
         if self.status is BookingStatus.CANCELLED or self.isCancelled:
             raise exceptions.BookingIsCancelled()
+        self._update_deposit_spending(used=1)
         self.isUsed = True
         self.dateUsed = datetime.utcnow()
         self.status = BookingStatus.USED
 
     def mark_as_unused_set_confirmed(self) -> None:
+        if self.isUsed and not self.isCancelled:
+            self._update_deposit_spending(used=-1)
         self.isUsed = False
         self.dateUsed = None
         self.status = BookingStatus.CONFIRMED
@@ -173,6 +179,7 @@ class Booking(PcObject, Model):
             raise exceptions.BookingIsAlreadyCancelled()
         if self.status is BookingStatus.USED or self.isUsed:
             raise exceptions.BookingIsAlreadyUsed()
+        self._update_deposit_spending(spent=-1)
         self.isCancelled = True
         self.status = BookingStatus.CANCELLED
         self.cancellationDate = datetime.utcnow()
@@ -180,6 +187,7 @@ class Booking(PcObject, Model):
     def uncancel_booking_set_used(self) -> None:
         if not (self.status is BookingStatus.CANCELLED or self.isCancelled):
             raise exceptions.BookingIsNotCancelledCannotBeUncancelled()
+        self._update_deposit_spending(spent=1, used=0 if self.isUsed else 1)
         self.isCancelled = False
         self.cancellationDate = None
         self.cancellationReason = None
@@ -187,6 +195,14 @@ class Booking(PcObject, Model):
         self.isUsed = True
         self.dateUsed = datetime.utcnow()
 
+    def _update_deposit_spending(self, spent: int = 0, used: int = 0) -> None:
+        # Loading relationships must not flush the booking, that could
+        # raise `check_booking()` errors outside of `repository.save()`.
+        with db.session.no_autoflush:
+            if self.individualBooking is None or self.individualBooking.deposit is None:
+                return
+            self.individualBooking.deposit.update_spending(self.total_amount, self.stock.offer, spent=spent, used=used)
+
     def mark_as_confirmed(self) -> None:
         if self.educationalBooking is None:
             raise exceptions.CannotMarkAsConfirmedIndividualBooking()
@@ -432,3 +448,38 @@ Booking.trig_update_cancellationDate_on_isCancelled_ddl = """
     """
 
 event.listen(Booking.__table__, "after_create", DDL(Booking.trig_update_cancellationDate_on_isCancelled_ddl))
+
+
+class BookingOutboxEventType(enum.Enum):
+    OFFERER_CONFIRMATION_EMAIL = "OFFERER_CONFIRMATION_EMAIL"
+    BENEFICIARY_CONFIRMATION_EMAIL = "BENEFICIARY_CONFIRMATION_EMAIL"
+    UPDATE_EXTERNAL_USER = "UPDATE_EXTERNAL_USER"
+
+
+class BookingOutboxEvent(PcObject, Model):
+    """A side effect of a booking (email, update of external services)
+    that is recorded in the same transaction as the booking, and run
+    later by `pcapi.core.bookings.api.process_booking_outbox()`.
+
+    Events are deleted once they have been processed.
+    """
+
+    __tablename__ = "booking_outbox_event"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+
+    bookingId = Column(BigInteger, ForeignKey("booking.id", ondelete="CASCADE"), index=True, nullable=False)
+    booking = relationship("Booking", foreign_keys=[bookingId])
+
+    type = Column(db_utils.MagicEnum(BookingOutboxEventType), nullable=False)
+
+    dateCreated = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    # The event is not processed before this date. It is pushed back
+    # while the event is being processed (so that other workers skip
+    # it) and after each failed attempt.
+    availableAt = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+
+    lastError = Column(Text, nullable=True)
@@ -17,7 +17,7 @@ from sqlalchemy import func
 from sqlalchemy import or_
 from sqlalchemy import text
 from sqlalchemy.orm import Query
-from sqlalchemy.orm import contains_eager
+from sqlalchemy.orm import aliased
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 from sqlalchemy.sql.functions import coalesce
@@ -43,16 +43,19 @@ from pcapi.models import Stock
 from pcapi.models import UserOfferer
 from pcapi.models import Venue
 from pcapi.models.api_errors import ResourceNotFoundError
+from pcapi.models.bank_information import BankInformation
 from pcapi.models.db import db
 from pcapi.models.feature import FeatureToggle
 from pcapi.models.payment import Payment
 from pcapi.models.payment_status import TransactionStatus
+from pcapi.utils.csv_stream import pop_csv_output
 from pcapi.utils.date import get_department_timezone
 from pcapi.utils.db import get_batches
 from pcapi.utils.token import random_token
 
 
 DUO_QUANTITY = 2
+CSV_REPORT_BATCH_SIZE = 1000
 
 
 BOOKING_STATUS_LABELS = {
@@ -165,39 +168,58 @@ def find_not_cancelled_bookings_by_stock(stock: Stock) -> list[Booking]:
     return Booking.query.filter_by(stockId=stock.id, isCancelled=False).all()
 
 
-def find_bookings_eligible_for_payment_for_venue(venue_id: int, cutoff_date: datetime) -> list[Booking]:
-    bookings = Booking.query
-    # There should not be any booking that is both cancelled and used,
-    # but here we want to be extra cautious.
-    bookings = bookings.filter_by(isCancelled=False, isUsed=True)
-    bookings = bookings.filter_by(venueId=venue_id)
+def find_booking_rows_eligible_for_payment_for_venue(venue_id: int, cutoff_date: datetime) -> list[AbstractKeyedTuple]:
+    """Return used bookings of the venue that should be reimbursed, as
+    plain rows that only hold what is needed to compute reimbursements
+    and create payments.
+    """
+    venue_bank_information = aliased(BankInformation)
+    offerer_bank_information = aliased(BankInformation)
+    # Already paid bookings come first, so that they count in the
+    # cumulative revenue of the venue before those not yet paid.
+    first_payment_id = (
+        db.session.query(func.min(Payment.id)).filter(Payment.bookingId == Booking.id).correlate(Booking).as_scalar()
+    )
     # fmt: off
-    bookings = (
-        bookings
-        .filter(Booking.dateUsed < cutoff_date, Booking.amount > 0)
-        .join(Stock)
+    return (
+        db.session.query(
+            Booking.id,
+            Booking.dateUsed,
+            Booking.amount,
+            Booking.quantity,
+            Booking.offererId,
+            Stock.offerId,
+            Offer.subcategoryId,
+            Offer.isEducational,
+            first_payment_id.label("paymentId"),
+            Offerer.name.label("offererName"),
+            Offerer.siren.label("offererSiren"),
+            venue_bank_information.iban.label("venueIban"),
+            venue_bank_information.bic.label("venueBic"),
+            offerer_bank_information.iban.label("offererIban"),
+            offerer_bank_information.bic.label("offererBic"),
+        )
+        .select_from(Booking)
+        .filter(
+            Booking.isCancelled.is_(False),
+            Booking.isUsed.is_(True),
+            Booking.venueId == venue_id,
+            Booking.dateUsed < cutoff_date,
+            Booking.amount > 0,
+        )
+        .join(Stock, Booking.stockId == Stock.id)
         .filter(
             Stock.beginningDatetime.is_(None)
             | (cast(Stock.beginningDatetime, Date) < date.today())
         )
-    )
-    # fmt: on
-    return (
-        bookings.outerjoin(Payment)
-        .options(contains_eager(Booking.stock).joinedload(Stock.offer).joinedload(Offer.product))
-        # FIXME (dbaty, 2021-08-18): `create_payment_for_booking` goes
-        # through `Booking.venue.iban` to access the IBAN of the
-        # venue. Could there be a way to avoid the JOIN on venue?
-        # (Unfortunately, The JOIN on offerer is necessary, since
-        # `create_payment_for_booking()` uses `Offerer.name` and
-        # `Offerer.siren`.) Also, the two lines below make 2 distinct
-        # JOIN on `bank_information`.
-        .options(joinedload(Booking.venue).joinedload(Venue.bankInformation))
-        .options(joinedload(Booking.offerer).joinedload(Offerer.bankInformation))
-        .options(joinedload(Booking.payments))
-        .order_by(Payment.id, Booking.dateUsed.asc())
+        .join(Offer, Stock.offerId == Offer.id)
+        .join(Offerer, Booking.offererId == Offerer.id)
+        .outerjoin(venue_bank_information, venue_bank_information.venueId == Booking.venueId)
+        .outerjoin(offerer_bank_information, offerer_bank_information.offererId == Booking.offererId)
+        .order_by(first_payment_id, Booking.dateUsed.asc())
         .all()
     )
+    # fmt: on
 
 
 def token_exists(token: str) -> bool:
@@ -408,7 +430,11 @@ def get_bookings_from_deposit(deposit_id: int) -> list[Booking]:
 
 def get_csv_report(
     user: User, booking_period: tuple[date, date], event_date: Optional[datetime] = None, venue_id: Optional[int] = None
-) -> str:
+) -> Iterable[bytes]:
+    """Return the CSV report as a generator of UTF-8 encoded chunks
+    (the first one begins with a BOM), so that it can be streamed
+    without being fully held in memory.
+    """
     bookings_query = _get_filtered_booking_report(
         pro_user=user,
         period=booking_period,
@@ -793,7 +819,7 @@ def _serialize_booking_recap_legacy(booking: AbstractKeyedTuple) -> BookingRecap
     )
 
 
-def _serialize_csv_report(query: Query) -> str:
+def _serialize_csv_report(query: Query) -> Iterable[bytes]:
     output = StringIO()
     writer = csv.writer(output, quoting=csv.QUOTE_NONNUMERIC)
     writer.writerow(
@@ -813,7 +839,9 @@ def _serialize_csv_report(query: Query) -> str:
             "Date et heure de remboursement",
         )
     )
-    for batch in get_batches(query, Booking.id, 1000):
+    yield pop_csv_output(output, encoding="utf-8-sig")
+
+    for batch in get_batches(query, Booking.id, CSV_REPORT_BATCH_SIZE):
         rows = [
             (
                 booking.venueName,
@@ -832,6 +860,6 @@ def _serialize_csv_report(query: Query) -> str:
             )
             for booking in batch
         ]
-        writer.writerows(rows)
-
-    return output.getvalue()
+        if rows:
+            writer.writerows(rows)
+            yield pop_csv_output(output)
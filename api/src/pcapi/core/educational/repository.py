@@ -4,6 +4,7 @@ from operator import and_
 from typing import Optional
 from typing import Union
 
+from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql.expression import extract
 
@@ -47,16 +48,22 @@ def get_confirmed_educational_bookings_amount(
     educational_institution_id: int,
     educational_year_id: str,
 ) -> Decimal:
-    educational_bookings = (
-        educational_models.EducationalBooking.query.filter_by(
+    """Return the amount of confirmed (or used) educational bookings of
+    an institution for a given year, computed by the database.
+
+    It is called while the deposit of the institution is locked: it
+    must remain a single query.
+    """
+    amount = (
+        EducationalBooking.query.filter_by(
             educationalInstitutionId=educational_institution_id, educationalYearId=educational_year_id
         )
         .join(Booking)
         .filter(and_(Booking.isCancelled.is_(False), Booking.status != BookingStatus.PENDING))
-        .options(joinedload(educational_models.EducationalBooking.booking).load_only(Booking.amount, Booking.quantity))
-        .all()
+        .with_entities(func.coalesce(func.sum(Booking.amount * Booking.quantity), 0))
+        .scalar()
     )
-    return Decimal(sum([educational_booking.booking.total_amount for educational_booking in educational_bookings]))
+    return Decimal(amount)
 
 
 def find_educational_booking_by_id(educational_booking_id: int) -> Optional[EducationalBooking]:
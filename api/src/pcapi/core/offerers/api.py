@@ -1,14 +1,20 @@
 from datetime import datetime
+import json
 import logging
 import pathlib
 import secrets
 import typing
+from typing import Iterable
 from typing import Optional
 
+from flask import current_app
+import redis
+
 from pcapi import settings
 from pcapi.core import object_storage
 from pcapi.core import search
 from pcapi.core.mails import MailServiceException
+from pcapi.core.offerers import repository as offerers_repository
 from pcapi.core.offerers.models import ApiKey
 from pcapi.core.offerers.models import Offerer
 from pcapi.core.offerers.models import UserOfferer
@@ -30,6 +36,7 @@ from pcapi.routes.serialization.offerers_serialize import CreateOffererQueryMode
 from pcapi.routes.serialization.venues_serialize import PostVenueBodyModel
 from pcapi.utils import crypto
 
+from . import api_key_cache
 from . import validation
 from .exceptions import ApiKeyCountMaxReached
 from .exceptions import ApiKeyDeletionDenied
@@ -42,6 +49,7 @@ logger = logging.getLogger(__name__)
 UNCHANGED = object()
 VENUE_ALGOLIA_INDEXED_FIELDS = ["name", "publicName", "postalCode", "city", "latitude", "longitude"]
 API_KEY_SEPARATOR = "_"
+REDIS_VENUES_STATS = "cache:offerer:{offerer_id}:venues-stats"
 
 
 def create_digital_venue(offerer: Offerer) -> Venue:
@@ -116,6 +124,7 @@ def create_venue(venue_data: PostVenueBodyModel) -> Venue:
     repository.save(venue)
 
     search.async_index_venue_ids([venue.id])
+    invalidate_venues_stats([venue.managingOffererId])
     return venue
 
 
@@ -157,7 +166,13 @@ def find_api_key(key: str) -> Optional[ApiKey]:
     if not api_key:
         return None
 
-    return api_key if api_key.check_secret(clear_secret) else None
+    # Avoid a bcrypt round if the secret has recently been verified.
+    if api_key_cache.is_verified(api_key, clear_secret):
+        return api_key
+    if not api_key.check_secret(clear_secret):
+        return None
+    api_key_cache.remember_verified(api_key, clear_secret)
+    return api_key
 
 
 def _create_prefix(env: str, prefix_identifier: str) -> str:
@@ -171,6 +186,7 @@ def delete_api_key_by_user(user: User, api_key_prefix: str) -> None:
         raise ApiKeyDeletionDenied()
 
     db.session.delete(api_key)
+    api_key_cache.forget(api_key_prefix)
 
 
 def create_offerer(user: User, offerer_informations: CreateOffererQueryModel):
@@ -260,3 +276,41 @@ def save_venue_banner(user: User, venue: Venue, content: bytes, content_type: st
     venue.bannerMeta = {"content_type": content_type, "file_name": file_name, "author_id": user.id}
 
     repository.save(venue)
+
+
+def get_venues_stats(offerer_id: int) -> dict[int, dict[str, int]]:
+    """Return the booking and offer counters of all venues of an
+    offerer.
+
+    Counters are cached for a minute (see the
+    ``VENUES_STATS_CACHE_TTL`` setting): the cache is invalidated when a
+    booking or an offer of the offerer is modified through our API,
+    and the TTL takes care of other (bulk) modifications.
+    """
+    redis_client = current_app.redis_client
+    key = REDIS_VENUES_STATS.format(offerer_id=offerer_id)
+    try:
+        cached = redis_client.get(key)
+    except redis.exceptions.RedisError:
+        logger.exception("Could not get venues stats from cache", extra={"offerer": offerer_id})
+        cached = None
+    if cached:
+        return {int(venue_id): stats for venue_id, stats in json.loads(cached).items()}
+
+    venues_stats = offerers_repository.get_venues_stats(offerer_id)
+    try:
+        redis_client.set(key, json.dumps(venues_stats), ex=settings.VENUES_STATS_CACHE_TTL)
+    except redis.exceptions.RedisError:
+        logger.exception("Could not store venues stats in cache", extra={"offerer": offerer_id})
+    return venues_stats
+
+
+def invalidate_venues_stats(offerer_ids: Iterable[int]) -> None:
+    offerer_ids = set(offerer_ids)
+    if not offerer_ids:
+        return
+    keys = [REDIS_VENUES_STATS.format(offerer_id=offerer_id) for offerer_id in offerer_ids]
+    try:
+        current_app.redis_client.delete(*keys)
+    except redis.exceptions.RedisError:
+        logger.exception("Could not invalidate venues stats cache", extra={"offerers": offerer_ids})
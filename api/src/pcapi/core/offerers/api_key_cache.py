@@ -0,0 +1,145 @@
+"""Cache of API keys whose secret has recently been verified.
+
+Checking the secret of an API key costs a bcrypt round, which is slow
+on purpose, and providers may call our public API many times per
+second. Once verified, a secret is remembered for a short while (see
+the ``API_KEY_CACHE_TTL`` setting, 0 disables the cache), in the
+current process and in Redis (for other processes).
+
+The cache only holds a SHA-256 digest of the clear secret along with
+the stored (hashed) secret of the key. The key itself is still fetched
+from the database on each request, so that a deleted key is rejected
+right away, and a digest that was computed with another stored secret
+does not match.
+
+Hits and misses are counted in each process and periodically added to
+a Redis hash, which is logged (and reset) by a clock job.
+"""
+
+import collections
+import hashlib
+import logging
+import time
+from typing import Optional
+
+from flask import current_app
+import redis
+
+from pcapi import settings
+from pcapi.core.offerers.models import ApiKey
+
+
+logger = logging.getLogger(__name__)
+
+REDIS_VERIFIED_SECRET = "cache:api-key:{prefix}:verified-secret"
+REDIS_METRICS = "metrics:api-key-cache"
+METRICS_FLUSH_INTERVAL = 10  # seconds
+LOCAL_CACHE_MAX_SIZE = 10_000
+
+# prefix -> (digest, expiration time as given by `time.monotonic()`)
+_local_cache: dict[str, tuple[str, float]] = {}
+_metrics: collections.Counter = collections.Counter()
+_last_metrics_flush = time.monotonic()
+
+
+def _get_digest(api_key: ApiKey, clear_secret: str) -> str:
+    return hashlib.sha256(api_key.secret + clear_secret.encode("utf-8")).hexdigest()
+
+
+def _store_locally(prefix: str, digest: str) -> None:
+    if len(_local_cache) >= LOCAL_CACHE_MAX_SIZE:
+        _local_cache.clear()
+    _local_cache[prefix] = (digest, time.monotonic() + settings.API_KEY_CACHE_TTL)
+
+
+def _record(event: str) -> None:
+    _metrics[event] += 1
+    if time.monotonic() - _last_metrics_flush >= METRICS_FLUSH_INTERVAL:
+        flush_metrics()
+
+
+def is_verified(api_key: ApiKey, clear_secret: str) -> bool:
+    """Return whether ``clear_secret`` has recently been verified as
+    the secret of ``api_key``.
+    """
+    if not settings.API_KEY_CACHE_TTL:
+        return False
+    digest = _get_digest(api_key, clear_secret)
+    cached = _local_cache.get(api_key.prefix)
+    if cached and cached[0] == digest and cached[1] > time.monotonic():
+        _record("local_hit")
+        return True
+
+    try:
+        cached_digest = current_app.redis_client.get(REDIS_VERIFIED_SECRET.format(prefix=api_key.prefix))
+    except redis.exceptions.RedisError:
+        logger.exception("Could not get verified API key from cache", extra={"api_key": api_key.id})
+        cached_digest = None
+    if cached_digest == digest:
+        _store_locally(api_key.prefix, digest)
+        _record("redis_hit")
+        return True
+
+    _record("miss")
+    return False
+
+
+def remember_verified(api_key: ApiKey, clear_secret: str) -> None:
+    if not settings.API_KEY_CACHE_TTL:
+        return
+    digest = _get_digest(api_key, clear_secret)
+    _store_locally(api_key.prefix, digest)
+    key = REDIS_VERIFIED_SECRET.format(prefix=api_key.prefix)
+    try:
+        current_app.redis_client.set(key, digest, ex=settings.API_KEY_CACHE_TTL)
+    except redis.exceptions.RedisError:
+        logger.exception("Could not store verified API key in cache", extra={"api_key": api_key.id})
+
+
+def forget(prefix: str) -> None:
+    """Remove the API key from the cache of this process and from
+    Redis. Other processes may still have it in their local cache,
+    but they fetch the key from the database anyway.
+    """
+    _local_cache.pop(prefix, None)
+    try:
+        current_app.redis_client.delete(REDIS_VERIFIED_SECRET.format(prefix=prefix))
+    except redis.exceptions.RedisError:
+        logger.exception("Could not invalidate verified API key cache", extra={"prefix": prefix})
+
+
+def clear_local_cache() -> None:
+    _local_cache.clear()
+    _metrics.clear()
+
+
+def flush_metrics() -> None:
+    """Add hits and misses of this process to the Redis counters."""
+    # pylint: disable=global-statement
+    global _last_metrics_flush
+    _last_metrics_flush = time.monotonic()
+    if not _metrics:
+        return
+    metrics = dict(_metrics)
+    _metrics.clear()
+    try:
+        pipeline = current_app.redis_client.pipeline(transaction=False)
+        for event, count in metrics.items():
+            pipeline.hincrby(REDIS_METRICS, event, count)
+        pipeline.execute()
+    except redis.exceptions.RedisError:
+        logger.exception("Could not store API key cache metrics")
+
+
+def pop_metrics() -> Optional[dict[str, int]]:
+    """Return hits and misses since the last call, for all processes."""
+    flush_metrics()
+    try:
+        pipeline = current_app.redis_client.pipeline(transaction=True)
+        pipeline.hgetall(REDIS_METRICS)
+        pipeline.delete(REDIS_METRICS)
+        metrics, _ = pipeline.execute()
+    except redis.exceptions.RedisError:
+        logger.exception("Could not get API key cache metrics")
+        return None
+    return {event: int(count) for event, count in metrics.items()}
@@ -1,11 +1,14 @@
 import datetime
 from typing import Optional
 
+from sqlalchemy import func
 from sqlalchemy import or_
 import sqlalchemy.orm as sqla_orm
 from sqlalchemy.orm import Query
 
+from pcapi.core.bookings.models import Booking
 from pcapi.core.offers.models import Offer
+from pcapi.core.offers.models import OfferStatus
 from pcapi.core.users.models import User
 from pcapi.domain.ts_vector import create_filter_matching_all_keywords_in_any_model
 from pcapi.domain.ts_vector import create_get_filter_matching_ts_query_in_any_model
@@ -94,6 +97,68 @@ def get_api_key_prefixes(offerer_id: int) -> list[str]:
     ]
 
 
+def get_venues_stats(offerer_id: int) -> dict[int, dict[str, int]]:
+    """Return the booking and offer counters of all venues of an
+    offerer, in a single query.
+    """
+    bookings_stats = (
+        db.session.query(
+            Booking.venueId.label("venueId"),
+            func.sum(Booking.quantity)
+            .filter(Booking.isUsed.is_(False), Booking.isCancelled.is_(False), Booking.isConfirmed.is_(False))
+            .label("activeBookingsQuantity"),
+            func.sum(Booking.quantity)
+            .filter(Booking.isCancelled.is_(False), or_(Booking.isUsed.is_(True), Booking.isConfirmed.is_(True)))
+            .label("validatedBookingsQuantity"),
+        )
+        .filter(Booking.offererId == offerer_id)
+        .group_by(Booking.venueId)
+        .subquery()
+    )
+    offer_statuses = (
+        db.session.query(Offer.venueId.label("venueId"), Offer.status.label("status"))
+        .join(models.Venue, models.Venue.id == Offer.venueId)
+        .filter(models.Venue.managingOffererId == offerer_id)
+        .subquery()
+    )
+    offers_stats = (
+        db.session.query(
+            offer_statuses.c.venueId,
+            func.count().filter(offer_statuses.c.status == OfferStatus.ACTIVE.name).label("activeOffersCount"),
+            func.count().filter(offer_statuses.c.status == OfferStatus.SOLD_OUT.name).label("soldOutOffersCount"),
+        )
+        .group_by(offer_statuses.c.venueId)
+        .subquery()
+    )
+    rows = (
+        db.session.query(
+            models.Venue.id,
+            func.coalesce(bookings_stats.c.activeBookingsQuantity, 0),
+            func.coalesce(bookings_stats.c.validatedBookingsQuantity, 0),
+            func.coalesce(offers_stats.c.activeOffersCount, 0),
+            func.coalesce(offers_stats.c.soldOutOffersCount, 0),
+        )
+        .outerjoin(bookings_stats, bookings_stats.c.venueId == models.Venue.id)
+        .outerjoin(offers_stats, offers_stats.c.venueId == models.Venue.id)
+        .filter(models.Venue.managingOffererId == offerer_id)
+    )
+    return {
+        venue_id: {
+            "activeBookingsQuantity": active_bookings_quantity,
+            "validatedBookingsQuantity": validated_bookings_quantity,
+            "activeOffersCount": active_offers_count,
+            "soldOutOffersCount": sold_out_offers_count,
+        }
+        for (
+            venue_id,
+            active_bookings_quantity,
+            validated_bookings_quantity,
+            active_offers_count,
+            sold_out_offers_count,
+        ) in rows
+    }
+
+
 def find_offerer_by_siren(siren: str) -> Optional[models.Offerer]:
     return models.Offerer.query.filter_by(siren=siren).one_or_none()
 
@@ -1,13 +1,16 @@
+import csv
 import datetime
+import io
 import logging
+from typing import Iterable
 from typing import Optional
 from typing import Union
 
+from flask import abort
 from psycopg2.errorcodes import CHECK_VIOLATION
 from psycopg2.errorcodes import UNIQUE_VIOLATION
 import pytz
 from sqlalchemy import exc
-from sqlalchemy.orm import joinedload
 import yaml
 from yaml.scanner import ScannerError
 
@@ -22,9 +25,12 @@ from pcapi.core.bookings.models import Booking
 import pcapi.core.bookings.repository as bookings_repository
 from pcapi.core.categories import subcategories
 from pcapi.core.categories.conf import can_create_from_isbn
+from pcapi.core.offerers import api as offerers_api
 from pcapi.core.offers.exceptions import OfferAlreadyReportedError
 from pcapi.core.offers.exceptions import ReportMalformed
 from pcapi.core.offers.exceptions import WrongFormatInFraudConfigurationFile
+from pcapi.core.offers.models import ActivationCodeRejectionReason
+from pcapi.core.offers.models import ActivationCodesIngestionReport
 from pcapi.core.offers.models import OfferReport
 from pcapi.core.offers.models import OfferValidationConfig
 from pcapi.core.offers.models import OfferValidationStatus
@@ -59,6 +65,7 @@ from pcapi.routes.serialization.offers_serialize import PostOfferBodyModel
 from pcapi.routes.serialization.stock_serialize import StockCreationBodyModel
 from pcapi.routes.serialization.stock_serialize import StockEditionBodyModel
 from pcapi.utils import mailing
+from pcapi.utils.db import get_keyset_batches
 from pcapi.utils.rest import check_user_has_access_to_offerer
 from pcapi.utils.rest import load_or_raise_error
 from pcapi.workers.push_notification_job import send_cancel_booking_notification
@@ -72,6 +79,7 @@ from .models import Mediation
 logger = logging.getLogger(__name__)
 
 
+ACTIVATION_CODE_MAX_LENGTH = 255
 OFFERS_RECAP_LIMIT = 201
 UNCHANGED = object()
 VALIDATION_KEYWORDS_MAPPING = {
@@ -122,6 +130,7 @@ def create_offer(offer_data: PostOfferBodyModel, user: User) -> Offer:
 
     repository.save(offer)
     logger.info("Offer has been created", extra={"offer": offer.id, "venue": venue.id, "product": offer.productId})
+    offerers_api.invalidate_venues_stats([venue.managingOffererId])
 
     return offer
 
@@ -243,14 +252,27 @@ def update_offer(
         logger.info("Product has been updated", extra={"product": offer.product.id})
 
     search.async_index_offer_ids([offer.id])
+    offerers_api.invalidate_venues_stats([offer.venue.managingOffererId])
 
     return offer
 
 
 def batch_update_offers(query, update_fields):
-    offer_ids_tuples = query.filter(Offer.validation == OfferValidationStatus.APPROVED).with_entities(Offer.id)
+    offerer_id_subquery = (
+        Venue.query.filter(Venue.id == Offer.venueId)
+        .with_entities(Venue.managingOffererId)
+        .correlate(Offer)
+        .as_scalar()
+    )
+    offer_ids_tuples = query.filter(Offer.validation == OfferValidationStatus.APPROVED).with_entities(
+        Offer.id, offerer_id_subquery
+    )
 
-    offer_ids = [offer_id for offer_id, in offer_ids_tuples]
+    offer_ids = []
+    offerer_ids = set()
+    for offer_id, offerer_id in offer_ids_tuples:
+        offer_ids.append(offer_id)
+        offerer_ids.add(offerer_id)
     number_of_offers_to_update = len(offer_ids)
     batch_size = 1000
     for current_start_index in range(0, number_of_offers_to_update, batch_size):
@@ -264,35 +286,40 @@ def batch_update_offers(query, update_fields):
 
         search.async_index_offer_ids(offer_ids_batch)
 
+    offerers_api.invalidate_venues_stats(offerer_ids)
+
 
-def _create_stock(
+def _get_new_stock_values(
     offer: Offer,
     price: float,
     quantity: int = None,
     beginning: datetime.datetime = None,
     booking_limit_datetime: datetime.datetime = None,
-) -> Stock:
+) -> dict:
     validation.check_required_dates_for_stock(offer, beginning, booking_limit_datetime)
     validation.check_stock_can_be_created_for_offer(offer)
     validation.check_stock_price(price, offer)
     validation.check_stock_quantity(quantity)
 
-    return Stock(
-        offer=offer,
-        price=price,
-        quantity=quantity,
-        beginningDatetime=beginning,
-        bookingLimitDatetime=booking_limit_datetime,
-    )
+    return {
+        "offerId": offer.id,
+        "price": price,
+        "quantity": quantity,
+        "beginningDatetime": beginning,
+        "bookingLimitDatetime": booking_limit_datetime,
+    }
 
 
-def _edit_stock(
+def _get_stock_updates(
     stock: Stock,
     price: float,
     quantity: int,
     beginning: datetime.datetime,
     booking_limit_datetime: datetime.datetime,
-) -> Stock:
+) -> dict:
+    """Check that the stock can be updated with the given values, and
+    return the values to update. The stock itself is left untouched.
+    """
     # FIXME (dbaty, 2020-11-25): We need this ugly workaround because
     # the frontend sends us datetimes like "2020-12-03T14:00:00Z"
     # (note the "Z" suffix). Pydantic deserializes it as a datetime
@@ -336,12 +363,10 @@ def _edit_stock(
         validation.check_stock_has_no_custom_reimbursement_rule(stock)
     if stock.offer.isFromAllocine:
         validation.check_update_only_allowed_stock_fields_for_allocine_offer(updated_fields)
-        stock.fieldsUpdated = list(updated_fields)
+        updates["fieldsUpdated"] = list(updated_fields)
 
-    for model_attr, value in updates.items():
-        setattr(stock, model_attr, value)
-
-    return stock
+    updates["id"] = stock.id
+    return updates
 
 
 def _notify_beneficiaries_upon_stock_edit(stock: Stock):
@@ -369,21 +394,23 @@ def _notify_beneficiaries_upon_stock_edit(stock: Stock):
 def upsert_stocks(
     offer_id: int, stock_data_list: list[Union[StockCreationBodyModel, StockEditionBodyModel]], user: User
 ) -> list[Stock]:
-    activation_codes = []
-    stocks = []
-    edited_stocks = []
+    # Values of created and updated stocks, in the order of `stock_data_list`.
+    upserted_stocks_values = []
+    new_stocks_values = []
+    stock_updates = []
+    new_stocks_activation_codes = []
     edited_stocks_previous_beginnings = {}
 
     offer = offer_queries.get_offer_by_id(offer_id)
+    stocks_to_edit = offers_repository.get_stocks_to_edit(
+        [stock_data.id for stock_data in stock_data_list if isinstance(stock_data, StockEditionBodyModel)]
+    )
 
     for stock_data in stock_data_list:
         if isinstance(stock_data, StockEditionBodyModel):
-            stock = (
-                Stock.queryNotSoftDeleted()
-                .filter_by(id=stock_data.id)
-                .options(joinedload(Stock.activationCodes))
-                .first_or_404()
-            )
+            stock = stocks_to_edit.get(stock_data.id)
+            if not stock:
+                abort(404)
             if stock.offerId != offer_id:
                 errors = ApiErrors()
                 errors.add_error(
@@ -392,15 +419,15 @@ def upsert_stocks(
                 errors.status_code = 403
                 raise errors
             edited_stocks_previous_beginnings[stock.id] = stock.beginningDatetime
-            edited_stock = _edit_stock(
+            updates = _get_stock_updates(
                 stock,
                 price=stock_data.price,
                 quantity=stock_data.quantity,
                 beginning=stock_data.beginning_datetime,
                 booking_limit_datetime=stock_data.booking_limit_datetime,
             )
-            edited_stocks.append(edited_stock)
-            stocks.append(edited_stock)
+            stock_updates.append(updates)
+            upserted_stocks_values.append(updates)
         else:
             activation_codes_exist = stock_data.activation_codes is not None and len(stock_data.activation_codes) > 0  # type: ignore[arg-type]
 
@@ -413,7 +440,7 @@ def upsert_stocks(
 
             quantity = len(stock_data.activation_codes) if activation_codes_exist else stock_data.quantity  # type: ignore[arg-type]
 
-            created_stock = _create_stock(
+            new_stock_values = _get_new_stock_values(
                 offer=offer,
                 price=stock_data.price,
                 quantity=quantity,
@@ -422,18 +449,17 @@ def upsert_stocks(
             )
 
             if activation_codes_exist:
-                for activation_code in stock_data.activation_codes:  # type: ignore[union-attr]
-                    activation_codes.append(
-                        ActivationCode(
-                            code=activation_code,
-                            expirationDate=stock_data.activation_codes_expiration_datetime,
-                            stock=created_stock,
-                        )
-                    )
-
-            stocks.append(created_stock)
-
-    repository.save(*stocks, *activation_codes)
+                new_stocks_activation_codes.append(
+                    (new_stock_values, stock_data.activation_codes, stock_data.activation_codes_expiration_datetime)
+                )
+
+            new_stocks_values.append(new_stock_values)
+            upserted_stocks_values.append(new_stock_values)
+
+    new_stock_ids = offers_repository.generate_stock_ids(len(new_stocks_values))
+    for new_stock_values, stock_id in zip(new_stocks_values, new_stock_ids):
+        new_stock_values["id"] = stock_id
+    _save_stocks(new_stocks_values, stock_updates, new_stocks_activation_codes)
     logger.info("Stock has been created or updated", extra={"offer": offer_id})
 
     if offer.validation == OfferValidationStatus.DRAFT:
@@ -446,13 +472,126 @@ def upsert_stocks(
         if offer.validation == OfferValidationStatus.APPROVED:
             admin_emails.send_offer_creation_notification_to_administration(offer)
 
-    for stock in edited_stocks:
-        previous_beginning = edited_stocks_previous_beginnings[stock.id]
-        if stock.beginningDatetime != previous_beginning and not stock.offer.isEducational:
-            _notify_beneficiaries_upon_stock_edit(stock)
+    for updates in stock_updates:
+        previous_beginning = edited_stocks_previous_beginnings[updates["id"]]
+        if updates["beginningDatetime"] != previous_beginning and not offer.isEducational:
+            _notify_beneficiaries_upon_stock_edit(stocks_to_edit[updates["id"]])
     search.async_index_offer_ids([offer.id])
+    offerers_api.invalidate_venues_stats([offer.venue.managingOffererId])
 
-    return stocks
+    stock_ids = [values["id"] for values in upserted_stocks_values]
+    stocks = {stock.id: stock for stock in Stock.query.filter(Stock.id.in_(stock_ids))}
+    return [stocks[stock_id] for stock_id in stock_ids]
+
+
+def _save_stocks(
+    new_stocks_values: list[dict],
+    stock_updates: list[dict],
+    new_stocks_activation_codes: list[tuple[dict, list[str], Optional[datetime.datetime]]],
+) -> None:
+    """Insert and update stocks with bulk statements, and report
+    database errors as `repository.save()` does.
+    """
+    api_errors = ApiErrors()
+    try:
+        db.session.bulk_insert_mappings(Stock, new_stocks_values)
+        db.session.bulk_update_mappings(Stock, stock_updates)
+        for new_stock_values, activation_codes, expiration_datetime in new_stocks_activation_codes:
+            report = ingest_activation_codes(new_stock_values["id"], activation_codes, expiration_datetime)
+            if report.rejected:
+                db.session.rollback()
+                api_errors.add_error(
+                    "activationCodes",
+                    "Les codes d'activation suivants sont invalides ou en double : " + ", ".join(report.rejected),
+                )
+                raise api_errors
+        db.session.commit()
+    except exc.DataError as data_error:
+        api_errors.add_error(*Stock.restize_data_error(data_error))
+        db.session.rollback()
+        raise api_errors
+    except exc.IntegrityError as integrity_error:
+        api_errors.add_error(*Stock.restize_integrity_error(integrity_error))
+        db.session.rollback()
+        raise api_errors
+    except exc.InternalError as internal_error:
+        api_errors.add_error(*Stock.restize_internal_error(internal_error))
+        db.session.rollback()
+        raise api_errors
+
+
+def ingest_activation_codes(
+    stock_id: int,
+    codes: Iterable[str],
+    expiration_datetime: Optional[datetime.datetime],
+    chunk_size: int = settings.ACTIVATION_CODES_CHUNK_SIZE,
+) -> ActivationCodesIngestionReport:
+    """Insert activation codes of a stock, by chunks of COPY statements.
+
+    Codes are stripped. Invalid codes, codes that are repeated and
+    codes that the stock already has are rejected, and reported. Since
+    ``codes`` may be consumed lazily (e.g. the lines of a file), only
+    the codes themselves are held in memory, for deduplication. The
+    caller must commit.
+    """
+    if expiration_datetime and expiration_datetime.tzinfo:
+        expiration_datetime = expiration_datetime.astimezone(pytz.utc).replace(tzinfo=None)
+    report = ActivationCodesIngestionReport()
+    existing_codes = offers_repository.get_activation_codes_of_stock(stock_id)
+    accepted_codes = set()
+    chunk = []
+    for code in codes:
+        code = code.strip()
+        if not code or len(code) > ACTIVATION_CODE_MAX_LENGTH or not code.isprintable():
+            report.rejected[code] = ActivationCodeRejectionReason.INVALID
+        elif code in accepted_codes:
+            report.rejected[code] = ActivationCodeRejectionReason.DUPLICATE
+        elif code in existing_codes:
+            report.rejected[code] = ActivationCodeRejectionReason.ALREADY_EXISTS
+        else:
+            accepted_codes.add(code)
+            chunk.append(code)
+            if len(chunk) >= chunk_size:
+                _copy_activation_codes(stock_id, chunk, expiration_datetime)
+                report.inserted += len(chunk)
+                chunk = []
+    if chunk:
+        _copy_activation_codes(stock_id, chunk, expiration_datetime)
+        report.inserted += len(chunk)
+    return report
+
+
+def _copy_activation_codes(stock_id: int, codes: list[str], expiration_datetime: Optional[datetime.datetime]) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows((stock_id, code, expiration_datetime) for code in codes)
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        'COPY activation_code ("stockId", code, "expirationDate") FROM STDIN WITH (FORMAT csv)',
+        buffer,
+    )
+
+
+def import_activation_codes(
+    stock: Stock, codes: Iterable[str], expiration_datetime: Optional[datetime.datetime]
+) -> ActivationCodesIngestionReport:
+    """Add activation codes to an existing stock, and increase its
+    quantity accordingly.
+    """
+    validation.check_offer_is_digital(stock.offer)
+    validation.check_activation_codes_expiration_datetime(expiration_datetime, stock.bookingLimitDatetime)
+    with transaction():
+        report = ingest_activation_codes(stock.id, codes, expiration_datetime)
+        if stock.quantity is not None:
+            Stock.query.filter_by(id=stock.id).update(
+                {"quantity": Stock.quantity + report.inserted}, synchronize_session=False
+            )
+    logger.info(
+        "Activation codes have been imported",
+        extra={"stock": stock.id, "inserted": report.inserted, "rejected": len(report.rejected)},
+    )
+    search.async_index_offer_ids([stock.offerId])
+    return report
 
 
 def _invalidate_bookings(bookings: list[Booking]) -> list[Booking]:
@@ -467,6 +606,7 @@ def delete_stock(stock: Stock) -> None:
 
     stock.isSoftDeleted = True
     repository.save(stock)
+    offerers_api.invalidate_venues_stats([stock.offer.venue.managingOffererId])
 
     # the algolia sync for the stock will happen within this function
     cancelled_bookings = cancel_bookings_when_offerer_deletes_stock(stock)
@@ -730,6 +870,7 @@ def update_pending_offer_validation(offer: Offer, validation_status: OfferValida
         )
         return False
     search.async_index_offer_ids([offer.id])
+    offerers_api.invalidate_venues_stats([offer.venue.managingOffererId])
     logger.info("Offer validation status updated", extra={"offer": offer.id})
     return True
 
@@ -780,19 +921,10 @@ def unindex_expired_offers(process_all_expired: bool = False) -> None:
     if process_all_expired:
         interval[0] = datetime.datetime(2000, 1, 1)  # arbitrary old date
 
-    page = 0
-    limit = settings.ALGOLIA_DELETING_OFFERS_CHUNK_SIZE
-    while True:
-        offers = offers_repository.get_expired_offers(interval)
-        offers = offers.offset(page * limit).limit(limit)
-        offer_ids = [offer_id for offer_id, in offers.with_entities(Offer.id)]
-
-        if not offer_ids:
-            break
-
+    offers = offers_repository.get_expired_offers(interval)
+    for offer_ids in get_keyset_batches(offers, Offer.id, settings.ALGOLIA_DELETING_OFFERS_CHUNK_SIZE):
         logger.info("[ALGOLIA] Found %d expired offers to unindex", len(offer_ids))
         search.unindex_offer_ids(offer_ids)
-        page += 1
 
 
 def is_activation_code_applicable(stock: Stock) -> bool:
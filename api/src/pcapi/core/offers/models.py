@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from dataclasses import field
 from datetime import datetime
 from datetime import timedelta
 import enum
@@ -576,6 +577,9 @@ class ActivationCode(PcObject, Model):
 
     booking = relationship("Booking", back_populates="activationCode")
 
+    # Used to claim an available code (see `claim_available_activation_code()`).
+    Index("ix_activation_code_available_stockId", stockId, id, postgresql_where=bookingId.is_(None))
+
     __table_args__ = (
         UniqueConstraint(
             "stockId",
@@ -599,6 +603,18 @@ class OfferValidationConfig(PcObject, Model):
     specs = Column(JSON, nullable=False)
 
 
+class ActivationCodeRejectionReason(enum.Enum):
+    INVALID = "invalid"
+    DUPLICATE = "duplicate"
+    ALREADY_EXISTS = "already exists"
+
+
+@dataclass
+class ActivationCodesIngestionReport:
+    inserted: int = 0
+    rejected: dict[str, ActivationCodeRejectionReason] = field(default_factory=dict)
+
+
 @dataclass
 class ReasonMeta:
     title: str
@@ -186,6 +186,23 @@ def get_stocks_for_offer(offer_id: int) -> list[Stock]:
     )
 
 
+def get_stocks_to_edit(stock_ids: list[int]) -> dict[int, Stock]:
+    stocks = (
+        Stock.queryNotSoftDeleted().filter(Stock.id.in_(stock_ids)).options(joinedload(Stock.activationCodes)).all()
+    )
+    return {stock.id: stock for stock in stocks}
+
+
+def generate_stock_ids(count: int) -> list[int]:
+    """Get ``count`` ids from the sequence of stock ids, so that new
+    stocks can be inserted in bulk and still be referenced right away.
+    """
+    if not count:
+        return []
+    ids = db.session.query(func.nextval("stock_id_seq")).select_from(func.generate_series(1, count)).all()
+    return [stock_id for stock_id, in ids]
+
+
 def get_products_map_by_provider_reference(id_at_providers: list[str]) -> dict[str, Product]:
     products = (
         Product.query.filter(Product.can_be_synchronized)
@@ -273,6 +290,22 @@ def get_and_lock_stock(stock_id: int) -> Stock:
     return stock
 
 
+def reserve_stock_quantity(stock_id: int, quantity: int) -> bool:
+    """Atomically increment the booked quantity of a stock if (and only
+    if) there is enough remaining quantity. Return whether the quantity
+    has been reserved.
+
+    Unlike `get_and_lock_stock()`, the row is only locked by the UPDATE
+    itself, i.e. from here until the end of the current transaction.
+    """
+    updated = Stock.query.filter(
+        Stock.id == stock_id,
+        Stock.isSoftDeleted.is_(False),
+        or_(Stock.quantity.is_(None), Stock.quantity - Stock.dnBookedQuantity >= quantity),
+    ).update({"dnBookedQuantity": Stock.dnBookedQuantity + quantity}, synchronize_session=False)
+    return updated == 1
+
+
 def check_stock_consistency() -> list[int]:
     return [
         item[0]
@@ -340,9 +373,35 @@ def check_activation_is_bookable(activation_code: ActivationCode) -> bool:
     )
 
 
-def get_available_activation_code(stock: Stock) -> Optional[ActivationCode]:
+def _get_available_activation_codes(stock: Stock) -> Query:
     return ActivationCode.query.filter(
         ActivationCode.stockId == stock.id,
         ActivationCode.bookingId.is_(None),
         or_(ActivationCode.expirationDate.is_(None), ActivationCode.expirationDate > func.now()),
-    ).first()
+    )
+
+
+def get_available_activation_code(stock: Stock) -> Optional[ActivationCode]:
+    return _get_available_activation_codes(stock).first()
+
+
+def claim_available_activation_code(stock: Stock) -> Optional[ActivationCode]:
+    """Return an available activation code of the stock, locked until
+    the end of the current transaction.
+
+    Codes that are locked by other transactions are skipped, instead
+    of being waited for. Note that this does not let bookings of the
+    same stock run concurrently: they are serialized by the lock on the
+    stock row (see `reserve_stock_quantity()` and `get_and_lock_stock()`),
+    held until they are committed.
+    """
+    return (
+        _get_available_activation_codes(stock)
+        .order_by(ActivationCode.id)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+
+
+def get_activation_codes_of_stock(stock_id: int) -> set[str]:
+    return {code for code, in db.session.query(ActivationCode.code).filter(ActivationCode.stockId == stock_id)}
@@ -1,5 +1,9 @@
+import csv
 import datetime
+import io
+from typing import Iterable
 from typing import Optional
+from typing import Sequence
 
 from dateutil.relativedelta import relativedelta
 import pytz
@@ -93,6 +97,38 @@ def create_deposit(
     return deposit
 
 
+# Columns of the rows given to `copy_payments()`, in this order.
+PAYMENT_COPY_COLUMNS = (
+    "bookingId",
+    "amount",
+    "reimbursementRule",
+    "reimbursementRate",
+    "customReimbursementRuleId",
+    "author",
+    "transactionLabel",
+    "batchDate",
+    "iban",
+    "bic",
+    "recipientName",
+    "recipientSiren",
+)
+
+
+def copy_payments(payment_rows: Iterable[Sequence]) -> None:
+    """Insert payments with a single COPY statement, which is much
+    faster than INSERT statements when there are many payments.
+
+    Each row holds the values of `PAYMENT_COPY_COLUMNS`. `None` (and
+    empty strings) are inserted as NULL. The caller must commit.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(payment_rows)
+    buffer.seek(0)
+    columns = ", ".join(f'"{column}"' for column in PAYMENT_COPY_COLUMNS)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(f"COPY payment ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
 def bulk_create_payment_statuses(payment_query, status: TransactionStatus, detail=None):
     sel = payment_query.with_entities(Payment.id, sql.literal(status.name), sql.literal(detail))
     query = sql.insert(PaymentStatus).from_select(["paymentId", "status", "detail"], sel)
@@ -11,7 +11,9 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import SmallInteger
 
 from pcapi.core.bookings.models import Booking
+from pcapi.core.offers.models import Offer
 from pcapi.models.db import Model
+from pcapi.models.db import db
 from pcapi.models.pc_object import PcObject
 
 
@@ -41,7 +43,10 @@ class ReimbursementRule:
         return self.is_active(booking) and self.is_relevant(booking, cumulative_revenue)
 
     def apply(self, booking: Booking) -> Decimal:
-        return Decimal(booking.total_amount * self.rate)
+        return self.apply_to_amounts(booking.total_amount, booking.quantity)
+
+    def apply_to_amounts(self, total_amount: Decimal, quantity: int) -> Decimal:
+        return Decimal(total_amount * self.rate)
 
 
 class CustomReimbursementRule(ReimbursementRule, Model):
@@ -111,10 +116,10 @@ class CustomReimbursementRule(ReimbursementRule, Model):
             return True
         return False
 
-    def apply(self, booking: Booking):
+    def apply_to_amounts(self, total_amount: Decimal, quantity: int):
         if self.amount is not None:
-            return booking.quantity * self.amount
-        return booking.total_amount * self.rate
+            return quantity * self.amount
+        return total_amount * self.rate
 
     @property
     def description(self):  # implementation of ReimbursementRule.description
@@ -156,12 +161,45 @@ class Deposit(PcObject, Model):
 
     recredits = relationship("Recredit", order_by="Recredit.dateCreated.desc()")
 
+    # Denormalized amounts of the non-cancelled bookings of the deposit,
+    # updated with the bookings themselves (see `update_spending()`).
+    # Their consistency is checked by `check_deposit_spending_consistency()`.
+    dnSpentAmount = sa.Column(sa.Numeric(10, 2), nullable=False, default=0, server_default="0")
+    dnDigitalSpentAmount = sa.Column(sa.Numeric(10, 2), nullable=False, default=0, server_default="0")
+    dnPhysicalSpentAmount = sa.Column(sa.Numeric(10, 2), nullable=False, default=0, server_default="0")
+    dnUsedAmount = sa.Column(sa.Numeric(10, 2), nullable=False, default=0, server_default="0")
+
     @property
     def specific_caps(self):
         from . import conf
 
         return conf.SPECIFIC_CAPS[self.type][self.version]
 
+    def update_spending(self, amount: Decimal, offer: Offer, spent: int = 0, used: int = 0) -> None:
+        """Update the denormalized spending of the deposit when a
+        booking of ``amount`` is made (``spent=1``), cancelled
+        (``spent=-1``), marked as used (``used=1``) or as unused
+        (``used=-1``).
+
+        Amounts are incremented by an UPDATE that is run right away, in
+        the current transaction, so that concurrent bookings of the
+        same deposit do not overwrite each other's amounts.
+        """
+        if self.id is None or not (spent or used):
+            return
+        values = {}
+        if spent:
+            values["dnSpentAmount"] = Deposit.dnSpentAmount + spent * amount
+            if offer.isDigital and offer.subcategory.is_digital_deposit:
+                values["dnDigitalSpentAmount"] = Deposit.dnDigitalSpentAmount + spent * amount
+            if not offer.isDigital and offer.subcategory.is_physical_deposit:
+                values["dnPhysicalSpentAmount"] = Deposit.dnPhysicalSpentAmount + spent * amount
+        if used:
+            values["dnUsedAmount"] = Deposit.dnUsedAmount + used * amount
+        with db.session.no_autoflush:
+            Deposit.query.filter_by(id=self.id).update(values, synchronize_session=False)
+        db.session.expire(self, list(values))
+
 
 @dataclass
 class GrantedDeposit:
@@ -1,8 +1,87 @@
+from pcapi.core.categories import subcategories
 from pcapi.core.payments.models import Deposit
 from pcapi.core.payments.models import DepositType
 from pcapi.models import User
 from pcapi.models import db
 
 
+# Amounts of the non-cancelled bookings of each deposit. Digital and
+# physical amounts follow `BaseSpecificCaps.digital_cap_applies()` and
+# `BaseSpecificCaps.physical_cap_applies()`, regardless of the caps
+# of the deposit.
+DEPOSIT_SPENDING_QUERY = """
+    SELECT
+      deposit.id AS deposit_id,
+      COALESCE(SUM(booking.amount * booking.quantity), 0) AS spent,
+      COALESCE(
+        SUM(booking.amount * booking.quantity) FILTER (
+          WHERE offer.url IS NOT NULL AND offer.url != ''
+          AND offer."subcategoryId" IN :digital_subcategories
+        ),
+        0
+      ) AS digital_spent,
+      COALESCE(
+        SUM(booking.amount * booking.quantity) FILTER (
+          WHERE (offer.url IS NULL OR offer.url = '')
+          AND offer."subcategoryId" IN :physical_subcategories
+        ),
+        0
+      ) AS physical_spent,
+      COALESCE(SUM(booking.amount * booking.quantity) FILTER (WHERE booking."isUsed"), 0) AS used
+    FROM deposit
+    LEFT OUTER JOIN individual_booking ON individual_booking."depositId" = deposit.id
+    -- The `NOT isCancelled` condition MUST be part of the JOIN.
+    -- If it were part of the WHERE clause, that would exclude
+    -- deposits that only have cancelled bookings.
+    LEFT OUTER JOIN booking
+      ON booking."individualBookingId" = individual_booking.id
+      AND NOT booking."isCancelled"
+    LEFT OUTER JOIN stock ON stock.id = booking."stockId"
+    LEFT OUTER JOIN offer ON offer.id = stock."offerId"
+    {where}
+    GROUP BY deposit.id
+"""
+
+
+def _get_deposit_spending_params() -> dict:
+    return {
+        "digital_subcategories": tuple(s.id for s in subcategories.ALL_SUBCATEGORIES if s.is_digital_deposit),
+        "physical_subcategories": tuple(s.id for s in subcategories.ALL_SUBCATEGORIES if s.is_physical_deposit),
+    }
+
+
 def does_deposit_exists_for_beneficiary_and_type(beneficiary: User, deposit_type: DepositType):
     return db.session.query(Deposit.query.filter_by(userId=beneficiary.id, type=deposit_type.value).exists()).scalar()
+
+
+def recompute_deposit_spending(deposit_ids: list[int]) -> None:
+    if not deposit_ids:
+        return
+    query = f"""
+      WITH spending_per_deposit AS ({DEPOSIT_SPENDING_QUERY.format(where="WHERE deposit.id IN :deposit_ids")})
+      UPDATE deposit
+      SET
+        "dnSpentAmount" = spending_per_deposit.spent,
+        "dnDigitalSpentAmount" = spending_per_deposit.digital_spent,
+        "dnPhysicalSpentAmount" = spending_per_deposit.physical_spent,
+        "dnUsedAmount" = spending_per_deposit.used
+      FROM spending_per_deposit
+      WHERE deposit.id = spending_per_deposit.deposit_id
+    """
+    db.session.execute(query, {"deposit_ids": tuple(deposit_ids), **_get_deposit_spending_params()})
+
+
+def check_deposit_spending_consistency() -> list[int]:
+    query = f"""
+      WITH spending_per_deposit AS ({DEPOSIT_SPENDING_QUERY.format(where="")})
+      SELECT deposit.id
+      FROM deposit
+      JOIN spending_per_deposit ON spending_per_deposit.deposit_id = deposit.id
+      WHERE
+        deposit."dnSpentAmount" != spending_per_deposit.spent
+        OR deposit."dnDigitalSpentAmount" != spending_per_deposit.digital_spent
+        OR deposit."dnPhysicalSpentAmount" != spending_per_deposit.physical_spent
+        OR deposit."dnUsedAmount" != spending_per_deposit.used
+      ORDER BY deposit.id
+    """
+    return [deposit_id for deposit_id, in db.session.execute(query, _get_deposit_spending_params())]
@@ -5,7 +5,6 @@ from sqlalchemy.orm import joinedload
 
 from pcapi import settings
 from pcapi.core.search.backends import base
-from pcapi.models import Offer
 from pcapi.models import Venue
 from pcapi.repository import offer_queries
 from pcapi.utils.module_loading import import_string
@@ -224,16 +223,11 @@ def index_offers_of_venues_in_queue() -> None:
 def _index_offers_of_venues_in_queue(backend: base.SearchBackend) -> None:
     venue_ids = backend.pop_venue_ids_for_offers_from_queue(count=settings.REDIS_VENUE_IDS_FOR_OFFERS_CHUNK_SIZE)
     for venue_id in venue_ids:
-        page = 0
         logger.info("Starting to index offers of venue", extra={"venue": venue_id, "backend": str(backend)})
-        while True:
-            offer_ids = offer_queries.get_paginated_offer_ids_by_venue_id(
-                limit=settings.ALGOLIA_OFFERS_BY_VENUE_CHUNK_SIZE, page=page, venue_id=venue_id
-            )
-            if not offer_ids:
-                break
+        for offer_ids in offer_queries.get_offer_id_batches_by_venue_id(
+            venue_id, batch_size=settings.ALGOLIA_OFFERS_BY_VENUE_CHUNK_SIZE
+        ):
             _reindex_offer_ids(backend, offer_ids)
-            page += 1
         logger.info("Finished indexing offers of venue", extra={"venue": venue_id, "backend": str(backend)})
 
 
@@ -259,10 +253,7 @@ def reindex_offer_ids(offer_ids: Iterable[int]) -> None:
 def _reindex_offer_ids(backend: base.SearchBackend, offer_ids: Iterable[int]) -> None:
     to_add = []
     to_delete = []
-    # FIXME (dbaty, 2021-07-05): join-load Stock, Venue, Offerer,
-    # etc. to avoid N+1 queries on each offer. See related comment in
-    # test_serialize_appsearch:test_check_number_of_sql_queries
-    offers = Offer.query.filter(Offer.id.in_(offer_ids))
+    offers = offer_queries.get_offers_for_indexation(offer_ids)
     for offer in offers:
         if offer and offer.is_eligible_for_search:
             to_add.append(offer)
@@ -178,7 +178,7 @@ class AlgoliaBackend(base.SearchBackend):
             # cache so that we do perform a request to Algolia.
             return True
 
-    def index_offers(self, offers: Iterable[offers_models.Offer]) -> None:
+    def index_offers(self, offers: Iterable[offers_models.Offer], force: bool = False) -> None:
         if not offers:
             return
         objects = [self.serialize_offer(offer) for offer in offers]
@@ -1,16 +1,21 @@
 import collections
+from concurrent import futures
 import datetime
 import decimal
 import enum
+import hashlib
 import json
 import logging
+import os
 import re
+import threading
 import typing
 from typing import Iterable
 import urllib.parse
 
 from flask import current_app
 import redis
+from requests.adapters import HTTPAdapter
 
 from pcapi import settings
 import pcapi.core.offerers.models as offerers_models
@@ -29,6 +34,12 @@ REDIS_OFFER_IDS_IN_ERROR_TO_INDEX = "search:appsearch:offer-ids-in-error-to-inde
 REDIS_VENUE_IDS_FOR_OFFERS_TO_INDEX = "search:appsearch:venue-ids-for-offers-to-index"
 REDIS_VENUE_IDS_IN_ERROR_TO_INDEX = "search:appsearch:venue-ids-in-error-to-index"
 REDIS_VENUE_IDS_TO_INDEX = "search:appsearch:venue-ids-new-to-index"
+# Hash of the last indexed version of each document, to avoid sending
+# unchanged documents again. Hashes expire after
+# `APPSEARCH_DOCUMENT_HASHES_TTL` seconds, so that documents are sent
+# again from time to time anyway.
+REDIS_OFFER_DOCUMENT_HASH = "search:appsearch:offer-document-hash:{document_id}"
+REDIS_VENUE_DOCUMENT_HASH = "search:appsearch:venue-document-hash:{document_id}"
 
 ENGINE_LANGUAGE = "fr"
 # The App Search API accepts up to 100 documents per request
@@ -224,6 +235,12 @@ def get_batches(iterable, engine_selector: typing.Callable, size: int):
             yield engine, batch
 
 
+def get_document_hash(document: dict) -> str:
+    """Return a compact hash of the serialized form of the document."""
+    data = json.dumps(document, cls=AppSearchJsonEncoder, sort_keys=True)
+    return hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+
+
 def get_offer_engine(document_or_offer_id: typing.Union[dict, int]) -> str:
     """Return the name of the engine to be used for the given offer."""
     if isinstance(document_or_offer_id, int):
@@ -368,34 +385,110 @@ class AppSearchBackend(base.SearchBackend):
         # good idea.
         return True
 
-    def index_offers(self, offers: Iterable[offers_models.Offer]) -> None:
+    def index_offers(self, offers: Iterable[offers_models.Offer], force: bool = False) -> None:
         if not offers:
             return
         documents = [self.serialize_offer(offer) for offer in offers]
-        self.offers_engine.create_or_update_documents(documents)
+        self._index_documents(self.offers_engine, documents, REDIS_OFFER_DOCUMENT_HASH, force=force)
 
     def index_venues(self, venues: Iterable[offerers_models.Venue]) -> None:
         if not venues:
             return
         documents = [self.serialize_venue(venue) for venue in venues]
-        self.venues_engine.create_or_update_documents(documents)
+        self._index_documents(self.venues_engine, documents, REDIS_VENUE_DOCUMENT_HASH)
+
+    def _index_documents(
+        self, engine: "AppSearchApiClient", documents: list[dict], hash_key: str, force: bool = False
+    ) -> None:
+        hashes = {document["id"]: get_document_hash(document) for document in documents}
+        if not force:
+            indexed_hashes = self._get_indexed_document_hashes(hash_key, list(hashes))
+            documents = [
+                document for document in documents if hashes[document["id"]] != indexed_hashes.get(document["id"])
+            ]
+            skipped = len(hashes) - len(documents)
+            if skipped:
+                logger.info(
+                    "Skipped indexation of unchanged documents",
+                    extra={"skipped": skipped, "total": len(hashes), "hashes": hash_key},
+                )
+        if not documents:
+            return
+
+        rejected_ids = engine.create_or_update_documents(documents)
+
+        # Documents that App Search rejected must be sent again next time.
+        accepted_hashes = {
+            document["id"]: hashes[document["id"]] for document in documents if str(document["id"]) not in rejected_ids
+        }
+        self._store_document_hashes(hash_key, accepted_hashes)
+
+    def _get_indexed_document_hashes(self, hash_key: str, document_ids: list[int]) -> dict[int, str]:
+        try:
+            indexed_hashes = self.redis_client.mget(
+                [hash_key.format(document_id=document_id) for document_id in document_ids]
+            )
+        except redis.exceptions.RedisError:
+            # We don't know which documents have changed. Index them all.
+            logger.exception("Could not get hashes of indexed documents", extra={"hashes": hash_key})
+            return {}
+        return dict(zip(document_ids, indexed_hashes))
+
+    def _store_document_hashes(self, hash_key: str, hashes: dict[int, str]) -> None:
+        if not hashes:
+            return
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for document_id, document_hash in hashes.items():
+                pipeline.set(
+                    hash_key.format(document_id=document_id), document_hash, ex=settings.APPSEARCH_DOCUMENT_HASHES_TTL
+                )
+            pipeline.execute()
+        except redis.exceptions.RedisError:
+            logger.exception(
+                "Could not store hashes of indexed documents",
+                extra={"documents": list(hashes), "hashes": hash_key},
+            )
+
+    def _forget_document_hashes(self, hash_key: str, document_ids: Iterable[int]) -> None:
+        try:
+            self.redis_client.delete(*[hash_key.format(document_id=document_id) for document_id in document_ids])
+        except redis.exceptions.RedisError:
+            logger.exception("Could not remove hashes of unindexed documents", extra={"hashes": hash_key})
+
+    def _forget_all_document_hashes(self, hash_key: str) -> None:
+        try:
+            keys = []
+            for key in self.redis_client.scan_iter(match=hash_key.format(document_id="*"), count=1000):
+                keys.append(key)
+                if len(keys) == 1000:
+                    self.redis_client.delete(*keys)
+                    keys = []
+            if keys:
+                self.redis_client.delete(*keys)
+        except redis.exceptions.RedisError:
+            logger.exception("Could not clear hashes of indexed documents", extra={"hashes": hash_key})
 
     def unindex_offer_ids(self, offer_ids: Iterable[int]) -> None:
         if not offer_ids:
             return
         self.offers_engine.delete_documents(offer_ids)
+        self._forget_document_hashes(REDIS_OFFER_DOCUMENT_HASH, offer_ids)
 
     def unindex_all_offers(self) -> None:
         self.offers_engine.delete_all_documents()
         self.educational_offers_engine.delete_all_documents()
+        self._forget_all_document_hashes(REDIS_OFFER_DOCUMENT_HASH)
 
     def unindex_venue_ids(self, venue_ids: Iterable[int]) -> None:
         if not venue_ids:
             return
         self.venues_engine.delete_documents(venue_ids)
+        self._forget_document_hashes(REDIS_VENUE_DOCUMENT_HASH, venue_ids)
 
     def unindex_all_venues(self) -> None:
         self.venues_engine.delete_all_documents()
+        self._forget_all_document_hashes(REDIS_VENUE_DOCUMENT_HASH)
 
     @classmethod
     def serialize_offer(cls, offer: offers_models.Offer) -> dict:
@@ -477,6 +570,31 @@ class AppSearchBackend(base.SearchBackend):
         )
 
 
+# HTTP sessions of the process, by host (see `_get_session()`).
+_sessions: dict[tuple[int, str], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def _get_session(host: str) -> requests.Session:
+    """Return the HTTP session of the current process for the given host.
+
+    A new backend (and thus new clients) is instantiated on each call
+    to the functions of `pcapi.core.search`. Sharing the session keeps
+    connections alive between these calls, instead of doing a TLS
+    handshake for each of them. Forked processes get their own session.
+    """
+    key = (os.getpid(), host)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            if host:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.APPSEARCH_MAX_CONCURRENT_REQUESTS)
+                session.mount(host, adapter)
+            _sessions[key] = session
+        return session
+
+
 class AppSearchApiClient:
     def __init__(
         self,
@@ -499,6 +617,8 @@ class AppSearchApiClient:
         self.field_boosts = field_boosts or {}
         self.search_precision = search_precision
         self.schema = schema
+        self.max_concurrent_requests = settings.APPSEARCH_MAX_CONCURRENT_REQUESTS
+        self.session = _get_session(self.host)
 
     @property
     def headers(self):
@@ -516,7 +636,7 @@ class AppSearchApiClient:
             data = {"name": engine_name, "type": "meta", "source_engines": source_engines}
         else:
             data = {"name": engine_name, "language": ENGINE_LANGUAGE}
-        response = requests.post(self.engines_url, headers=self.headers, json=data)
+        response = self.session.post(self.engines_url, headers=self.headers, json=data)
         return response
 
     # Schema API: https://www.elastic.co/guide/en/app-search/current/schema.html
@@ -525,7 +645,7 @@ class AppSearchApiClient:
         return f"{self.host}{path}"
 
     def update_schema(self, engine_name: str):
-        response = requests.post(self.get_schema_url(engine_name), headers=self.headers, json=self.schema)
+        response = self.session.post(self.get_schema_url(engine_name), headers=self.headers, json=self.schema)
         return response
 
     # Synonyms API: https://www.elastic.co/guide/en/app-search/current/synonyms.html
@@ -537,7 +657,7 @@ class AppSearchApiClient:
         url = self.get_synonyms_url(engine_name)
         for synonym_set in self.synonyms:
             data = {"synonyms": list(synonym_set)}
-            response = requests.post(url, headers=self.headers, json=data)
+            response = self.session.post(url, headers=self.headers, json=data)
             yield response
 
     # Search settings API: https://www.elastic.co/guide/en/app-search/current/search-settings.html
@@ -554,18 +674,41 @@ class AppSearchApiClient:
         if self.field_boosts:
             search_settings["boosts"] = self.field_boosts
         url = self.get_search_settings_url(engine_name)
-        return requests.put(url, headers=self.headers, json=search_settings)
+        return self.session.put(url, headers=self.headers, json=search_settings)
 
     # Documents API: https://www.elastic.co/guide/en/app-search/current/documents.html
     def get_documents_url(self, engine_name) -> str:
         path = f"/api/as/v1/engines/{engine_name}/documents"
         return f"{self.host}{path}"
 
-    def create_or_update_documents(self, documents: Iterable[dict]) -> None:
+    def create_or_update_documents(self, documents: Iterable[dict]) -> set[str]:
+        """Index documents and return the ids of documents that App
+        Search rejected.
+        """
         # Error handling is done by the caller.
+        batches_by_engine = collections.defaultdict(list)
         for engine_name, batch in get_batches(documents, self.engine_selector, size=DOCUMENTS_PER_REQUEST_LIMIT):
+            batches_by_engine[engine_name].append(batch)
+
+        # Batches of the same engine are sent one after another, but
+        # batches of different engines are sent in parallel.
+        with futures.ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+            pending = [
+                executor.submit(self._post_document_batches, engine_name, batches)
+                for engine_name, batches in batches_by_engine.items()
+            ]
+        # Raise the first exception, if any. All batches have been
+        # sent (or have failed) at this point.
+        rejected_ids = set()
+        for future in pending:
+            rejected_ids |= future.result()
+        return rejected_ids
+
+    def _post_document_batches(self, engine_name: str, batches: Iterable[list[dict]]) -> set[str]:
+        rejected_ids = set()
+        for batch in batches:
             data = json.dumps(batch, cls=AppSearchJsonEncoder)
-            response = requests.post(self.get_documents_url(engine_name), headers=self.headers, data=data)
+            response = self.session.post(self.get_documents_url(engine_name), headers=self.headers, data=data)
             response.raise_for_status()
             # Except here when App Search returns a 200 OK response
             # even if *some* documents cannot be processed. In that
@@ -575,12 +718,14 @@ class AppSearchApiClient:
             errors = [item for item in response_data if item["errors"]]
             if errors:
                 logger.error("Some documents could not be indexed, possible typing bug", extra={"errors": errors})
+                rejected_ids.update(str(item["id"]) for item in errors)
+        return rejected_ids
 
     def delete_documents(self, document_ids: Iterable[int]) -> None:
         # Error handling is done by the caller.
         for engine_name, batch in get_batches(document_ids, self.engine_selector, size=DOCUMENTS_PER_REQUEST_LIMIT):
             data = json.dumps(batch)
-            response = requests.delete(self.get_documents_url(engine_name), headers=self.headers, data=data)
+            response = self.session.delete(self.get_documents_url(engine_name), headers=self.headers, data=data)
             response.raise_for_status()
 
             if engine_name in OFFERS_ENGINE_NAMES:
@@ -590,7 +735,7 @@ class AppSearchApiClient:
                 # If it's a regular offer, the DELETE request below will be a no-op.
                 # In both cases we make extra requests, but we cannot easily avoid that since
                 # we can only have the document id and not an Offer or Venue object.
-                response = requests.delete(
+                response = self.session.delete(
                     self.get_documents_url(EDUCATIONAL_OFFERS_ENGINE_NAME),
                     headers=self.headers,
                     data=data,
@@ -607,7 +752,7 @@ class AppSearchApiClient:
         page = 1
         while True:
             page_data = {"page": {"page": page, "size": DOCUMENTS_PER_REQUEST_LIMIT}}
-            response = requests.get(list_url, headers=self.headers, json=page_data)
+            response = self.session.get(list_url, headers=self.headers, json=page_data)
             document_ids = [int(document["id"].split("|")[-1]) for document in response.json()["results"]]
             if not document_ids:
                 break
@@ -40,7 +40,11 @@ class SearchBackend:
     def check_offer_is_indexed(self, offer: "offers_models.Offer") -> bool:
         raise NotImplementedError()
 
-    def index_offers(self, offers: "Iterable[offers_models.Offer]") -> None:
+    def index_offers(self, offers: "Iterable[offers_models.Offer]", force: bool = False) -> None:
+        """Index the offers. Backends that skip offers that have not
+        changed since they were last indexed must index them anyway
+        if ``force`` is set.
+        """
         raise NotImplementedError()
 
     def index_venues(self, offers: "Iterable[offerers_models.Venue]") -> None:
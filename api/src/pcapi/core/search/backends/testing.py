@@ -12,6 +12,7 @@ class FakeClient:
     def create_or_update_documents(self, documents):
         for document in documents:
             testing.search_store[self.key][document["id"]] = document
+        return set()
 
     def delete_documents(self, document_ids):
         for document_id in document_ids:
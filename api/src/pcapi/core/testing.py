@@ -11,9 +11,11 @@ import sqlalchemy.orm
 
 from pcapi import settings
 from pcapi.models.feature import Feature
+from pcapi.models.feature import invalidate_features_snapshot
 
 
-# 1. SELECT the user session.
+# 1. SELECT the user session (unless it has already been checked,
+#    see `pcapi.core.users.identity_cache`).
 # 2. SELECT the user.
 AUTHENTICATION_QUERIES = 2
 
@@ -259,15 +261,9 @@ class override_features(TestContextDecorator):
             if status != state[name]:
                 self.apply_to_revert[name] = not status
                 Feature.query.filter_by(name=name).update({"isActive": status})
-        # Clear the feature cache on request if any
-        if flask.has_request_context():
-            if hasattr(flask.request, "_cached_features"):
-                flask.request._cached_features = {}
+        invalidate_features_snapshot()
 
     def disable(self):
         for name, status in self.apply_to_revert.items():
             Feature.query.filter_by(name=name).update({"isActive": status})
-        # Clear the feature cache on request if any
-        if flask.has_request_context():
-            if hasattr(flask.request, "_cached_features"):
-                flask.request._cached_features = {}
+        invalidate_features_snapshot()
@@ -90,6 +90,7 @@ from pcapi.utils.mailing import MailServiceException
 
 from . import constants
 from . import exceptions
+from . import identity_cache
 from ..offerers.api import create_digital_venue
 from ..offerers.models import Offerer
 
@@ -431,8 +432,10 @@ def suspend_account(user: User, reason: constants.SuspensionReason, actor: User)
     user.setPassword(secrets.token_urlsafe(30))
     repository.save(user)
 
-    sessions = UserSession.query.filter_by(userId=user.id)
+    sessions = UserSession.query.filter_by(userId=user.id).all()
+    session_uuids = [session.uuid for session in sessions]
     repository.delete(*sessions)
+    identity_cache.forget_sessions(user.id, session_uuids)
 
     n_bookings = 0
 
@@ -533,9 +536,11 @@ def change_user_email(token: str) -> None:
         return
 
     current_user.email = new_email
-    sessions = UserSession.query.filter_by(userId=current_user.id)
+    sessions = UserSession.query.filter_by(userId=current_user.id).all()
+    session_uuids = [session.uuid for session in sessions]
     repository.delete(*sessions)
     repository.save(current_user)
+    identity_cache.forget_sessions(current_user.id, session_uuids)
 
     logger.info("User has changed their email", extra={"user": current_user.id})
 
@@ -586,35 +591,49 @@ def get_domains_credit(user: User, user_bookings: list[bookings_models.Booking]
     if not user.deposit:
         return None
 
-    if user_bookings is None:
-        deposit_bookings = bookings_repository.get_bookings_from_deposit(user.deposit.id)
+    specific_caps = user.deposit.specific_caps
+    if FeatureToggle.USE_DENORMALIZED_DEPOSIT_SPENDING.is_active():
+        bookings_total = user.deposit.dnSpentAmount
+        digital_bookings_total = user.deposit.dnDigitalSpentAmount
+        physical_bookings_total = user.deposit.dnPhysicalSpentAmount
     else:
-        deposit_bookings = [
-            booking
-            for booking in user_bookings
-            if booking.individualBooking is not None
-            and booking.individualBooking.depositId == user.deposit.id
-            and booking.status != bookings_models.BookingStatus.CANCELLED
-        ]
+        if user_bookings is None:
+            deposit_bookings = bookings_repository.get_bookings_from_deposit(user.deposit.id)
+        else:
+            deposit_bookings = [
+                booking
+                for booking in user_bookings
+                if booking.individualBooking is not None
+                and booking.individualBooking.depositId == user.deposit.id
+                and booking.status != bookings_models.BookingStatus.CANCELLED
+            ]
+        bookings_total = sum(booking.total_amount for booking in deposit_bookings)
+        # Check caps first, so that offers are not loaded if no cap applies.
+        digital_bookings_total = sum(
+            [
+                booking.total_amount
+                for booking in deposit_bookings
+                if specific_caps.DIGITAL_CAP and specific_caps.digital_cap_applies(booking.stock.offer)
+            ]
+        )
+        physical_bookings_total = sum(
+            [
+                booking.total_amount
+                for booking in deposit_bookings
+                if specific_caps.PHYSICAL_CAP and specific_caps.physical_cap_applies(booking.stock.offer)
+            ]
+        )
 
     domains_credit = DomainsCredit(
         all=Credit(
             initial=user.deposit.amount,
-            remaining=max(user.deposit.amount - sum(booking.total_amount for booking in deposit_bookings), Decimal("0"))
+            remaining=max(user.deposit.amount - bookings_total, Decimal("0"))
             if user.has_active_deposit
             else Decimal("0"),
         )
     )
-    specific_caps = user.deposit.specific_caps
 
     if specific_caps.DIGITAL_CAP:
-        digital_bookings_total = sum(
-            [
-                booking.total_amount
-                for booking in deposit_bookings
-                if specific_caps.digital_cap_applies(booking.stock.offer)
-            ]
-        )
         domains_credit.digital = Credit(
             initial=specific_caps.DIGITAL_CAP,
             remaining=(
@@ -626,13 +645,6 @@ def get_domains_credit(user: User, user_bookings: list[bookings_models.Booking]
         )
 
     if specific_caps.PHYSICAL_CAP:
-        physical_bookings_total = sum(
-            [
-                booking.total_amount
-                for booking in deposit_bookings
-                if specific_caps.physical_cap_applies(booking.stock.offer)
-            ]
-        )
         domains_credit.physical = Credit(
             initial=specific_caps.PHYSICAL_CAP,
             remaining=(
@@ -0,0 +1,79 @@
+"""Cache of the sessions of authenticated users.
+
+On each request authenticated with a session cookie (pro and admin),
+we check that the session exists before fetching the user, i.e. two
+database round trips. This module remembers in Redis, for a short
+while (see the ``USER_IDENTITY_CACHE_TTL`` setting, 0 disables the
+cache), the sessions that exist, which saves the first one. The user
+itself is still fetched from the database, so that its current status
+and roles are used.
+
+Cached sessions are forgotten when they are deleted (logout,
+suspension, change of email).
+"""
+
+import logging
+import typing
+from typing import Optional
+from uuid import UUID
+
+from flask import current_app
+import redis
+
+from pcapi import settings
+from pcapi.repository.user_session_queries import existing_user_session
+
+
+logger = logging.getLogger(__name__)
+
+REDIS_SESSION = "cache:user-identity:{user_id}:session:{session_uuid}"
+
+
+def _get(key: str) -> Optional[str]:
+    try:
+        return current_app.redis_client.get(key)
+    except redis.exceptions.RedisError:
+        logger.exception("Could not get user session from cache", extra={"key": key})
+        return None
+
+
+def _set(key: str, value: int) -> None:
+    try:
+        current_app.redis_client.set(key, value, ex=settings.USER_IDENTITY_CACHE_TTL)
+    except redis.exceptions.RedisError:
+        logger.exception("Could not store user session in cache", extra={"key": key})
+
+
+def _delete(*keys: str) -> None:
+    if not keys:
+        return
+    try:
+        current_app.redis_client.delete(*keys)
+    except redis.exceptions.RedisError:
+        logger.exception("Could not invalidate user session cache", extra={"keys": keys})
+
+
+def user_session_exists(user_id: typing.Union[int, str], session_uuid: Optional[UUID]) -> bool:
+    """Return whether the session exists, like `existing_user_session`."""
+    if not settings.USER_IDENTITY_CACHE_TTL or not session_uuid:
+        return existing_user_session(user_id, session_uuid)
+
+    key = REDIS_SESSION.format(user_id=user_id, session_uuid=session_uuid)
+    if _get(key):
+        return True
+    if not existing_user_session(user_id, session_uuid):
+        return False
+    _set(key, 1)
+    return True
+
+
+def forget_sessions(user_id: int, session_uuids: typing.Iterable[Optional[UUID]]) -> None:
+    """Forget sessions that have been deleted."""
+    _delete(
+        *(
+            REDIS_SESSION.format(user_id=user_id, session_uuid=session_uuid)
+            for session_uuid in session_uuids
+            if session_uuid
+        )
+    )
+
@@ -293,7 +293,10 @@ class User(PcObject, Model, NeedsValidationMixin):
 
     @property
     def real_wallet_balance(self):
-        balance = db.session.query(sa.func.get_wallet_balance(self.id, True)).scalar()
+        if FeatureToggle.USE_DENORMALIZED_DEPOSIT_SPENDING.is_active():
+            balance = self.deposit.amount - self.deposit.dnUsedAmount if self.has_active_deposit else 0
+        else:
+            balance = db.session.query(sa.func.get_wallet_balance(self.id, True)).scalar()
         # Balance can be negative if the user has booked in the past
         # but their deposit has expired. We don't want to expose a
         # negative number.
@@ -301,7 +304,10 @@ class User(PcObject, Model, NeedsValidationMixin):
 
     @property
     def wallet_balance(self):
-        balance = db.session.query(sa.func.get_wallet_balance(self.id, False)).scalar()
+        if FeatureToggle.USE_DENORMALIZED_DEPOSIT_SPENDING.is_active():
+            balance = self.deposit.amount - self.deposit.dnSpentAmount if self.has_active_deposit else 0
+        else:
+            balance = db.session.query(sa.func.get_wallet_balance(self.id, False)).scalar()
         return max(0, balance)
 
     @property
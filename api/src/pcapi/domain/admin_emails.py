@@ -1,3 +1,6 @@
+from typing import Iterable
+from typing import Union
+
 from pcapi import settings
 from pcapi.core import mails
 from pcapi.core.offerers.models import Offerer
@@ -31,7 +34,7 @@ def send_payment_details_email(csv_attachment: str, recipients: list[str]) -> bo
     return mails.send(recipients=recipients, data=email)
 
 
-def send_wallet_balances_email(csv_attachment: str, recipients: list[str]) -> bool:
+def send_wallet_balances_email(csv_attachment: Union[str, Iterable[str]], recipients: list[str]) -> bool:
     email = make_wallet_balances_email(csv_attachment)
     return mails.send(recipients=recipients, data=email)
 
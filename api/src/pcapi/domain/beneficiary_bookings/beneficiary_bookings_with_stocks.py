@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from pcapi.domain.beneficiary_bookings.beneficiary_booking import BeneficiaryBooking
 from pcapi.domain.beneficiary_bookings.stock import Stock
 
@@ -6,3 +8,9 @@ class BeneficiaryBookingsWithStocks:
     def __init__(self, bookings: list[BeneficiaryBooking], stocks: list[Stock]):
         self.bookings = bookings
         self.stocks = stocks
+        self._stocks_by_offer_id: dict[int, list[Stock]] = defaultdict(list)
+        for stock in stocks:
+            self._stocks_by_offer_id[stock.offer_id].append(stock)
+
+    def get_stocks_of_offer(self, offer_id: int) -> list[Stock]:
+        return self._stocks_by_offer_id.get(offer_id, [])
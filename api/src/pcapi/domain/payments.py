@@ -5,7 +5,10 @@ from datetime import timedelta
 from decimal import Decimal
 from io import BytesIO
 from io import StringIO
+import itertools
 import logging
+from typing import Iterable
+from typing import Iterator
 from uuid import UUID
 
 from flask import render_template
@@ -15,7 +18,7 @@ from pcapi import settings
 from pcapi.core.bookings.models import Booking
 import pcapi.core.payments.models as payments_models
 from pcapi.domain.bank_account import format_raw_iban_and_bic
-from pcapi.domain.reimbursement import BookingReimbursement
+from pcapi.domain.reimbursement import BookingRowReimbursement
 from pcapi.models import db
 from pcapi.models.payment import Payment
 from pcapi.models.payment_status import TransactionStatus
@@ -116,43 +119,36 @@ class PaymentDetails:
         ]
 
 
-def create_payment_for_booking(reimbursement: BookingReimbursement, batch_date: datetime) -> Payment:
-    venue = reimbursement.booking.venue
-    offerer = reimbursement.booking.offerer
-
-    payment = Payment()
-    payment.bookingId = reimbursement.booking.id
-    payment.amount = reimbursement.reimbursed_amount
-    if isinstance(reimbursement.rule, payments_models.CustomReimbursementRule):
-        payment.customReimbursementRuleId = reimbursement.rule.id
-    else:
-        payment.reimbursementRule = reimbursement.rule.description
-    payment.reimbursementRate = reimbursement.rule.rate
-    payment.author = "batch"
-    payment.transactionLabel = make_transaction_label(datetime.utcnow())
-    payment.batchDate = batch_date
-
-    if venue.iban:
-        payment.iban = format_raw_iban_and_bic(venue.iban)
-        payment.bic = format_raw_iban_and_bic(venue.bic)
+def create_payment_row_for_booking_row(
+    reimbursement: BookingRowReimbursement, batch_date: datetime, transaction_label: str
+) -> tuple:
+    """Return the payment of a reimbursed booking, as a row of
+    `payments_api.PAYMENT_COPY_COLUMNS`.
+
+    The IBAN and BIC of the venue are used if it has any, otherwise
+    those of the offerer.
+    """
+    row = reimbursement.row
+    rule = reimbursement.rule
+    is_custom_rule = isinstance(rule, payments_models.CustomReimbursementRule)
+    if row.venueIban:
+        iban, bic = row.venueIban, row.venueBic
     else:
-        payment.iban = format_raw_iban_and_bic(offerer.iban)
-        payment.bic = format_raw_iban_and_bic(offerer.bic)
-
-    payment.recipientName = offerer.name
-    payment.recipientSiren = offerer.siren
-
-    return payment
-
-
-def filter_out_already_paid_for_bookings(
-    booking_reimbursements: list[BookingReimbursement],
-) -> list[BookingReimbursement]:
-    return list(filter(lambda x: not x.booking.payments, booking_reimbursements))
-
-
-def filter_out_bookings_without_cost(booking_reimbursements: list[BookingReimbursement]) -> list[BookingReimbursement]:
-    return list(filter(lambda x: x.reimbursed_amount > Decimal(0), booking_reimbursements))
+        iban, bic = row.offererIban, row.offererBic
+    return (
+        row.id,
+        reimbursement.reimbursed_amount,
+        None if is_custom_rule else rule.description,
+        rule.rate,
+        rule.id if is_custom_rule else None,
+        "batch",
+        transaction_label,
+        batch_date,
+        format_raw_iban_and_bic(iban),
+        format_raw_iban_and_bic(bic),
+        row.offererName,
+        row.offererSiren,
+    )
 
 
 def keep_only_not_processable_payments(payments: list[Payment]) -> list[Payment]:
@@ -251,13 +247,30 @@ def generate_payment_details_csv(payment_query) -> str:
     return output.getvalue()
 
 
-def generate_wallet_balances_csv(wallet_balances: list[WalletBalance]) -> str:
+def iter_wallet_balances_csv(
+    wallet_balances: Iterable[WalletBalance], batch_size: int = settings.WALLET_BALANCES_BATCH_SIZE
+) -> Iterator[str]:
+    """Yield the CSV of wallet balances by chunks of (at most)
+    ``batch_size`` rows, the first chunk being the header, so that the
+    whole CSV does not have to be held in memory.
+    """
     output = StringIO()
-    csv_lines = [balance.as_csv_row() for balance in wallet_balances]
     writer = csv.writer(output, quoting=csv.QUOTE_NONNUMERIC)
     writer.writerow(WalletBalance.CSV_HEADER)
-    writer.writerows(csv_lines)
-    return output.getvalue()
+    yield output.getvalue()
+    wallet_balances = iter(wallet_balances)
+    while True:
+        batch = list(itertools.islice(wallet_balances, batch_size))
+        if not batch:
+            break
+        output.seek(0)
+        output.truncate()
+        writer.writerows(balance.as_csv_row() for balance in batch)
+        yield output.getvalue()
+
+
+def generate_wallet_balances_csv(wallet_balances: Iterable[WalletBalance]) -> str:
+    return "".join(iter_wallet_balances_csv(wallet_balances))
 
 
 def make_transaction_label(date: datetime.date) -> str:
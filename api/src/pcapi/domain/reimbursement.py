@@ -1,19 +1,40 @@
+import bisect
 from collections import defaultdict
 from dataclasses import dataclass
 import datetime
 from decimal import Decimal
+from typing import Any
+from typing import Iterable
 from typing import Optional
 
 from pcapi.core.categories import subcategories
 import pcapi.core.payments.models as payments_models
 from pcapi.models import Booking
 from pcapi.models import Offer
+from pcapi.models import Stock
 
 
 # A new set rules are in effect as of 1 September 2021 (i.e. 31 August 22:00 UTC)
 SEPTEMBER_2021 = datetime.datetime(2021, 9, 1) - datetime.timedelta(hours=2)
 
 
+class RevenueBracketReimbursementRule(payments_models.ReimbursementRule):
+    """A rule that only applies when the cumulative revenue is above
+    `min_revenue` (excluded) and up to `max_revenue` (included). A
+    bound that is None is not checked.
+    """
+
+    min_revenue: Optional[int] = None
+    max_revenue: Optional[int] = None
+
+    def is_in_revenue_bracket(self, cumulative_revenue: Decimal) -> bool:
+        if self.min_revenue is not None and cumulative_revenue <= self.min_revenue:
+            return False
+        if self.max_revenue is not None and cumulative_revenue > self.max_revenue:
+            return False
+        return True
+
+
 class DigitalThingsReimbursement(payments_models.ReimbursementRule):
     rate = Decimal(0)
     description = "Pas de remboursement pour les offres digitales"
@@ -49,117 +70,130 @@ class PhysicalOffersReimbursement(payments_models.ReimbursementRule):
         return is_relevant_for_standard_reimbursement_rule(booking.stock.offer)
 
 
-class MaxReimbursementByOfferer(payments_models.ReimbursementRule):
+class MaxReimbursementByOfferer(RevenueBracketReimbursementRule):
     # This rule is not used anymore.
     rate = Decimal(0)
     description = "Pas de remboursement au dessus du plafond de 20 000 € par acteur culturel"
     valid_from = None
     valid_until = None
+    min_revenue = 20000
 
     def is_relevant(self, booking: Booking, cumulative_revenue: Decimal) -> bool:
         if not is_relevant_for_standard_reimbursement_rule(booking.stock.offer):
             return False
-        return cumulative_revenue > 20000
+        return self.is_in_revenue_bracket(cumulative_revenue)
 
 
-class LegacyPreSeptember2021ReimbursementRateByVenueBetween20000And40000(payments_models.ReimbursementRule):
+class LegacyPreSeptember2021ReimbursementRateByVenueBetween20000And40000(RevenueBracketReimbursementRule):
     rate = Decimal("0.95")
     description = "Remboursement à 95% entre 20 000 € et 40 000 € par lieu"
     valid_from = None
     valid_until = SEPTEMBER_2021
+    min_revenue = 20000
+    max_revenue = 40000
 
     def is_relevant(self, booking: Booking, cumulative_revenue: Decimal) -> bool:
         if not is_relevant_for_standard_reimbursement_rule(booking.stock.offer):
             return False
-        return 20000 < cumulative_revenue <= 40000
+        return self.is_in_revenue_bracket(cumulative_revenue)
 
 
-class LegacyPreSeptember2021ReimbursementRateByVenueBetween40000And150000(payments_models.ReimbursementRule):
+class LegacyPreSeptember2021ReimbursementRateByVenueBetween40000And150000(RevenueBracketReimbursementRule):
     rate = Decimal("0.85")
     description = "Remboursement à 85% entre 40 000 € et 150 000 € par lieu"
     valid_from = None
     valid_until = SEPTEMBER_2021
+    min_revenue = 40000
+    max_revenue = 150000
 
     def is_relevant(self, booking: Booking, cumulative_revenue: Decimal) -> bool:
         if not is_relevant_for_standard_reimbursement_rule(booking.stock.offer):
             return False
-        return 40000 < cumulative_revenue <= 150000
+        return self.is_in_revenue_bracket(cumulative_revenue)
 
 
-class LegacyPreSeptember2021ReimbursementRateByVenueAbove150000(payments_models.ReimbursementRule):
+class LegacyPreSeptember2021ReimbursementRateByVenueAbove150000(RevenueBracketReimbursementRule):
     rate = Decimal("0.70")
     description = "Remboursement à 70% au dessus de 150 000 € par lieu"
     valid_from = None
     valid_until = SEPTEMBER_2021
+    min_revenue = 150000
 
     def is_relevant(self, booking: Booking, cumulative_revenue: Decimal) -> bool:
         if not is_relevant_for_standard_reimbursement_rule(booking.stock.offer):
             return False
-        return cumulative_revenue > 150000
+        return self.is_in_revenue_bracket(cumulative_revenue)
 
 
-class ReimbursementRateByVenueBetween20000And40000(payments_models.ReimbursementRule):
+class ReimbursementRateByVenueBetween20000And40000(RevenueBracketReimbursementRule):
     rate = Decimal("0.95")
     description = "Remboursement à 95% entre 20 000 € et 40 000 € par lieu (>= 2021-09-01)"
     valid_from = SEPTEMBER_2021
     valid_until = None
+    min_revenue = 20000
+    max_revenue = 40000
 
     def is_relevant(self, booking: Booking, cumulative_revenue: Decimal) -> bool:
         if not is_relevant_for_standard_reimbursement_rule(booking.stock.offer):
             return False
-        return 20000 < cumulative_revenue <= 40000
+        return self.is_in_revenue_bracket(cumulative_revenue)
 
 
-class ReimbursementRateByVenueBetween40000And150000(payments_models.ReimbursementRule):
+class ReimbursementRateByVenueBetween40000And150000(RevenueBracketReimbursementRule):
     rate = Decimal("0.92")
     description = "Remboursement à 92% entre 40 000 € et 150 000 € par lieu (>= 2021-09-01)"
     valid_from = SEPTEMBER_2021
     valid_until = None
+    min_revenue = 40000
+    max_revenue = 150000
 
     def is_relevant(self, booking: Booking, cumulative_revenue: Decimal) -> bool:
         if not is_relevant_for_standard_reimbursement_rule(booking.stock.offer):
             return False
-        return 40000 < cumulative_revenue <= 150000
+        return self.is_in_revenue_bracket(cumulative_revenue)
 
 
-class ReimbursementRateByVenueAbove150000(payments_models.ReimbursementRule):
+class ReimbursementRateByVenueAbove150000(RevenueBracketReimbursementRule):
     rate = Decimal("0.90")
     description = "Remboursement à 90% au dessus de 150 000 € par lieu (>= 2021-09-01)"
     valid_from = SEPTEMBER_2021
     valid_until = None
+    min_revenue = 150000
 
     def is_relevant(self, booking: Booking, cumulative_revenue: Decimal) -> bool:
         if not is_relevant_for_standard_reimbursement_rule(booking.stock.offer):
             return False
-        return cumulative_revenue > 150000
+        return self.is_in_revenue_bracket(cumulative_revenue)
 
 
-class ReimbursementRateForBookBelow20000(payments_models.ReimbursementRule):
+class ReimbursementRateForBookBelow20000(RevenueBracketReimbursementRule):
     rate = Decimal(1)
     description = "Remboursement à 100% jusqu'à 20 000 € pour les livres"
     valid_from = None
     valid_until = None
+    max_revenue = 20000
 
     def is_relevant(self, booking: Booking, cumulative_revenue: Decimal) -> bool:
         if booking.stock.offer.subcategory.reimbursement_rule != subcategories.ReimbursementRuleChoices.BOOK.value:
             return False
         if booking.stock.offer.isEducational:
             return False
-        return cumulative_revenue <= 20000
+        return self.is_in_revenue_bracket(cumulative_revenue)
 
 
-class ReimbursementRateForBookAbove20000(payments_models.ReimbursementRule):
+class ReimbursementRateForBookAbove20000(RevenueBracketReimbursementRule):
     rate = Decimal("0.95")
     description = "Remboursement à 95% au dessus de 20 000 € pour les livres"
     valid_from = None
     valid_until = None
+    min_revenue = 20000
 
     def is_relevant(self, booking: Booking, cumulative_revenue: Decimal) -> bool:
         if booking.stock.offer.subcategory.reimbursement_rule != subcategories.ReimbursementRuleChoices.BOOK.value:
             return False
         if booking.stock.offer.isEducational:
             return False
-        return cumulative_revenue > 20000
+        return self.is_in_revenue_bracket(cumulative_revenue)
 
 
 REGULAR_RULES = [
@@ -184,9 +218,103 @@ class BookingReimbursement:
     reimbursed_amount: Decimal
 
 
-class CustomRuleFinder:
+@dataclass
+class BookingRowReimbursement:
+    # A row of `find_booking_rows_eligible_for_payment_for_venue()`.
+    row: Any
+    rule: payments_models.ReimbursementRule
+    reimbursed_amount: Decimal
+
+
+# Thresholds of the cumulative revenue of the venue that regular rules
+# depend on: `RegularRuleFinder` supposes that bookings whose cumulative
+# revenue falls between the same two thresholds get the same rule.
+REVENUE_THRESHOLDS = tuple(
+    sorted(
+        {
+            Decimal(bound)
+            for rule in REGULAR_RULES
+            if isinstance(rule, RevenueBracketReimbursementRule)
+            for bound in (rule.min_revenue, rule.max_revenue)
+            if bound is not None
+        }
+    )
+)
+
+
+def _make_fake_booking(  # pylint: disable=too-many-arguments
+    offer_id: Optional[int],
+    offerer_id: Optional[int],
+    subcategory_id: str,
+    is_educational: bool,
+    date_used: datetime.datetime,
+    amount: Decimal = Decimal(1),
+    quantity: int = 1,
+) -> Booking:
+    """Return a transient booking with only what reimbursement rules
+    look at. It is never added to the session.
+    """
+    stock = Stock(offerId=offer_id)
+    stock.offer = Offer(id=offer_id, subcategoryId=subcategory_id, isEducational=is_educational)
+    booking = Booking(offererId=offerer_id, dateUsed=date_used, amount=amount, quantity=quantity)
+    booking.stock = stock
+    return booking
+
+
+class RegularRuleFinder:
+    """Find the regular rule of bookings that are given as plain rows.
+
+    Regular rules only depend on the subcategory of the offer, whether
+    it is educational, the validity period of rules in which the
+    booking has been used, and the bracket of the cumulative revenue.
+    Instead of trying all `REGULAR_RULES` on each booking, the rule is
+    computed once for each combination (on a fake booking) and cached.
+    """
+
     def __init__(self):
-        self.rules = payments_models.CustomReimbursementRule.query.all()
+        self.period_bounds = sorted(
+            {bound for rule in REGULAR_RULES for bound in (rule.valid_from, rule.valid_until) if bound}
+        )
+        self._rules: dict[tuple, payments_models.ReimbursementRule] = {}
+        self._counts_in_revenue: dict[tuple[str, bool], bool] = {}
+
+    def counts_in_revenue(self, subcategory_id: str, is_educational: bool) -> bool:
+        """Return whether the booking of such an offer increases the
+        cumulative revenue of the venue.
+        """
+        key = (subcategory_id, is_educational)
+        if key not in self._counts_in_revenue:
+            offer = Offer(subcategoryId=subcategory_id, isEducational=is_educational)
+            self._counts_in_revenue[key] = (
+                is_relevant_for_standard_reimbursement_rule(offer)
+                or offer.subcategory.reimbursement_rule == subcategories.ReimbursementRuleChoices.BOOK.value
+            )
+        return self._counts_in_revenue[key]
+
+    def get_rule(
+        self,
+        subcategory_id: str,
+        is_educational: bool,
+        date_used: datetime.datetime,
+        cumulative_revenue: Decimal,
+    ) -> payments_models.ReimbursementRule:
+        period = bisect.bisect_right(self.period_bounds, date_used)
+        bracket = bisect.bisect_left(REVENUE_THRESHOLDS, cumulative_revenue)
+        key = (subcategory_id, is_educational, period, bracket)
+        if key not in self._rules:
+            # The rule is the same for all bookings with the same key,
+            # and the amount of bookings does not change which rule is
+            # the most favourable.
+            booking = _make_fake_booking(None, None, subcategory_id, is_educational, date_used)
+            self._rules[key] = get_regular_reimbursement_rule(booking, cumulative_revenue)
+        return self._rules[key]
+
+
+class CustomRuleFinder:
+    def __init__(self, rules: list[payments_models.CustomReimbursementRule] = None):
+        if rules is None:
+            rules = payments_models.CustomReimbursementRule.query.all()
+        self.rules = rules
         self.rules_by_offer = self._partition_by_field("offerId")
         self.rules_by_offerer = self._partition_by_field("offererId")
 
@@ -205,23 +333,40 @@ class CustomRuleFinder:
                 return rule
         return None
 
+    def get_rule_for_row(self, row) -> Optional[payments_models.CustomReimbursementRule]:
+        # Most bookings are not concerned by any custom rule: do not
+        # build a fake booking for them.
+        if row.offerId not in self.rules_by_offer and row.offererId not in self.rules_by_offerer:
+            return None
+        booking = _make_fake_booking(
+            row.offerId, row.offererId, row.subcategoryId, row.isEducational, row.dateUsed, row.amount, row.quantity
+        )
+        return self.get_rule(booking)
+
+
+def find_all_booking_row_reimbursements(
+    rows: Iterable, custom_rule_finder: CustomRuleFinder
+) -> list[BookingRowReimbursement]:
+    """Return the reimbursement of each booking of a venue, given as
+    rows of `find_booking_rows_eligible_for_payment_for_venue()`.
 
-def find_all_booking_reimbursements(
-    bookings: list[Booking], custom_rule_finder: CustomRuleFinder
-) -> list[BookingReimbursement]:
+    The cumulative revenue of the venue, that regular rules depend on,
+    is computed per civil year, in the order of the rows.
+    """
+    regular_rule_finder = RegularRuleFinder()
     reimbursements = []
     total_per_year: dict[int, Decimal] = defaultdict(lambda: Decimal(0))
 
-    for booking in bookings:
-        year = booking.dateUsed.year
-
-        if (
-            is_relevant_for_standard_reimbursement_rule(booking.stock.offer)
-            or booking.stock.offer.subcategory.reimbursement_rule == subcategories.ReimbursementRuleChoices.BOOK.value
-        ):
-            total_per_year[year] += booking.total_amount
-        rule = get_reimbursement_rule(booking, custom_rule_finder, total_per_year[year])
-        reimbursements.append(BookingReimbursement(booking, rule, reimbursed_amount=rule.apply(booking)))
+    for row in rows:
+        year = row.dateUsed.year
+        total_amount = row.amount * row.quantity
+        if regular_rule_finder.counts_in_revenue(row.subcategoryId, row.isEducational):
+            total_per_year[year] += total_amount
+        rule = custom_rule_finder.get_rule_for_row(row) or regular_rule_finder.get_rule(
+            row.subcategoryId, row.isEducational, row.dateUsed, total_per_year[year]
+        )
+        reimbursed_amount = rule.apply_to_amounts(total_amount, row.quantity)
+        reimbursements.append(BookingRowReimbursement(row, rule, reimbursed_amount))
 
     return reimbursements
 
@@ -232,7 +377,10 @@ def get_reimbursement_rule(
     custom_rule = custom_rule_finder.get_rule(booking)
     if custom_rule:
         return custom_rule
+    return get_regular_reimbursement_rule(booking, cumulative_revenue)
+
 
+def get_regular_reimbursement_rule(booking: Booking, cumulative_revenue: Decimal) -> payments_models.ReimbursementRule:
     candidates = []
     for rule in REGULAR_RULES:
         if not rule.matches(booking, cumulative_revenue):
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from pcapi.core.bookings.models import IndividualBooking
 from pcapi.core.categories import subcategories
 from pcapi.core.offers.models import Mediation
@@ -19,12 +21,14 @@ class BeneficiaryBookingsSQLRepository(BeneficiaryBookingsRepository):
     def get_beneficiary_bookings(self, beneficiary_id: int) -> BeneficiaryBookingsWithStocks:
         booking_sql_entity_views = _get_bookings_information(beneficiary_id)
 
-        offers_ids = [booking.offerId for booking in booking_sql_entity_views]
+        offers_ids = list({booking.offerId for booking in booking_sql_entity_views})
         stock_sql_entity_views = _get_stocks_information(offers_ids)
         mediations_sql_entity_views = _get_mediations_information(offers_ids)
-        mediations = [
-            active_mediation_domain_converter.to_domain(mediation) for mediation in mediations_sql_entity_views
-        ]
+        # Group mediations by offer once, rather than scanning all of them for each booking.
+        mediations_by_offer_id = defaultdict(list)
+        for mediation_sql_entity_view in mediations_sql_entity_views:
+            mediation = active_mediation_domain_converter.to_domain(mediation_sql_entity_view)
+            mediations_by_offer_id[mediation.offer_id].append(mediation)
         stocks = [stock_domain_converter.to_domain(stock) for stock in stock_sql_entity_views]
 
         beneficiary_bookings = []
@@ -66,7 +70,7 @@ class BeneficiaryBookingsSQLRepository(BeneficiaryBookingsRepository):
                     price=booking.price,
                     productId=booking.productId,
                     thumbCount=booking.thumbCount,
-                    active_mediations=[mediation for mediation in mediations if mediation.offer_id == booking.offerId],
+                    active_mediations=mediations_by_offer_id.get(booking.offerId, []),
                     activationCode=booking.activationCode,
                     displayAsEnded=booking.displayAsEnded,
                 )
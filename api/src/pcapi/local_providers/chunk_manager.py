@@ -1,26 +1,60 @@
+from collections import defaultdict
+from typing import Iterable
 from typing import Optional
 
 from pcapi.local_providers.providable_info import ProvidableInfo
 from pcapi.models.db import Model
 from pcapi.repository.providable_queries import get_existing_object
+from pcapi.repository.providable_queries import get_existing_objects
 from pcapi.repository.providable_queries import insert_chunk
 from pcapi.repository.providable_queries import update_chunk
 
 
+def get_chunk_key(providable_info: ProvidableInfo) -> str:
+    return f"{providable_info.id_at_providers}|{providable_info.type.__name__}"
+
+
 def get_existing_pc_obj(
-    providable_info: ProvidableInfo, chunk_to_insert: dict, chunk_to_update: dict
+    providable_info: ProvidableInfo,
+    chunk_to_insert: dict,
+    chunk_to_update: dict,
+    existing_objects: Optional[dict[str, Optional[Model]]] = None,
 ) -> Optional[Model]:
     object_in_current_chunk = get_object_from_current_chunks(providable_info, chunk_to_insert, chunk_to_update)
     if object_in_current_chunk is None:
+        chunk_key = get_chunk_key(providable_info)
+        if existing_objects is not None and chunk_key in existing_objects:
+            return existing_objects[chunk_key]
         return get_existing_object(providable_info.type, providable_info.id_at_providers)
 
     return object_in_current_chunk
 
 
+def get_existing_pc_objs(providable_infos: Iterable[ProvidableInfo]) -> dict[str, Optional[Model]]:
+    """Return the objects (or None if they do not exist yet) of the
+    given providable infos, indexed by chunk key.
+
+    This runs a single query per model type, instead of one query per
+    providable info in `get_existing_pc_obj()`.
+    """
+    id_at_providers_by_type = defaultdict(set)
+    for providable_info in providable_infos:
+        id_at_providers_by_type[providable_info.type].add(providable_info.id_at_providers)
+
+    existing_objects = {}
+    for model_type, id_at_providers in id_at_providers_by_type.items():
+        objects_by_id_at_providers = {
+            pc_object.idAtProviders: pc_object for pc_object in get_existing_objects(model_type, id_at_providers)
+        }
+        for id_at_provider in id_at_providers:
+            existing_objects[f"{id_at_provider}|{model_type.__name__}"] = objects_by_id_at_providers.get(id_at_provider)
+    return existing_objects
+
+
 def get_object_from_current_chunks(
     providable_info: ProvidableInfo, chunk_to_insert: dict, chunk_to_update: dict
 ) -> Optional[Model]:
-    chunk_key = f"{providable_info.id_at_providers}|{providable_info.type.__name__}"
+    chunk_key = get_chunk_key(providable_info)
     pc_object = chunk_to_insert.get(chunk_key)
     if isinstance(pc_object, providable_info.type):
         return pc_object
@@ -1,14 +1,20 @@
 from abc import abstractmethod
 from collections.abc import Iterator
+import copy
 from datetime import datetime
 import logging
+import resource
+from typing import Optional
 
+from pcapi import settings
+from pcapi.connectors.thumb_storage import ThumbPool
 from pcapi.connectors.thumb_storage import create_thumb
 from pcapi.core import search
 from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import Stock
 from pcapi.core.providers.repository import get_provider_by_local_class
 from pcapi.local_providers.chunk_manager import get_existing_pc_obj
+from pcapi.local_providers.chunk_manager import get_existing_pc_objs
 from pcapi.local_providers.chunk_manager import save_chunks
 from pcapi.local_providers.providable_info import ProvidableInfo
 from pcapi.models import ApiErrors
@@ -26,9 +32,18 @@ logger = logging.getLogger(__name__)
 
 
 CHUNK_MAX_SIZE = 1000
+READ_AHEAD_SIZE = 1000
 
 
 class LocalProvider(Iterator):
+    # Attributes that `__next__()` sets for the current line and that
+    # `fill_object_attributes()` reads. Providers that declare them
+    # are read ahead by windows of `READ_AHEAD_SIZE` lines, so that
+    # existing objects are fetched with one query per window instead
+    # of one query per line (see `_read_ahead()`). Other providers are
+    # read line by line.
+    line_state_attributes: Optional[tuple[str, ...]] = None
+
     def __init__(self, venue_provider=None, **options):
         self.venue_provider = venue_provider
         self.updatedObjects = 0
@@ -40,6 +55,10 @@ class LocalProvider(Iterator):
         self.checkedThumbs = 0
         self.erroredThumbs = 0
         self.provider = get_provider_by_local_class(self.__class__.__name__)
+        self._existing_objects = None
+        # Only set during `updateObjects()`: thumbs are created
+        # synchronously otherwise.
+        self._thumb_pool: Optional[ThumbPool] = None
 
     @property
     @abstractmethod
@@ -83,9 +102,19 @@ class LocalProvider(Iterator):
         if not new_thumb:
             return
 
-        _save_same_thumb_from_thumb_count_to_index(pc_object, new_thumb_index, new_thumb)
+        _save_same_thumb_from_thumb_count_to_index(pc_object, new_thumb_index, new_thumb, self._thumb_pool)
         self.createdThumbs += new_thumb_index
 
+    def _collect_thumbs(self) -> None:
+        for (pc_object, initial_thumb_count, thumb_index), error in self._thumb_pool.collect():
+            if error is None:
+                continue
+            pc_object.thumbCount = initial_thumb_count
+            self.createdThumbs -= thumb_index
+            self.log_provider_event(LocalProviderEventType.SyncError, error.__class__.__name__)
+            self.erroredThumbs += 1
+            logger.info("ERROR during handle thumb: %s", error, exc_info=error)
+
     def _create_object(self, providable_info: ProvidableInfo) -> Model:
         pc_object = providable_info.type()
         pc_object.idAtProviders = providable_info.id_at_providers
@@ -150,9 +179,63 @@ class LocalProvider(Iterator):
             self.updatedThumbs,
             self.erroredThumbs,
         )
+        # On Linux, `ru_maxrss` is in kilobytes.
+        logger.info(
+            "Synchronization of venue=%s, peak memory usage of the process=%d KB",
+            venue_id,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        )
+
+    def _read_ahead(self, limit: Optional[int] = None) -> Iterator:
+        """Iterate over the provider like `iter(self)`, but read lines
+        by windows and fetch all existing objects of the window at once.
+
+        The state of each line (see `line_state_attributes`) is saved
+        when the line is read, and restored before it is yielded.
+        Existing objects are fetched again for the rest of the window
+        when `self._existing_objects` is reset (i.e. after a chunk has
+        been saved).
+        """
+        while True:
+            window_size = READ_AHEAD_SIZE if self.line_state_attributes else 1
+            if limit:
+                # Do not read (much) more lines than needed.
+                window_size = max(1, min(window_size, limit - self.checkedObjects))
+            window = []
+            error = None
+            try:
+                while len(window) < window_size:
+                    providable_infos = next(self)
+                    line_state = {
+                        attribute: copy.copy(getattr(self, attribute, None))
+                        for attribute in self.line_state_attributes or ()
+                    }
+                    window.append((providable_infos, line_state))
+            except StopIteration:
+                pass
+            except Exception as exc:  # pylint: disable=broad-except
+                # Process the lines that have already been read, as we
+                # would have done without reading ahead.
+                error = exc
+
+            self._existing_objects = None
+            for index, (providable_infos, line_state) in enumerate(window):
+                if self._existing_objects is None:
+                    self._existing_objects = get_existing_pc_objs(
+                        providable_info
+                        for next_providable_infos, _ in window[index:]
+                        for providable_info in next_providable_infos or ()
+                    )
+                for attribute, value in line_state.items():
+                    setattr(self, attribute, value)
+                yield providable_infos
+
+            if error:
+                raise error
+            if len(window) < window_size:
+                return
 
     def updateObjects(self, limit=None):
-        # pylint: disable=too-many-nested-blocks
         if self.venue_provider and not self.venue_provider.isActive:
             logger.info("Venue provider %s is inactive", self.venue_provider)
             return
@@ -165,10 +248,27 @@ class LocalProvider(Iterator):
         # TODO (asaunier,2021-03-18): We may replace this log in BDD with logs in the monitoring system
         self.log_provider_event(LocalProviderEventType.SyncStart)
 
+        with ThumbPool(
+            processes=settings.PROVIDERS_THUMB_PROCESSES,
+            threads=settings.PROVIDERS_THUMB_UPLOAD_THREADS,
+            max_pending=settings.PROVIDERS_THUMB_MAX_PENDING,
+        ) as self._thumb_pool:
+            self._update_objects(limit)
+        self._thumb_pool = None
+
+        self._print_objects_summary()
+        self.log_provider_event(LocalProviderEventType.SyncEnd)
+
+        if self.venue_provider is not None:
+            self.venue_provider.lastSyncDate = datetime.utcnow()
+            repository.save(self.venue_provider)
+
+    def _update_objects(self, limit: Optional[int]) -> None:
+        # pylint: disable=too-many-nested-blocks
         chunk_to_insert = {}
         chunk_to_update = {}
 
-        for providable_infos in self:
+        for providable_infos in self._read_ahead(limit):
             objects_limit_reached = limit and self.checkedObjects >= limit
             if objects_limit_reached:
                 break
@@ -180,7 +280,9 @@ class LocalProvider(Iterator):
 
             for providable_info in providable_infos:
                 chunk_key = providable_info.id_at_providers + "|" + str(providable_info.type.__name__)
-                pc_object = get_existing_pc_obj(providable_info, chunk_to_insert, chunk_to_update)
+                pc_object = get_existing_pc_obj(
+                    providable_info, chunk_to_insert, chunk_to_update, self._existing_objects
+                )
 
                 if pc_object is None:
                     if not self.can_create:
@@ -228,34 +330,46 @@ class LocalProvider(Iterator):
                 self.checkedObjects += 1
 
                 if len(chunk_to_insert) + len(chunk_to_update) >= CHUNK_MAX_SIZE:
+                    self._collect_thumbs()
                     save_chunks(chunk_to_insert, chunk_to_update)
                     _reindex_offers(list(chunk_to_insert.values()) + list(chunk_to_update.values()))
                     chunk_to_insert = {}
                     chunk_to_update = {}
+                    # Objects that have just been inserted are not known yet.
+                    self._existing_objects = None
 
+        self._collect_thumbs()
         if len(chunk_to_insert) + len(chunk_to_update) > 0:
             save_chunks(chunk_to_insert, chunk_to_update)
             _reindex_offers(list(chunk_to_insert.values()) + list(chunk_to_update.values()))
 
-        self._print_objects_summary()
-        self.log_provider_event(LocalProviderEventType.SyncEnd)
 
-        if self.venue_provider is not None:
-            self.venue_provider.lastSyncDate = datetime.utcnow()
-            repository.save(self.venue_provider)
-
-
-def _save_same_thumb_from_thumb_count_to_index(pc_object: Model, thumb_index: int, image_as_bytes: bytes):
+def _save_same_thumb_from_thumb_count_to_index(
+    pc_object: Model, thumb_index: int, image_as_bytes: bytes, thumb_pool: Optional[ThumbPool] = None
+):
     if pc_object.thumbCount is None:  # handle unsaved object
         pc_object.thumbCount = 0
     if thumb_index <= pc_object.thumbCount:
         # replace existing thumb
-        create_thumb(pc_object, image_as_bytes, thumb_index)
+        indexes = [thumb_index]
+        new_thumb_count = pc_object.thumbCount
     else:
         # add new thumb
-        for index in range(pc_object.thumbCount, thumb_index):
+        indexes = list(range(pc_object.thumbCount, thumb_index))
+        new_thumb_count = thumb_index
+
+    if thumb_pool is None:
+        for index in indexes:
             create_thumb(pc_object, image_as_bytes, index)
-            pc_object.thumbCount += 1
+        pc_object.thumbCount = new_thumb_count
+        return
+
+    # The thumb count is restored by `LocalProvider._collect_thumbs()`
+    # if thumbs could not be created.
+    storage_ids = [pc_object.get_thumb_storage_id(index) for index in indexes]
+    context = (pc_object, pc_object.thumbCount, thumb_index)
+    thumb_pool.submit(image_as_bytes, storage_ids, context)
+    pc_object.thumbCount = new_thumb_count
 
 
 def _reindex_offers(created_or_updated_objects):
@@ -1,9 +1,11 @@
+import functools
 import logging
 from typing import Callable
 from typing import Optional
 
 from pcapi.core.providers.models import VenueProvider
 import pcapi.local_providers
+from pcapi.local_providers import sync_scheduler
 from pcapi.local_providers.local_provider import LocalProvider
 from pcapi.local_providers.provider_api import synchronize_provider_api
 from pcapi.repository.venue_provider_queries import get_active_venue_providers_for_specific_provider
@@ -25,8 +27,9 @@ def synchronize_data_for_provider(provider_name: str, limit: Optional[int] = Non
 
 def synchronize_venue_providers_for_provider(provider_id: int, limit: Optional[int] = None) -> None:
     venue_providers = get_active_venue_providers_for_specific_provider(provider_id)
-    for venue_provider in venue_providers:
-        synchronize_venue_provider(venue_provider, limit)
+    sync_scheduler.synchronize_venue_providers(
+        venue_providers, functools.partial(synchronize_venue_provider, limit=limit)
+    )
 
 
 def do_update(provider: LocalProvider, limit: Optional[int]):
@@ -0,0 +1,145 @@
+"""Run synchronizations of venue providers concurrently.
+
+Synchronizations of venue providers are independent and spend most of
+their time waiting for the API of the provider, or for the database.
+They are run in a pool of ``PROVIDERS_SYNC_WORKERS_POOL_SIZE`` threads,
+each with its own application context and database session, and at
+most ``PROVIDERS_SYNC_MAX_WORKERS_PER_PROVIDER`` venue providers of the
+same provider are synchronized at the same time, so as not to overload
+its API.
+
+The duration of the last synchronizations of each venue provider is
+kept in Redis, and the slowest venue providers (or those that have
+never been synchronized) are started first, so that a slow venue
+provider does not start when all others are done.
+"""
+
+from concurrent import futures
+import logging
+import math
+import time
+from typing import Callable
+from typing import Optional
+
+from flask import current_app
+import redis
+
+from pcapi import settings
+from pcapi.core.providers.models import VenueProvider
+from pcapi.models import db
+
+
+logger = logging.getLogger(__name__)
+
+REDIS_SYNC_DURATIONS = "providers:sync:venue-provider:{venue_provider_id}:durations"
+SYNC_DURATIONS_HISTORY_SIZE = 5
+SYNC_DURATIONS_TTL = 30 * 24 * 60 * 60  # seconds, so that durations of deleted venue providers expire
+
+
+def get_estimated_durations(venue_provider_ids: list[int]) -> dict[int, float]:
+    """Return the average duration of the last synchronizations of each
+    venue provider that has been synchronized before.
+    """
+    if not venue_provider_ids:
+        return {}
+    try:
+        pipeline = current_app.redis_client.pipeline(transaction=False)
+        for venue_provider_id in venue_provider_ids:
+            pipeline.lrange(REDIS_SYNC_DURATIONS.format(venue_provider_id=venue_provider_id), 0, -1)
+        histories = pipeline.execute()
+    except redis.exceptions.RedisError:
+        logger.exception("Could not get durations of venue provider synchronizations")
+        return {}
+    return {
+        venue_provider_id: sum(float(duration) for duration in history) / len(history)
+        for venue_provider_id, history in zip(venue_provider_ids, histories)
+        if history
+    }
+
+
+def record_duration(venue_provider_id: int, duration: float) -> None:
+    key = REDIS_SYNC_DURATIONS.format(venue_provider_id=venue_provider_id)
+    try:
+        pipeline = current_app.redis_client.pipeline(transaction=False)
+        pipeline.lpush(key, round(duration, 3))
+        pipeline.ltrim(key, 0, SYNC_DURATIONS_HISTORY_SIZE - 1)
+        pipeline.expire(key, SYNC_DURATIONS_TTL)
+        pipeline.execute()
+    except redis.exceptions.RedisError:
+        logger.exception(
+            "Could not record duration of venue provider synchronization", extra={"venue_provider": venue_provider_id}
+        )
+
+
+def _synchronize(venue_provider: VenueProvider, synchronize: Callable[[VenueProvider], None]) -> None:
+    venue_provider_id = venue_provider.id
+    start = time.perf_counter()
+    synchronize(venue_provider)
+    record_duration(venue_provider_id, time.perf_counter() - start)
+
+
+def _synchronize_in_worker(app, venue_provider_id: int, synchronize: Callable[[VenueProvider], None]) -> None:
+    with app.app_context():
+        try:
+            venue_provider = VenueProvider.query.get(venue_provider_id)
+            _synchronize(venue_provider, synchronize)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Could not synchronize venue provider", extra={"venue_provider": venue_provider_id})
+        finally:
+            db.session.remove()
+
+
+def synchronize_venue_providers(
+    venue_providers: list[VenueProvider],
+    synchronize: Callable[[VenueProvider], None],
+    workers: Optional[int] = None,
+    max_workers_per_provider: Optional[int] = None,
+) -> None:
+    """Call ``synchronize`` on each venue provider, the slowest ones
+    first, in ``workers`` threads.
+
+    ``synchronize`` is expected to handle (and log) errors of the
+    synchronization of a venue provider. With a single worker, venue
+    providers are synchronized in the current thread and session.
+    """
+    workers = workers or settings.PROVIDERS_SYNC_WORKERS_POOL_SIZE
+    max_workers_per_provider = max_workers_per_provider or settings.PROVIDERS_SYNC_MAX_WORKERS_PER_PROVIDER
+    # With a limit below 1, no synchronization would ever start.
+    max_workers_per_provider = max(1, max_workers_per_provider)
+    durations = get_estimated_durations([venue_provider.id for venue_provider in venue_providers])
+    # Venue providers that have never been synchronized come first,
+    # since their first synchronization is usually the longest.
+    venue_providers = sorted(
+        venue_providers, key=lambda venue_provider: durations.get(venue_provider.id, math.inf), reverse=True
+    )
+    logger.info(
+        "Starting synchronization of %d venue providers",
+        len(venue_providers),
+        extra={"workers": workers, "estimated_duration": sum(durations.values())},
+    )
+
+    if workers <= 1:
+        for venue_provider in venue_providers:
+            _synchronize(venue_provider, synchronize)
+        return
+
+    app = current_app._get_current_object()  # pylint: disable=protected-access
+    pending = [(venue_provider.id, venue_provider.providerId) for venue_provider in venue_providers]
+    running = {}  # future -> provider id
+    running_per_provider: dict[int, int] = {}
+    # Release the connection of the current thread: each worker has its own.
+    db.session.remove()
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            not_started = []
+            for venue_provider_id, provider_id in pending:
+                if len(running) < workers and running_per_provider.get(provider_id, 0) < max_workers_per_provider:
+                    future = executor.submit(_synchronize_in_worker, app, venue_provider_id, synchronize)
+                    running[future] = provider_id
+                    running_per_provider[provider_id] = running_per_provider.get(provider_id, 0) + 1
+                else:
+                    not_started.append((venue_provider_id, provider_id))
+            pending = not_started
+            done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                running_per_provider[running.pop(future)] -= 1
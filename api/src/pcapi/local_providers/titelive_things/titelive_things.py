@@ -1,11 +1,10 @@
-from io import BytesIO
-from io import TextIOWrapper
 import logging
 import re
+from typing import Iterator
 from typing import Optional
 
-from pcapi.connectors.ftp_titelive import connect_to_titelive_ftp
 from pcapi.connectors.ftp_titelive import get_files_to_process_from_titelive_ftp
+from pcapi.connectors.ftp_titelive import stream_lines_from_ftp
 from pcapi.core.categories import subcategories
 from pcapi.domain.titelive import get_date_from_filename
 from pcapi.domain.titelive import read_things_date
@@ -83,6 +82,7 @@ SCHOOL_RELATED_CSR_CODE = [
 class TiteLiveThings(LocalProvider):
     name = "TiteLive (Epagine / Place des libraires.com)"
     can_create = True
+    line_state_attributes = ("product_infos", "product_subcategory_id", "product_extra_data")
 
     def __init__(self):
         super().__init__()
@@ -190,17 +190,8 @@ class TiteLiveThings(LocalProvider):
         return iter([])
 
 
-def get_lines_from_thing_file(thing_file: str):
-    data_file = BytesIO()
-    data_wrapper = TextIOWrapper(
-        data_file,
-        encoding="iso-8859-1",
-        line_buffering=True,
-    )
-    file_path = "RETR " + THINGS_FOLDER_NAME_TITELIVE + "/" + thing_file
-    connect_to_titelive_ftp().retrbinary(file_path, data_file.write)
-    data_wrapper.seek(0, 0)
-    return iter(data_wrapper.readlines())
+def get_lines_from_thing_file(thing_file: str) -> Iterator[str]:
+    return stream_lines_from_ftp(thing_file, THINGS_FOLDER_NAME_TITELIVE, encoding="iso-8859-1")
 
 
 def get_subcategory_and_extra_data_from_titelive_type(titelive_type):
@@ -1,8 +1,13 @@
 import enum
 import logging
+import os
+import threading
+import time
+from typing import Optional
 
 from alembic import op
 import flask
+import redis
 from sqlalchemy import Column
 from sqlalchemy import String
 from sqlalchemy import Text
@@ -17,6 +22,12 @@ from pcapi.models.pc_object import PcObject
 
 logger = logging.getLogger(__name__)
 
+REDIS_FEATURES_CHANNEL = "features:changes"
+
+
+class FeatureNotInstalled(Exception):
+    pass
+
 
 class FeatureToggle(enum.Enum):
     BENEFICIARIES_IMPORT = "Permettre limport des comptes jeunes depuis DMS"
@@ -77,22 +88,20 @@ class FeatureToggle(enum.Enum):
     IMPROVE_BOOKINGS_PERF = "Améliore les performances pour la page pro des réservations"
     ENABLE_INE_WHITELIST_FILTER = "Active le filtre sur les INE whitelistés"
     ALLOW_EMPTY_USER_PROFILING = "Autorise les inscriptions de bénéficiaires sans profile Threat Metrix"
+    ENABLE_ATOMIC_STOCK_RESERVATION = "Réserve la quantité des stocks sans les verrouiller pendant les vérifications"
+    USE_DENORMALIZED_DEPOSIT_SPENDING = (
+        "Utilise les dépenses dénormalisées des portefeuilles pour calculer le crédit restant"
+    )
 
     def is_active(self) -> bool:
-        if flask.has_request_context():
-            if not hasattr(flask.request, "_cached_features"):
-                setattr(flask.request, "_cached_features", {})
-
-            cached_value = flask.request._cached_features.get(self.name)
-            if cached_value is not None:
-                return cached_value
-
-        value = Feature.query.filter_by(name=self.name).one().isActive
-
-        if flask.has_request_context():
-            flask.request._cached_features[self.name] = value
-
-        return value
+        features = get_features_snapshot()
+        if self.name not in features:
+            # The flag may have been installed since the snapshot was taken.
+            invalidate_features_snapshot()
+            features = get_features_snapshot()
+            if self.name not in features:
+                raise FeatureNotInstalled(f"Feature flag {self.name} is not installed in the database")
+        return features[self.name]
 
 
 class Feature(PcObject, Model, DeactivableMixin):
@@ -104,6 +113,92 @@ class Feature(PcObject, Model, DeactivableMixin):
         return str(self.name).replace("FeatureToggle.", "")
 
 
+# Snapshot of all feature flags, shared by all threads of the process.
+# It is reloaded when it expires (see the ``FEATURES_SNAPSHOT_TTL``
+# setting), or as soon as a feature flag is toggled: toggles are
+# broadcast to all processes through Redis (see `publish_features_change`).
+_snapshot: dict[str, bool] = {}
+_snapshot_expiration = 0.0  # as given by `time.monotonic()`
+_snapshot_lock = threading.Lock()
+_subscriber: Optional[threading.Thread] = None
+_subscriber_pid: Optional[int] = None
+
+
+def _load_features() -> dict[str, bool]:
+    return dict(Feature.query.with_entities(Feature.name, Feature.isActive).all())
+
+
+def _on_features_change(message: dict) -> None:
+    invalidate_features_snapshot()
+
+
+def _subscribe_to_features_changes() -> None:
+    # pylint: disable=global-statement
+    global _subscriber, _subscriber_pid
+    # The thread of the subscriber does not survive a fork, nor the loss
+    # of its connection to Redis: the snapshot then expires on its own.
+    if _subscriber and _subscriber.is_alive() and _subscriber_pid == os.getpid():
+        return
+    try:
+        pubsub = flask.current_app.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{REDIS_FEATURES_CHANNEL: _on_features_change})
+        _subscriber = pubsub.run_in_thread(sleep_time=1, daemon=True)
+        _subscriber_pid = os.getpid()
+    except redis.exceptions.RedisError:
+        logger.exception("Could not subscribe to changes of feature flags")
+
+
+def _get_process_snapshot() -> dict[str, bool]:
+    # pylint: disable=global-statement
+    global _snapshot, _snapshot_expiration
+    if not settings.FEATURES_SNAPSHOT_TTL:
+        return _load_features()
+    with _snapshot_lock:
+        if _snapshot_expiration <= time.monotonic():
+            _subscribe_to_features_changes()
+            _snapshot = _load_features()
+            _snapshot_expiration = time.monotonic() + settings.FEATURES_SNAPSHOT_TTL
+        return _snapshot
+
+
+def get_features_snapshot() -> dict[str, bool]:
+    """Return the status of all feature flags, by name.
+
+    Feature flags are loaded with a single query, and then kept in
+    memory by the process. Within a request, the same snapshot is
+    used from start to end.
+    """
+    if not flask.has_request_context():
+        return _get_process_snapshot()
+    features = getattr(flask.request, "_cached_features", None)
+    if features is None:
+        features = _get_process_snapshot()
+        setattr(flask.request, "_cached_features", features)
+    return features
+
+
+def invalidate_features_snapshot() -> None:
+    """Make the next lookup of a feature flag in this process reload
+    all feature flags.
+    """
+    # pylint: disable=global-statement
+    global _snapshot_expiration
+    _snapshot_expiration = 0.0
+    if flask.has_request_context() and hasattr(flask.request, "_cached_features"):
+        delattr(flask.request, "_cached_features")
+
+
+def publish_features_change() -> None:
+    """Make all processes reload feature flags, once the change of a
+    feature flag has been committed.
+    """
+    invalidate_features_snapshot()
+    try:
+        flask.current_app.redis_client.publish(REDIS_FEATURES_CHANNEL, "changed")
+    except redis.exceptions.RedisError:
+        logger.exception("Could not publish change of feature flags")
+
+
 FEATURES_DISABLED_BY_DEFAULT = (
     FeatureToggle.ALLOW_IDCHECK_UNDERAGE_REGISTRATION,
     FeatureToggle.FORCE_PHONE_VALIDATION,
@@ -128,6 +223,8 @@ FEATURES_DISABLED_BY_DEFAULT = (
     FeatureToggle.IMPROVE_BOOKINGS_PERF,
     FeatureToggle.PAUSE_JOUVE_SUBSCRIPTION,
     FeatureToggle.ALLOW_EMPTY_USER_PROFILING,
+    FeatureToggle.ENABLE_ATOMIC_STOCK_RESERVATION,
+    FeatureToggle.USE_DENORMALIZED_DEPOSIT_SPENDING,
 )
 
 if not settings.IS_DEV:
@@ -177,6 +274,7 @@ def install_feature_flags() -> None:
         )
 
     db.session.commit()
+    invalidate_features_snapshot()
 
     if to_remove_flags:
         logger.error("The following feature flags are present in database but not present in code: %s", to_remove_flags)
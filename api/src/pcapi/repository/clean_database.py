@@ -1,4 +1,5 @@
 from pcapi import settings
+from pcapi.core.bookings.models import BookingOutboxEvent
 from pcapi.core.bookings.models import IndividualBooking
 from pcapi.core.educational.models import EducationalBooking
 from pcapi.core.educational.models import EducationalDeposit
@@ -60,6 +61,7 @@ def clean_all_database(*args, **kwargs):
     Payment.query.delete()
     PaymentMessage.query.delete()
     CustomReimbursementRule.query.delete()
+    BookingOutboxEvent.query.delete()
     Booking.query.delete()
     IndividualBooking.query.delete()
     Stock.query.delete()
@@ -1,12 +1,16 @@
 from datetime import datetime
+from typing import Iterator
 
 from sqlalchemy import func
 from sqlalchemy.orm import aliased
 from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import selectinload
 
 from pcapi.models import Booking
 from pcapi.models import Offer
 from pcapi.models import Stock
+from pcapi.models import Venue
+from pcapi.utils.db import get_keyset_batches
 
 
 def _build_bookings_quantity_subquery():
@@ -56,23 +60,30 @@ def get_offers_by_ids(offer_ids: list[int]) -> list[Offer]:
     return Offer.query.filter(Offer.id.in_(offer_ids)).options(joinedload("stocks")).all()
 
 
-def get_paginated_active_offer_ids(limit: int, page: int) -> list[int]:
-    query = (
-        Offer.query.with_entities(Offer.id)
-        .filter(Offer.isActive.is_(True))
-        .order_by(Offer.id)
-        .offset(page * limit)
-        .limit(limit)
+def get_offers_for_indexation(offer_ids: list[int]) -> list[Offer]:
+    """Return offers with everything that search backends need to
+    serialize them, in a constant number of SQL queries.
+
+    Many-to-one relationships are joined. Collections are loaded with
+    a separate `SELECT ... WHERE offerId IN (...)` each, to avoid the
+    cartesian product of stocks, criteria and mediations.
+    """
+    return (
+        Offer.query.filter(Offer.id.in_(offer_ids))
+        .options(joinedload(Offer.venue).joinedload(Venue.managingOfferer))
+        .options(joinedload(Offer.product))
+        .options(selectinload(Offer.stocks))
+        .options(selectinload(Offer.criteria))
+        .options(selectinload(Offer.mediations))
+        .all()
     )
-    return [offer_id for offer_id, in query]
 
 
-def get_paginated_offer_ids_by_venue_id(venue_id: int, limit: int, page: int) -> list[int]:
-    query = (
-        Offer.query.with_entities(Offer.id)
-        .filter(Offer.venueId == venue_id)
-        .order_by(Offer.id)
-        .offset(page * limit)
-        .limit(limit)
-    )
-    return [offer_id for offer_id, in query]
+def get_active_offer_id_batches(batch_size: int, offset: int = 0) -> Iterator[list[int]]:
+    query = Offer.query.filter(Offer.isActive.is_(True))
+    return get_keyset_batches(query, Offer.id, batch_size, offset=offset)
+
+
+def get_offer_id_batches_by_venue_id(venue_id: int, batch_size: int) -> Iterator[list[int]]:
+    query = Offer.query.filter(Offer.venueId == venue_id)
+    return get_keyset_batches(query, Offer.id, batch_size)
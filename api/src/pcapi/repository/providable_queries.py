@@ -1,4 +1,5 @@
 import datetime
+from typing import Iterable
 from typing import Optional
 
 from pcapi import models
@@ -37,6 +38,10 @@ def get_existing_object(model_type: Model, id_at_providers: str) -> Optional[dic
     return model_type.query.filter_by(idAtProviders=id_at_providers).one_or_none()
 
 
+def get_existing_objects(model_type: Model, id_at_providers: Iterable[str]) -> list[Model]:
+    return model_type.query.filter(model_type.idAtProviders.in_(id_at_providers)).all()
+
+
 def get_last_update_for_provider(provider_id: int, pc_obj: Model) -> datetime:
     if pc_obj.lastProviderId == provider_id:
         return pc_obj.dateModifiedAtLastProvider if pc_obj.dateModifiedAtLastProvider else None
@@ -1,10 +1,12 @@
 from collections import namedtuple
 from datetime import date
+from typing import Iterator
 from typing import Optional
 
 from sqlalchemy import Date
 from sqlalchemy import cast
 from sqlalchemy import subquery
+from sqlalchemy.orm import Query
 from sqlalchemy.orm import aliased
 
 from pcapi.core.bookings.models import Booking
@@ -22,6 +24,9 @@ from pcapi.models.payment import Payment
 from pcapi.models.payment_status import TransactionStatus
 
 
+PAYMENTS_BATCH_SIZE = 1000
+
+
 def find_all_offerer_payments(
     offerer_id: int, reimbursement_period: tuple[date, date], venue_id: Optional[int] = None
 ) -> list[tuple]:
@@ -35,6 +40,18 @@ def find_all_offerer_payments(
 def find_all_offerers_payments(
     offerer_ids: list[int], reimbursement_period: tuple[date, date], venue_id: Optional[int] = None
 ) -> list[tuple]:
+    return _get_offerers_payments_query(offerer_ids, reimbursement_period, venue_id).all()
+
+
+def find_all_offerers_payments_by_batches(
+    offerer_ids: list[int], reimbursement_period: tuple[date, date], venue_id: Optional[int] = None
+) -> Iterator[list[tuple]]:
+    return _get_payments_by_batches(_get_offerers_payments_query(offerer_ids, reimbursement_period, venue_id))
+
+
+def _get_offerers_payments_query(
+    offerer_ids: list[int], reimbursement_period: tuple[date, date], venue_id: Optional[int] = None
+) -> Query:
     payment_date = cast(PaymentStatus.date, Date)
     sent_payments = (
         Payment.query.join(PaymentStatus)
@@ -80,7 +97,7 @@ def find_all_offerers_payments(
         )
     )
 
-    return sent_payments.all()
+    return sent_payments
 
 
 # TODO(AnthonySkorski, 2021-09-15): delete this legacy function when feature PRO_REIMBURSEMENTS_FILTERS is deleted or activate in production
@@ -90,6 +107,16 @@ def legacy_find_all_offerer_payments(offerer_id: int) -> list[namedtuple]:
 
 # TODO(AnthonySkorski, 2021-09-15): delete this legacy function when feature PRO_REIMBURSEMENTS_FILTERS is deleted or activate in production
 def legacy_find_all_offerers_payments(offerer_ids: list[int]) -> list[namedtuple]:
+    return _legacy_get_offerers_payments_query(offerer_ids).all()
+
+
+# TODO(AnthonySkorski, 2021-09-15): delete this legacy function when feature PRO_REIMBURSEMENTS_FILTERS is deleted or activate in production
+def legacy_find_all_offerers_payments_by_batches(offerer_ids: list[int]) -> Iterator[list[namedtuple]]:
+    return _get_payments_by_batches(_legacy_get_offerers_payments_query(offerer_ids))
+
+
+# TODO(AnthonySkorski, 2021-09-15): delete this legacy function when feature PRO_REIMBURSEMENTS_FILTERS is deleted or activate in production
+def _legacy_get_offerers_payments_query(offerer_ids: list[int]) -> Query:
     payment_status_query = _legacy_build_payment_status_subquery()
 
     query = (
@@ -130,7 +157,31 @@ def legacy_find_all_offerers_payments(offerer_ids: list[int]) -> list[namedtuple
             payment_status_query.c.detail.label("detail"),
         )
     )
-    return query.all()
+    return query
+
+
+def _get_payments_by_batches(query: Query) -> Iterator[list[tuple]]:
+    """Yield the rows of ``query`` by batches of ``PAYMENTS_BATCH_SIZE``.
+
+    Payments are returned by descending id (see ``DISTINCT ON`` in the
+    queries above), so each batch starts after the last payment id of
+    the previous batch instead of using a (slow) ``OFFSET``.
+    """
+    # The payment id is only needed here, as the key of batches: it is
+    # added as the last column, so that rows keep their usual shape.
+    query = query.add_columns(Payment.id.label("payment_id"))
+    last_payment_id = None
+    while True:
+        batch_query = query
+        if last_payment_id is not None:
+            batch_query = batch_query.filter(Payment.id < last_payment_id)
+        payments = batch_query.limit(PAYMENTS_BATCH_SIZE).all()
+        if not payments:
+            return
+        yield payments
+        if len(payments) < PAYMENTS_BATCH_SIZE:
+            return
+        last_payment_id = payments[-1].payment_id
 
 
 # TODO : delete this legacy function when feature PRO_REIMBURSEMENTS_FILTERS is deleted or activate in production
@@ -1,14 +1,21 @@
 from datetime import MINYEAR
 from datetime import datetime
 from datetime import timedelta
+from typing import Iterator
 from typing import Optional
 
 from sqlalchemy import Column
+from sqlalchemy import and_
 from sqlalchemy import func
 from sqlalchemy.orm import Query
+from sqlalchemy.orm import aliased
 from sqlalchemy.sql.elements import BinaryExpression
 from sqlalchemy.sql.functions import Function
 
+from pcapi import settings
+from pcapi.core.bookings.models import Booking
+from pcapi.core.bookings.models import IndividualBooking
+from pcapi.core.payments.models import Deposit
 from pcapi.core.users.models import User
 from pcapi.core.users.utils import sanitize_email
 from pcapi.models import BeneficiaryImport
@@ -77,26 +84,47 @@ def find_by_validation_token(token: str) -> User:
     return User.query.filter_by(validationToken=token).one_or_none()
 
 
-def get_all_users_wallet_balances() -> list[WalletBalance]:
-    """Return wallet balances.
+def get_all_users_wallet_balances(batch_size: int = settings.WALLET_BALANCES_BATCH_SIZE) -> Iterator[WalletBalance]:
+    """Return wallet balances of all users who have a deposit, ordered
+    by user id.
 
-    WARNING: it ignores the expiration date of the deposits.
+    Balances are the same as those of the `get_wallet_balance()` SQL
+    function (i.e. 0 if the user has no active deposit), but they are
+    computed with a single aggregation of all bookings instead of two
+    function calls per user. Rows are streamed from the database by
+    batches of ``batch_size``.
     """
+    booking_amount = Booking.amount * Booking.quantity
+    spending = (
+        db.session.query(
+            IndividualBooking.depositId.label("deposit_id"),
+            func.sum(booking_amount).label("spent"),
+            func.sum(booking_amount).filter(Booking.isUsed.is_(True)).label("used"),
+        )
+        .select_from(Booking)
+        .join(Booking.individualBooking)
+        .filter(Booking.isCancelled.is_(False), IndividualBooking.depositId.isnot(None))
+        .group_by(IndividualBooking.depositId)
+        .subquery()
+    )
+    # `User.deposits.any()` must not be correlated with the joined deposit.
+    active_deposit = aliased(Deposit)
     wallet_balances = (
         db.session.query(
             User.id,
-            func.get_wallet_balance(User.id, False),
-            func.get_wallet_balance(User.id, True),
+            func.coalesce(active_deposit.amount - func.coalesce(spending.c.spent, 0), 0),
+            func.coalesce(active_deposit.amount - func.coalesce(spending.c.used, 0), 0),
         )
-        .filter(User.deposits != None)
+        .filter(User.deposits.any())
+        .outerjoin(active_deposit, and_(active_deposit.userId == User.id, active_deposit.expirationDate > func.now()))
+        .outerjoin(spending, spending.c.deposit_id == active_deposit.id)
         .order_by(User.id)
-        .all()
+        .execution_options(stream_results=True)
+        .yield_per(batch_size)
     )
 
-    return [
-        WalletBalance(user_id, current_balance, real_balance)
-        for user_id, current_balance, real_balance in wallet_balances
-    ]
+    for user_id, current_balance, real_balance in wallet_balances:
+        yield WalletBalance(user_id, current_balance, real_balance)
 
 
 def keep_only_webapp_users(query: Query) -> Query:
@@ -1,7 +1,13 @@
+import hashlib
+from typing import Optional
+
+from flask import Response
+from flask import request
+
 from pcapi.core.payments import conf as deposits_conf
 from pcapi.core.users import constants
 from pcapi.models.feature import FeatureToggle
-from pcapi.repository import feature_queries
+from pcapi.models.feature import get_features_snapshot
 from pcapi.serialization.decorator import spectree_serialize
 from pcapi.settings import OBJECT_STORAGE_URL
 
@@ -9,34 +15,29 @@ from . import blueprint
 from .serialization import settings as serializers
 
 
-def _get_features(*requested_features: FeatureToggle):
-    requested_features = {feature.name: feature for feature in requested_features}
-    return {
-        requested_features[db_feature.name]: db_feature.isActive
-        for db_feature in feature_queries.find_all()
-        if db_feature.name in requested_features
-    }
+SETTINGS_FEATURES = (
+    FeatureToggle.ALLOW_IDCHECK_REGISTRATION,
+    FeatureToggle.AUTO_ACTIVATE_DIGITAL_BOOKINGS,
+    FeatureToggle.DISPLAY_DMS_REDIRECTION,
+    FeatureToggle.ENABLE_ID_CHECK_RETENTION,
+    FeatureToggle.ENABLE_NATIVE_APP_RECAPTCHA,
+    FeatureToggle.ENABLE_NATIVE_ID_CHECK_VERBOSE_DEBUGGING,
+    FeatureToggle.ENABLE_NATIVE_ID_CHECK_VERSION,
+    FeatureToggle.ENABLE_PHONE_VALIDATION,
+    FeatureToggle.USE_APP_SEARCH_ON_NATIVE_APP,
+    FeatureToggle.ID_CHECK_ADDRESS_AUTOCOMPLETION,
+    FeatureToggle.WEBAPP_V2_ENABLED,
+    FeatureToggle.ENABLE_NATIVE_EAC_INDIVIDUAL,
+)
 
+# The serialized settings and their ETag, for the last version of the
+# feature flags they depend on. The native app requests its settings
+# at every launch: they are only serialized again when one of these
+# feature flags changes.
+_cached_settings: Optional[tuple[tuple[bool, ...], bytes, str]] = None
 
-@blueprint.native_v1.route("/settings", methods=["GET"])
-@spectree_serialize(api=blueprint.api, response_model=serializers.SettingsResponse)
-def get_settings() -> serializers.SettingsResponse:
-
-    features = _get_features(
-        FeatureToggle.ALLOW_IDCHECK_REGISTRATION,
-        FeatureToggle.AUTO_ACTIVATE_DIGITAL_BOOKINGS,
-        FeatureToggle.DISPLAY_DMS_REDIRECTION,
-        FeatureToggle.ENABLE_ID_CHECK_RETENTION,
-        FeatureToggle.ENABLE_NATIVE_APP_RECAPTCHA,
-        FeatureToggle.ENABLE_NATIVE_ID_CHECK_VERBOSE_DEBUGGING,
-        FeatureToggle.ENABLE_NATIVE_ID_CHECK_VERSION,
-        FeatureToggle.ENABLE_PHONE_VALIDATION,
-        FeatureToggle.USE_APP_SEARCH_ON_NATIVE_APP,
-        FeatureToggle.ID_CHECK_ADDRESS_AUTOCOMPLETION,
-        FeatureToggle.WEBAPP_V2_ENABLED,
-        FeatureToggle.ENABLE_NATIVE_EAC_INDIVIDUAL,
-    )
 
+def _build_settings(features: dict[FeatureToggle, bool]) -> serializers.SettingsResponse:
     return serializers.SettingsResponse(
         deposit_amount=deposits_conf.GRANTED_DEPOSIT_AMOUNT_18_v2,
         is_recaptcha_enabled=features[FeatureToggle.ENABLE_NATIVE_APP_RECAPTCHA],
@@ -56,3 +57,34 @@ def get_settings() -> serializers.SettingsResponse:
         enable_native_eac_individual=features[FeatureToggle.ENABLE_NATIVE_EAC_INDIVIDUAL],
         account_creation_minimum_age=constants.ACCOUNT_CREATION_MINIMUM_AGE,
     )
+
+
+def _get_serialized_settings() -> tuple[bytes, str]:
+    # pylint: disable=global-statement
+    global _cached_settings
+    snapshot = get_features_snapshot()
+    version = tuple(snapshot[feature.name] for feature in SETTINGS_FEATURES)
+    cached_settings = _cached_settings
+    if cached_settings is None or cached_settings[0] != version:
+        settings_response = _build_settings(dict(zip(SETTINGS_FEATURES, version)))
+        body = settings_response.json(by_alias=True).encode()
+        cached_settings = (version, body, hashlib.sha1(body).hexdigest())
+        _cached_settings = cached_settings
+    return cached_settings[1], cached_settings[2]
+
+
+@blueprint.native_v1.route("/settings", methods=["GET"])
+@spectree_serialize(
+    api=blueprint.api,
+    response_model=serializers.SettingsResponse,
+    code_descriptions={"HTTP_304": "Settings have not changed since the version given by If-None-Match"},
+)
+def get_settings() -> Response:
+    body, etag = _get_serialized_settings()
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    # Clients may keep the settings, but must revalidate them (and get
+    # an empty 304 response if they have not changed).
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
@@ -1,3 +1,4 @@
+from typing import Iterable
 from typing import Optional
 
 from flask import jsonify
@@ -121,20 +122,18 @@ def get_bookings_pro(query: ListBookingsQueryModel) -> ListBookingsResponseModel
         "Content-Disposition": "attachment; filename=reservations_pass_culture.csv",
     },
 )
-def get_bookings_csv(query: ListBookingsQueryModel) -> bytes:
+def get_bookings_csv(query: ListBookingsQueryModel) -> Iterable[bytes]:
     venue_id = query.venue_id
     event_date = query.event_date
     booking_period = (query.booking_period_beginning_date, query.booking_period_ending_date)
 
-    bookings = booking_repository.get_csv_report(
+    return booking_repository.get_csv_report(
         user=current_user._get_current_object(),  # for tests to succeed, because current_user is actually a LocalProxy
         booking_period=booking_period,
         event_date=event_date,
         venue_id=venue_id,
     )
 
-    return bookings.encode("utf-8-sig")
-
 
 @pro_api_v2.route("/bookings/token/<token>", methods=["GET"])
 @ip_rate_limiter(deduct_when=lambda response: response.status_code == 401)
@@ -18,6 +18,7 @@ from pcapi.core.offers.repository import get_active_offers_count_for_venue
 from pcapi.core.offers.repository import get_sold_out_offers_count_for_venue
 from pcapi.infrastructure.container import list_offerers_for_pro_user
 from pcapi.models import ApiErrors
+from pcapi.models.feature import FeatureToggle
 from pcapi.repository import transaction
 from pcapi.routes.apis import private_api
 from pcapi.routes.serialization import as_dict
@@ -119,6 +120,13 @@ def get_venues_by_offerer_with_stats(humanized_offerer_id: str) -> GetOffererRes
     check_user_has_access_to_offerer(current_user, dehumanize(humanized_offerer_id))
     offerer = load_or_404(Offerer, humanized_offerer_id)
 
+    if FeatureToggle.PERF_VENUE_STATS.is_active():
+        venue_stats_by_ids = {
+            venue_id: VenueStatsResponseModel(**venue_stats)
+            for venue_id, venue_stats in api.get_venues_stats(offerer.id).items()
+        }
+        return GetOffererResponseModel.from_orm(offerer, venue_stats_by_ids)
+
     venue_stats_by_ids = {}
     active_bookings_quantity_by_venue = get_active_bookings_quantity_for_offerer(offerer.id)
     validated_bookings_quantity_by_venue = get_validated_bookings_quantity_for_offerer(offerer.id)
@@ -1,4 +1,8 @@
+from typing import Iterator
+
+from flask import Response
 from flask import request
+from flask import stream_with_context
 from flask_login import current_user
 from flask_login import login_required
 
@@ -7,9 +11,7 @@ from pcapi.models import ApiErrors
 from pcapi.models.feature import FeatureToggle
 from pcapi.repository.user_offerer_queries import filter_query_where_user_is_user_offerer_and_is_validated
 from pcapi.routes.apis import private_api
-from pcapi.routes.serialization.reimbursement_csv_serialize import find_all_offerers_reimbursement_details
-from pcapi.routes.serialization.reimbursement_csv_serialize import generate_reimbursement_details_csv
-from pcapi.routes.serialization.reimbursement_csv_serialize import legacy_find_all_offerers_reimbursement_details
+from pcapi.routes.serialization import reimbursement_csv_serialize
 from pcapi.routes.serialization.reimbursement_csv_serialize import validate_reimbursement_period
 from pcapi.serialization.utils import dehumanize_id
 
@@ -17,14 +19,16 @@ from pcapi.serialization.utils import dehumanize_id
 # @debt api-migration
 @private_api.route("/reimbursements/csv", methods=["GET"])
 @login_required
-def get_reimbursements_csv() -> tuple[bytes, int, dict[str, str]]:
+def get_reimbursements_csv() -> Response:
     if FeatureToggle.PRO_REIMBURSEMENTS_FILTERS.is_active():
         reimbursement_details_csv = _get_reimbursements_csv_filter()
     else:
         reimbursement_details_csv = _get_reimbursements_csv_no_filter()
 
-    return (
-        reimbursement_details_csv.encode("utf-8-sig"),
+    # The CSV is sent by chunks while payments are fetched by batches,
+    # so that large offerers do not have to fit in memory.
+    return Response(
+        stream_with_context(reimbursement_details_csv),
         200,
         {
             "Content-type": "text/csv; charset=utf-8;",
@@ -33,7 +37,7 @@ def get_reimbursements_csv() -> tuple[bytes, int, dict[str, str]]:
     )
 
 
-def _get_reimbursements_csv_filter() -> str:
+def _get_reimbursements_csv_filter() -> Iterator[bytes]:
     offerers = Offerer.query.with_entities(Offerer.id)
     if not current_user.has_admin_role:
         offerers = filter_query_where_user_is_user_offerer_and_is_validated(offerers, current_user)
@@ -48,23 +52,25 @@ def _get_reimbursements_csv_filter() -> str:
     )
     venue_id = dehumanize_id(request.args.get("venueId"))
 
-    reimbursement_details = find_all_offerers_reimbursement_details(
+    reimbursement_details = reimbursement_csv_serialize.find_all_offerers_reimbursement_details_by_batches(
         all_offerer_ids,
         (reimbursement_period_beginning_date, reimbursement_period_ending_date),
         venue_id,
     )
-    reimbursement_details_csv = generate_reimbursement_details_csv(reimbursement_details)
+    reimbursement_details_csv = reimbursement_csv_serialize.stream_reimbursement_details_csv(reimbursement_details)
 
     return reimbursement_details_csv
 
 
 # TODO(AnthonySkorski, 2021-09-15): to be deleted when PRO_REIMBURSEMENTS_FILTERS feature flag is definitely enabled
-def _get_reimbursements_csv_no_filter() -> str:
+def _get_reimbursements_csv_no_filter() -> Iterator[bytes]:
     offerers = Offerer.query.with_entities(Offerer.id)
     offerers = filter_query_where_user_is_user_offerer_and_is_validated(offerers, current_user)
     all_offerer_ids = [row[0] for row in offerers.all()]
 
-    reimbursement_details = legacy_find_all_offerers_reimbursement_details(all_offerer_ids)
-    reimbursement_details_csv = generate_reimbursement_details_csv(reimbursement_details)
+    reimbursement_details = reimbursement_csv_serialize.legacy_find_all_offerers_reimbursement_details_by_batches(
+        all_offerer_ids
+    )
+    reimbursement_details_csv = reimbursement_csv_serialize.stream_reimbursement_details_csv(reimbursement_details)
 
     return reimbursement_details_csv
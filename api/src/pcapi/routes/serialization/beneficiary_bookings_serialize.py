@@ -9,10 +9,14 @@ def serialize_beneficiary_bookings(
     beneficiary_bookings: BeneficiaryBookingsWithStocks, with_qr_code: bool = False
 ) -> list:
     results = []
+    serialized_stocks_by_offer_id = {}
     for beneficiary_booking in beneficiary_bookings.bookings:
-        serialized_stocks = _serialize_stocks_for_beneficiary_bookings(
-            beneficiary_booking.offerId, beneficiary_bookings.stocks
-        )
+        offer_id = beneficiary_booking.offerId
+        if offer_id not in serialized_stocks_by_offer_id:
+            serialized_stocks_by_offer_id[offer_id] = _serialize_stocks_for_beneficiary_bookings(
+                beneficiary_bookings.get_stocks_of_offer(offer_id)
+            )
+        serialized_stocks = serialized_stocks_by_offer_id[offer_id]
         serialized_booking = _serialize_beneficiary_booking(
             beneficiary_booking, serialized_stocks, with_qr_code=with_qr_code
         )
@@ -35,8 +39,8 @@ def _serialize_stock_for_beneficiary_booking(stock: Stock) -> dict:
     }
 
 
-def _serialize_stocks_for_beneficiary_bookings(matched_offer_id: int, stocks: list[Stock]) -> list[dict]:
-    return [_serialize_stock_for_beneficiary_booking(stock) for stock in stocks if stock.offer_id == matched_offer_id]
+def _serialize_stocks_for_beneficiary_bookings(stocks: list[Stock]) -> list[dict]:
+    return [_serialize_stock_for_beneficiary_booking(stock) for stock in stocks]
 
 
 def _serialize_offer_is_bookable(serialized_stocks: list[dict]) -> bool:
@@ -4,13 +4,17 @@ from datetime import date
 from io import StringIO
 from typing import Callable
 from typing import Iterable
+from typing import Iterator
 from typing import Optional
 from typing import Union
 
 from pcapi.models import ApiErrors
 from pcapi.models.payment_status import TransactionStatus
 from pcapi.repository.reimbursement_queries import find_all_offerers_payments
+from pcapi.repository.reimbursement_queries import find_all_offerers_payments_by_batches
 from pcapi.repository.reimbursement_queries import legacy_find_all_offerers_payments
+from pcapi.repository.reimbursement_queries import legacy_find_all_offerers_payments_by_batches
+from pcapi.utils.csv_stream import pop_csv_output
 from pcapi.utils.date import MONTHS_IN_FRENCH
 
 
@@ -113,12 +117,32 @@ class ReimbursementDetails:
 def generate_reimbursement_details_csv(reimbursement_details: Iterable[ReimbursementDetails]) -> str:
     output = StringIO()
     csv_lines = [reimbursement_detail.as_csv_row() for reimbursement_detail in reimbursement_details]
-    writer = csv.writer(output, dialect=csv.excel, delimiter=";", quoting=csv.QUOTE_NONNUMERIC)
+    writer = _get_csv_writer(output)
     writer.writerow(ReimbursementDetails.CSV_HEADER)
     writer.writerows(csv_lines)
     return output.getvalue()
 
 
+def stream_reimbursement_details_csv(
+    reimbursement_details_batches: Iterable[Iterable[ReimbursementDetails]],
+) -> Iterator[bytes]:
+    """Yield the CSV file as UTF-8 encoded chunks: the header (with a
+    BOM, for Excel), then one chunk per batch of reimbursement details.
+    """
+    output = StringIO()
+    writer = _get_csv_writer(output)
+    writer.writerow(ReimbursementDetails.CSV_HEADER)
+    yield pop_csv_output(output, encoding="utf-8-sig")
+
+    for reimbursement_details in reimbursement_details_batches:
+        writer.writerows(reimbursement_detail.as_csv_row() for reimbursement_detail in reimbursement_details)
+        yield pop_csv_output(output)
+
+
+def _get_csv_writer(output: StringIO):
+    return csv.writer(output, dialect=csv.excel, delimiter=";", quoting=csv.QUOTE_NONNUMERIC)
+
+
 def find_all_offerer_reimbursement_details(
     offerer_id: int, reimbursements_period: tuple[Optional[date], Optional[date]], venue_id: Optional[int] = None
 ) -> list[ReimbursementDetails]:
@@ -138,6 +162,13 @@ def find_all_offerers_reimbursement_details(
     return reimbursement_details
 
 
+def find_all_offerers_reimbursement_details_by_batches(
+    offerer_ids: list[int], reimbursements_period: tuple[Optional[date], Optional[date]], venue_id: Optional[int] = None
+) -> Iterator[Iterator[ReimbursementDetails]]:
+    for offerer_payments in find_all_offerers_payments_by_batches(offerer_ids, reimbursements_period, venue_id):
+        yield (ReimbursementDetails(offerer_payment) for offerer_payment in offerer_payments)
+
+
 # TODO : delete this legacy function when feature PRO_REIMBURSEMENTS_FILTERS is deleted or activate in production
 def legacy_find_all_offerer_reimbursement_details(offerer_id: int) -> list[ReimbursementDetails]:
     return legacy_find_all_offerers_reimbursement_details([offerer_id])
@@ -151,6 +182,14 @@ def legacy_find_all_offerers_reimbursement_details(offerer_ids: list[int]) -> li
     return reimbursement_details
 
 
+# TODO : delete this legacy function when feature PRO_REIMBURSEMENTS_FILTERS is deleted or activate in production
+def legacy_find_all_offerers_reimbursement_details_by_batches(
+    offerer_ids: list[int],
+) -> Iterator[Iterator[ReimbursementDetails]]:
+    for offerer_payments in legacy_find_all_offerers_payments_by_batches(offerer_ids):
+        yield (ReimbursementDetails(offerer_payment) for offerer_payment in offerer_payments)
+
+
 def _get_reimbursement_current_status_in_details(
     current_status: TransactionStatus, current_status_details: str
 ) -> Optional[str]:
@@ -8,10 +8,12 @@ from sentry_sdk import set_tag
 
 from pcapi import settings
 import pcapi.core.bookings.api as bookings_api
+from pcapi.core.offerers import api_key_cache
 from pcapi.core.offerers.repository import get_offerers_by_date_validated
 from pcapi.core.offers.repository import check_stock_consistency
 from pcapi.core.offers.repository import delete_past_draft_offers
 from pcapi.core.offers.repository import find_tomorrow_event_stock_ids
+from pcapi.core.payments.repository import check_deposit_spending_consistency
 from pcapi.core.providers.repository import get_provider_by_local_class
 from pcapi.core.users import api as users_api
 from pcapi.core.users.repository import get_newly_eligible_users
@@ -47,6 +49,15 @@ def update_booking_used() -> None:
     bookings_api.auto_mark_as_used_after_event()
 
 
+@cron_context
+@log_cron_with_transaction
+def process_booking_outbox() -> None:
+    # Events are usually processed by workers right after the booking.
+    # This catches up if a job could not be enqueued or has failed.
+    bookings_api.process_booking_outbox()
+    logger.info("Booking outbox status", extra=bookings_api.get_booking_outbox_status())
+
+
 @cron_context
 @log_cron_with_transaction
 @cron_require_feature(FeatureToggle.SYNCHRONIZE_ALLOCINE)
@@ -158,6 +169,36 @@ def pc_check_stock_quantity_consistency() -> None:
         logger.error("Found inconsistent stocks: %s", ", ".join([str(stock_id) for stock_id in inconsistent_stocks]))
 
 
+@cron_context
+@log_cron_with_transaction
+def pc_check_deposit_spending_consistency() -> None:
+    inconsistent_deposits = check_deposit_spending_consistency()
+    if inconsistent_deposits:
+        logger.error(
+            "Found inconsistent deposit spending: %s",
+            ", ".join([str(deposit_id) for deposit_id in inconsistent_deposits]),
+        )
+
+
+@cron_context
+@log_cron_with_transaction
+def pc_log_api_key_cache_metrics() -> None:
+    metrics = api_key_cache.pop_metrics()
+    if metrics is None:
+        return
+    hits = metrics.get("local_hit", 0) + metrics.get("redis_hit", 0)
+    misses = metrics.get("miss", 0)
+    logger.info(
+        "API key cache metrics",
+        extra={
+            "local_hits": metrics.get("local_hit", 0),
+            "redis_hits": metrics.get("redis_hit", 0),
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else None,
+        },
+    )
+
+
 @cron_context
 @log_cron_with_transaction
 def pc_send_tomorrow_events_notifications() -> None:
@@ -207,6 +248,8 @@ def clock() -> None:
 
     scheduler.add_job(update_booking_used, "cron", day="*", hour="0")
 
+    scheduler.add_job(process_booking_outbox, "cron", minute="*")
+
     scheduler.add_job(
         pc_handle_expired_bookings,
         "cron",
@@ -228,6 +271,10 @@ def clock() -> None:
 
     scheduler.add_job(pc_check_stock_quantity_consistency, "cron", day="*", hour="1")
 
+    scheduler.add_job(pc_check_deposit_spending_consistency, "cron", day="*", hour="1", minute="30")
+
+    scheduler.add_job(pc_log_api_key_cache_metrics, "cron", minute="*/10")
+
     scheduler.add_job(pc_send_tomorrow_events_notifications, "cron", day="*", hour="16")
 
     scheduler.add_job(pc_clean_past_draft_offers, "cron", day="*", hour="20")
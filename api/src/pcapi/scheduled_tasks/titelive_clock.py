@@ -2,6 +2,7 @@ from apscheduler.schedulers.blocking import BlockingScheduler
 from flask import Blueprint
 from sentry_sdk import set_tag
 
+from pcapi.connectors.ftp_titelive import close_titelive_ftp
 from pcapi.local_providers.provider_manager import synchronize_data_for_provider
 from pcapi.models.feature import FeatureToggle
 from pcapi.scheduled_tasks import utils
@@ -17,21 +18,30 @@ blueprint = Blueprint(__name__, __name__)
 @log_cron_with_transaction
 @cron_require_feature(FeatureToggle.SYNCHRONIZE_TITELIVE_PRODUCTS)
 def synchronize_titelive_things():
-    synchronize_data_for_provider("TiteLiveThings")
+    try:
+        synchronize_data_for_provider("TiteLiveThings")
+    finally:
+        close_titelive_ftp()
 
 
 @cron_context
 @log_cron_with_transaction
 @cron_require_feature(FeatureToggle.SYNCHRONIZE_TITELIVE_PRODUCTS_DESCRIPTION)
 def synchronize_titelive_thing_descriptions():
-    synchronize_data_for_provider("TiteLiveThingDescriptions")
+    try:
+        synchronize_data_for_provider("TiteLiveThingDescriptions")
+    finally:
+        close_titelive_ftp()
 
 
 @cron_context
 @log_cron_with_transaction
 @cron_require_feature(FeatureToggle.SYNCHRONIZE_TITELIVE_PRODUCTS_THUMBS)
 def synchronize_titelive_thing_thumbs():
-    synchronize_data_for_provider("TiteLiveThingThumbs")
+    try:
+        synchronize_data_for_provider("TiteLiveThingThumbs")
+    finally:
+        close_titelive_ftp()
 
 
 @blueprint.cli.command("titelive_clock")
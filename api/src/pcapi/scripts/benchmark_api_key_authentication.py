@@ -0,0 +1,84 @@
+"""Benchmark authenticated requests to the public API (v2).
+
+The script creates an API key and a booking, and sends the same
+``GET /v2/bookings/token/<token>`` request many times with the
+Flask test client, twice:
+
+- "uncached": the secret of the API key is checked with bcrypt on
+  each request, as we used to do (``API_KEY_CACHE_TTL`` is set to 0);
+- "cached": the secret is only checked on the first request, and then
+  found in the cache of verified API keys (see `api_key_cache`).
+
+Development environments hash secrets with MD5 instead of bcrypt to
+speed up tests: the script uses bcrypt, as on production. It must only
+be run on a local development database, since it creates data.
+
+Usage:
+
+    $ python benchmark_api_key_authentication.py --requests 200
+"""
+
+import argparse
+import secrets
+import time
+
+from pcapi import settings
+import pcapi.core.bookings.factories as bookings_factories
+from pcapi.core.offerers import api as offerers_api
+from pcapi.core.offerers import api_key_cache
+from pcapi.core.offerers.models import ApiKey
+from pcapi.flask_app import app
+from pcapi.models import db
+from pcapi.utils import crypto
+
+
+def create_data() -> tuple[str, str]:
+    booking = bookings_factories.IndividualBookingFactory()
+    prefix = offerers_api._generate_api_key_prefix()  # pylint: disable=protected-access
+    clear_secret = secrets.token_hex(32)
+    api_key = ApiKey(
+        offererId=booking.offererId,
+        prefix=prefix,
+        secret=crypto._hash_password_with_bcrypt(clear_secret),  # pylint: disable=protected-access
+    )
+    db.session.add(api_key)
+    db.session.commit()
+    return f"{prefix}{offerers_api.API_KEY_SEPARATOR}{clear_secret}", booking.token
+
+
+def run(name: str, key: str, token: str, requests: int) -> None:
+    api_key_cache.clear_local_cache()
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {key}"}
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(f"/v2/bookings/token/{token}", headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"Unexpected response: {response.status_code} {response.json}")
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {elapsed:.2f}s, {requests / elapsed:.1f} requests/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark authenticated requests to the public API.")
+    parser.add_argument("--requests", type=int, default=200, help="number of requests")
+    args = parser.parse_args()
+
+    if not settings.IS_DEV:
+        raise RuntimeError("This script creates data and must only be run on a development database")
+
+    # Check secrets with bcrypt, as on production.
+    crypto.check_password = crypto._check_password_with_bcrypt  # pylint: disable=protected-access
+    initial_ttl = settings.API_KEY_CACHE_TTL
+    with app.app_context():
+        key, token = create_data()
+        try:
+            for name, ttl in (("uncached", 0), ("cached", initial_ttl or 60)):
+                settings.API_KEY_CACHE_TTL = ttl
+                run(name, key, token, args.requests)
+        finally:
+            settings.API_KEY_CACHE_TTL = initial_ttl
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark how fast we can push documents to App Search.
+
+The script starts a local stub App Search server that answers to the
+Documents API after a configurable delay, and indexes the same set of
+fake offers twice:
+
+- "sequential": one request after another, and a new HTTP session
+  (thus a new connection) for each request, as we used to do;
+- "pooled": a single keep-alive session, with batches of different
+  engines sent in parallel (see `AppSearchApiClient.create_or_update_documents`).
+
+Usage:
+
+    $ python benchmark_appsearch_indexing.py --documents 1000 --latency 0.05
+"""
+
+import argparse
+import http.server
+import json
+import threading
+import time
+
+from pcapi.core.search.backends import appsearch
+from pcapi.utils import requests
+
+
+class StubAppSearchHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # allow keep-alive connections
+    latency = 0.0
+    connections = set()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.connections.add(self.client_address)
+        length = int(self.headers["Content-Length"])
+        documents = json.loads(self.rfile.read(length))
+        time.sleep(self.latency)
+        body = json.dumps([{"id": document["id"], "errors": []} for document in documents]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+def start_stub_server(latency: float) -> http.server.ThreadingHTTPServer:
+    StubAppSearchHandler.latency = latency
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubAppSearchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_client(host: str, pooled: bool) -> appsearch.AppSearchApiClient:
+    client = appsearch.AppSearchApiClient(
+        host=host,
+        api_key="fake-key",
+        meta_engine_name=appsearch.OFFERS_META_ENGINE_NAME,
+        engine_selector=appsearch.get_offer_engine,
+        synonyms=(),
+        field_weights=None,
+        field_boosts=None,
+        search_precision=appsearch.OFFERS_SEARCH_PRECISION,
+        schema=appsearch.OFFERS_SCHEMA,
+    )
+    if not pooled:
+        # `pcapi.utils.requests.post()` opens a new session for each call.
+        client.session = requests
+        client.max_concurrent_requests = 1
+    return client
+
+
+def run(client: appsearch.AppSearchApiClient, documents: list[dict], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        client.create_or_update_documents(documents)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark indexation of documents on a stub App Search server.")
+    parser.add_argument("--documents", type=int, default=1000, help="number of documents per round")
+    parser.add_argument("--rounds", type=int, default=5, help="number of rounds")
+    parser.add_argument("--latency", type=float, default=0.05, help="delay of the stub server, in seconds")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency)
+    host = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    documents = [{"id": i, "is_educational": 0, "name": f"Offer {i}"} for i in range(args.documents)]
+
+    for name, pooled in (("sequential", False), ("pooled", True)):
+        StubAppSearchHandler.connections = set()
+        elapsed = run(get_client(host, pooled), documents, args.rounds)
+        total = args.documents * args.rounds
+        print(
+            f"{name:>10}: {elapsed:.2f}s, {total / elapsed:.0f} documents/s, "
+            f"{len(StubAppSearchHandler.connections)} connection(s)"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark the list of bookings of a beneficiary on the webapp
+(``GET /bookings``).
+
+The script creates beneficiaries with more and more bookings, each on
+a distinct offer that has many stocks (as national offers with many
+dates do) and a few mediations, and requests their bookings many times
+with the Flask test client. It prints the time per request and per
+booking: the latter should stay flat as the number of bookings grows,
+since bookings, stocks and mediations are assembled in linear time.
+
+It must only be run on a local development database, since it creates
+data.
+
+Usage:
+
+    $ python benchmark_beneficiary_bookings.py --bookings 50,100,200,400 --stocks-per-offer 20
+"""
+
+import argparse
+import time
+
+from pcapi import settings
+import pcapi.core.bookings.factories as bookings_factories
+import pcapi.core.offers.factories as offers_factories
+import pcapi.core.users.factories as users_factories
+from pcapi.flask_app import app
+from pcapi.models import db
+
+
+MEDIATIONS_PER_OFFER = 2
+
+
+def create_data(bookings: int, stocks_per_offer: int) -> str:
+    beneficiary = users_factories.BeneficiaryGrant18Factory()
+    for _ in range(bookings):
+        offer = offers_factories.ThingOfferFactory()
+        stocks = offers_factories.ThingStockFactory.create_batch(stocks_per_offer, offer=offer, price=0)
+        offers_factories.MediationFactory.create_batch(MEDIATIONS_PER_OFFER, offer=offer)
+        bookings_factories.IndividualBookingFactory(individualBooking__user=beneficiary, stock=stocks[0])
+    db.session.commit()
+    return beneficiary.email
+
+
+def run(email: str, bookings: int, requests: int) -> None:
+    client = app.test_client()
+    response = client.post("/users/signin", json={"identifier": email, "password": users_factories.DEFAULT_PASSWORD})
+    if response.status_code != 200:
+        raise RuntimeError(f"Could not sign in: {response.status_code} {response.json}")
+    client.get("/bookings")  # warm up
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get("/bookings")
+        if response.status_code != 200 or len(response.json) != bookings:
+            raise RuntimeError(f"Unexpected response: {response.status_code}")
+    elapsed = (time.perf_counter() - start) / requests
+    print(f"{bookings:>6} bookings: {elapsed * 1000:.1f} ms/request, {elapsed * 1000 / bookings:.3f} ms/booking")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the list of bookings of a beneficiary.")
+    parser.add_argument("--bookings", default="50,100,200,400", help="comma-separated numbers of bookings")
+    parser.add_argument("--stocks-per-offer", type=int, default=20, help="number of stocks of each booked offer")
+    parser.add_argument("--requests", type=int, default=20, help="number of requests per beneficiary")
+    args = parser.parse_args()
+
+    if not settings.IS_DEV:
+        raise RuntimeError("This script creates data and must only be run on a development database")
+
+    with app.app_context():
+        for bookings in [int(value) for value in args.bookings.split(",")]:
+            email = create_data(bookings, args.stocks_per_offer)
+            run(email, bookings, args.requests)
+
+
+if __name__ == "__main__":
+    main()
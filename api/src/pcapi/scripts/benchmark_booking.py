@@ -0,0 +1,106 @@
+"""Benchmark concurrent bookings of a single "hot" stock.
+
+The script creates a stock and as many beneficiaries as requested, and
+makes all beneficiaries book the stock at the same time, from several
+threads. It does so twice:
+
+- "lock": the stock is locked (SELECT ... FOR UPDATE) while the
+  booking is validated, as we used to do;
+- "atomic": the booking is validated first and the quantity is then
+  reserved with a single conditional UPDATE (see the
+  ENABLE_ATOMIC_STOCK_RESERVATION feature flag).
+
+It must only be run on a local development database, since it creates
+users, offers and bookings. The number of threads should not exceed
+the size of the database connection pool.
+
+Usage:
+
+    $ python benchmark_booking.py --beneficiaries 500 --quantity 300 --threads 10
+"""
+
+import argparse
+from concurrent import futures
+import time
+
+from pcapi import settings
+from pcapi.core.bookings import api as bookings_api
+from pcapi.core.bookings import exceptions as bookings_exceptions
+from pcapi.core.bookings.models import Booking
+import pcapi.core.offers.factories as offers_factories
+from pcapi.core.offers.models import Stock
+import pcapi.core.users.factories as users_factories
+from pcapi.core.users.models import User
+from pcapi.flask_app import app
+from pcapi.models import db
+from pcapi.models.feature import Feature
+from pcapi.models.feature import FeatureToggle
+from pcapi.models.feature import invalidate_features_snapshot
+
+
+def book(user_id: int, stock_id: int) -> str:
+    with app.app_context():
+        try:
+            beneficiary = User.query.get(user_id)
+            bookings_api.book_offer(beneficiary=beneficiary, stock_id=stock_id, quantity=1)
+            return "booked"
+        except bookings_exceptions.StockIsNotBookable:
+            return "sold out"
+        except Exception:  # pylint: disable=broad-except
+            db.session.rollback()
+            return "error"
+        finally:
+            db.session.remove()
+
+
+def run(atomic: bool, beneficiaries: int, quantity: int, threads: int) -> None:
+    Feature.query.filter_by(name=FeatureToggle.ENABLE_ATOMIC_STOCK_RESERVATION.name).update({"isActive": atomic})
+    stock = offers_factories.ThingStockFactory(price=1, quantity=quantity)
+    user_ids = [user.id for user in users_factories.BeneficiaryGrant18Factory.create_batch(beneficiaries)]
+    stock_id = stock.id
+    db.session.commit()
+    invalidate_features_snapshot()
+    db.session.remove()
+
+    results = {"booked": 0, "sold out": 0, "error": 0}
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        for result in executor.map(lambda user_id: book(user_id, stock_id), user_ids):
+            results[result] += 1
+    elapsed = time.perf_counter() - start
+
+    booked_quantity = Stock.query.get(stock_id).dnBookedQuantity
+    bookings = Booking.query.filter_by(stockId=stock_id).count()
+    name = "atomic" if atomic else "lock"
+    print(
+        f"{name:>6}: {elapsed:.2f}s, {results['booked'] / elapsed:.1f} bookings/s, "
+        f"{beneficiaries / elapsed:.1f} attempts/s | {results['booked']} booked, "
+        f"{results['sold out']} sold out, {results['error']} error(s) | "
+        f"stock: {booked_quantity}/{quantity} booked, {bookings} booking(s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent bookings of a single stock.")
+    parser.add_argument("--beneficiaries", type=int, default=200, help="number of beneficiaries that book the stock")
+    parser.add_argument("--quantity", type=int, default=100, help="quantity of the stock")
+    parser.add_argument("--threads", type=int, default=10, help="number of concurrent threads")
+    args = parser.parse_args()
+
+    if not settings.IS_DEV:
+        raise RuntimeError("This script creates data and must only be run on a development database")
+
+    with app.app_context():
+        initial_value = FeatureToggle.ENABLE_ATOMIC_STOCK_RESERVATION.is_active()
+        try:
+            for atomic in (False, True):
+                run(atomic, args.beneficiaries, args.quantity, args.threads)
+        finally:
+            Feature.query.filter_by(name=FeatureToggle.ENABLE_ATOMIC_STOCK_RESERVATION.name).update(
+                {"isActive": initial_value}
+            )
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    main()
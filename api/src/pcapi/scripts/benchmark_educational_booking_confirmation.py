@@ -0,0 +1,116 @@
+"""Benchmark concurrent confirmations of educational bookings of a
+single institution.
+
+Confirming an educational booking locks the deposit of the institution
+(SELECT ... FOR UPDATE) and checks that the amount of its confirmed
+bookings, plus the amount of the new booking, does not exceed the
+deposit. All confirmations of an institution are thus serialized, and
+their throughput depends on how long the lock is held, i.e. on how
+long it takes to compute the confirmed amount.
+
+The script creates an institution that already has many confirmed
+bookings, and pending bookings that are confirmed at the same time,
+from several threads. It prints the number of confirmations per second
+and checks that the deposit has not been overspent.
+
+It must only be run on a local development database, since it creates
+offers and bookings. The number of threads should not exceed the size
+of the database connection pool.
+
+Usage:
+
+    $ python benchmark_educational_booking_confirmation.py --confirmed 5000 --pending 500 --threads 10
+"""
+
+import argparse
+from concurrent import futures
+import time
+
+from pcapi import settings
+import pcapi.core.bookings.factories as bookings_factories
+from pcapi.core.bookings.models import BookingStatus
+from pcapi.core.educational import api as educational_api
+from pcapi.core.educational import exceptions as educational_exceptions
+import pcapi.core.educational.factories as educational_factories
+from pcapi.core.educational.repository import get_confirmed_educational_bookings_amount
+from pcapi.flask_app import app
+from pcapi.models import db
+
+
+BOOKING_AMOUNT = 10
+
+
+def create_data(confirmed: int, pending: int, deposit_amount: int) -> tuple[int, str, list[int]]:
+    institution = educational_factories.EducationalInstitutionFactory()
+    year = educational_factories.EducationalYearFactory()
+    educational_factories.EducationalDepositFactory(
+        educationalInstitution=institution, educationalYear=year, amount=deposit_amount
+    )
+    bookings_factories.EducationalBookingFactory.create_batch(
+        confirmed,
+        amount=BOOKING_AMOUNT,
+        quantity=1,
+        status=BookingStatus.CONFIRMED,
+        educationalBooking__educationalInstitution=institution,
+        educationalBooking__educationalYear=year,
+    )
+    pending_bookings = bookings_factories.PendingEducationalBookingFactory.create_batch(
+        pending,
+        amount=BOOKING_AMOUNT,
+        quantity=1,
+        educationalBooking__educationalInstitution=institution,
+        educationalBooking__educationalYear=year,
+    )
+    db.session.commit()
+    return institution.id, year.adageId, [booking.educationalBookingId for booking in pending_bookings]
+
+
+def confirm(educational_booking_id: int) -> str:
+    with app.app_context():
+        try:
+            educational_api.confirm_educational_booking(educational_booking_id)
+            return "confirmed"
+        except educational_exceptions.InsufficientFund:
+            return "insufficient fund"
+        except Exception:  # pylint: disable=broad-except
+            db.session.rollback()
+            return "error"
+        finally:
+            db.session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent confirmations of educational bookings.")
+    parser.add_argument("--confirmed", type=int, default=5000, help="number of bookings confirmed beforehand")
+    parser.add_argument("--pending", type=int, default=500, help="number of bookings to confirm concurrently")
+    parser.add_argument("--threads", type=int, default=10, help="number of concurrent threads")
+    args = parser.parse_args()
+
+    if not settings.IS_DEV:
+        raise RuntimeError("This script creates data and must only be run on a development database")
+
+    # Leave room for about 90% of pending bookings, so that some
+    # confirmations are refused.
+    deposit_amount = (args.confirmed + args.pending * 9 // 10) * BOOKING_AMOUNT
+    with app.app_context():
+        institution_id, year_id, educational_booking_ids = create_data(args.confirmed, args.pending, deposit_amount)
+        db.session.remove()
+
+        results = {"confirmed": 0, "insufficient fund": 0, "error": 0}
+        start = time.perf_counter()
+        with futures.ThreadPoolExecutor(max_workers=args.threads) as executor:
+            for result in executor.map(confirm, educational_booking_ids):
+                results[result] += 1
+        elapsed = time.perf_counter() - start
+
+        spent_amount = get_confirmed_educational_bookings_amount(institution_id, year_id)
+        print(
+            f"{elapsed:.2f}s, {results['confirmed'] / elapsed:.1f} confirmations/s, "
+            f"{args.pending / elapsed:.1f} attempts/s | {results['confirmed']} confirmed, "
+            f"{results['insufficient fund']} refused, {results['error']} error(s) | "
+            f"deposit: {spent_amount}/{deposit_amount} spent"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark the pagination of offer ids, with ``OFFSET`` and with a
+keyset (see `pcapi.utils.db.get_keyset_batches`).
+
+The script fills a temporary table that looks like the ``offer`` table
+(an id primary key and an ``isActive`` flag) with millions of rows,
+and then fetches the ids of active rows by pages:
+
+- "offset": ``ORDER BY id OFFSET page * size LIMIT size``, as our
+  indexing jobs used to do. Only some pages are fetched, since going
+  through all of them takes a quadratic time;
+- "keyset": ``WHERE id > last_id ORDER BY id LIMIT size``, for all
+  pages.
+
+It prints the time spent to fetch some pages, from the first one to
+the last one. The temporary table is created in a transaction that
+is rolled back at the end, but the script should only be run on a
+local development database anyway.
+
+Usage:
+
+    $ python benchmark_keyset_pagination.py --rows 5000000 --page-size 1000
+"""
+
+import argparse
+import time
+
+import sqlalchemy as sqla
+
+from pcapi import settings
+from pcapi.flask_app import app
+from pcapi.models import db
+from pcapi.utils.db import get_keyset_batches
+
+
+SAMPLES = 6
+
+benchmark_offer = sqla.Table(
+    "benchmark_offer",
+    sqla.MetaData(),
+    sqla.Column("id", sqla.BigInteger, primary_key=True),
+    sqla.Column("isActive", sqla.Boolean, nullable=False),
+)
+
+
+def create_data(rows: int) -> None:
+    db.session.execute(
+        """
+        CREATE TEMPORARY TABLE benchmark_offer AS
+        SELECT id, random() < 0.9 AS "isActive" FROM generate_series(1, :rows) AS id
+        """,
+        {"rows": rows},
+    )
+    db.session.execute("ALTER TABLE benchmark_offer ADD PRIMARY KEY (id)")
+    db.session.execute("ANALYZE benchmark_offer")
+
+
+def get_query():
+    return db.session.query(benchmark_offer.c.id).filter(benchmark_offer.c.isActive.is_(True))
+
+
+def run_offset(page: int, page_size: int) -> float:
+    start = time.perf_counter()
+    get_query().order_by(benchmark_offer.c.id).offset(page * page_size).limit(page_size).all()
+    return time.perf_counter() - start
+
+
+def run_keyset(page_size: int) -> list[float]:
+    durations = []
+    start = time.perf_counter()
+    for _ in get_keyset_batches(get_query(), benchmark_offer.c.id, page_size):
+        durations.append(time.perf_counter() - start)
+        start = time.perf_counter()
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pagination of offer ids.")
+    parser.add_argument("--rows", type=int, default=5_000_000, help="number of rows of the table")
+    parser.add_argument("--page-size", type=int, default=1000, help="number of ids per page")
+    args = parser.parse_args()
+
+    if not settings.IS_DEV:
+        raise RuntimeError("This script creates data and must only be run on a development database")
+
+    with app.app_context():
+        print(f"Creating a table of {args.rows} rows...")
+        create_data(args.rows)
+        keyset_durations = run_keyset(args.page_size)
+        pages = len(keyset_durations)
+        sampled_pages = sorted({round(i * (pages - 1) / (SAMPLES - 1)) for i in range(SAMPLES)})
+        print(f"{pages} pages of {args.page_size} ids")
+        print(f"{'page':>8} {'offset (ms)':>12} {'keyset (ms)':>12}")
+        for page in sampled_pages:
+            offset_duration = run_offset(page, args.page_size)
+            print(f"{page:>8} {offset_duration * 1000:>12.2f} {keyset_durations[page] * 1000:>12.2f}")
+        print(f"keyset, all pages: {sum(keyset_durations):.2f}s")
+        db.session.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark the computation of reimbursements on a synthetic year of
+bookings.
+
+The script generates used bookings for a number of venues, spread over
+a year and over offers of several kinds, and computes their
+reimbursements:
+
+- "rows": with `find_all_booking_row_reimbursements()` on plain rows,
+  as `generate_new_payments` now does;
+- "rows-pool": the same, with venues spread across worker processes
+  (see ``--processes``). Rows have to be sent to workers here, which
+  is costly: this only pays off with many large venues. (In
+  `generate_new_payments`, workers fetch rows and insert payments
+  themselves, which is where most of the time is spent.)
+
+Bookings are not stored in the database, so that only the computation
+is measured (not the database queries, nor the insertion of payments).
+
+Usage:
+
+    $ python benchmark_reimbursements.py --venues 100 --bookings 5000 --processes 4
+"""
+
+import argparse
+import collections
+from concurrent import futures
+import datetime
+from decimal import Decimal
+import random
+import time
+
+from pcapi.core.categories import subcategories
+from pcapi.domain import reimbursement
+
+
+BookingRow = collections.namedtuple(
+    "BookingRow", ["offerId", "offererId", "subcategoryId", "isEducational", "dateUsed", "amount", "quantity"]
+)
+
+OFFER_KINDS = (
+    (subcategories.SEANCE_CINE.id, False),
+    (subcategories.LIVRE_PAPIER.id, False),
+    (subcategories.SUPPORT_PHYSIQUE_FILM.id, False),
+    (subcategories.VOD.id, False),
+    (subcategories.ATELIER_PRATIQUE_ART.id, True),
+)
+
+
+def generate_rows(venues: int, bookings: int, seed: int) -> list[list[BookingRow]]:
+    rng = random.Random(seed)
+    start = datetime.datetime(2021, 1, 1)
+    rows_per_venue = []
+    for venue_id in range(venues):
+        dates = sorted(start + datetime.timedelta(seconds=rng.randrange(365 * 24 * 3600)) for _ in range(bookings))
+        rows = []
+        for date_used in dates:
+            subcategory_id, is_educational = rng.choice(OFFER_KINDS)
+            amount = Decimal(rng.choice((5, 10, 15, 20, 50, 100)))
+            offer_id = venue_id * 100 + rng.randrange(100)
+            rows.append(BookingRow(offer_id, venue_id, subcategory_id, is_educational, date_used, amount, 1))
+        rows_per_venue.append(rows)
+    return rows_per_venue
+
+
+def compute_row_reimbursements(rows: list[BookingRow]) -> Decimal:
+    finder = reimbursement.CustomRuleFinder(rules=[])
+    return sum(r.reimbursed_amount for r in reimbursement.find_all_booking_row_reimbursements(rows, finder))
+
+
+def run_rows(rows_per_venue: list[list[BookingRow]]) -> Decimal:
+    return sum(compute_row_reimbursements(rows) for rows in rows_per_venue)
+
+
+def run_rows_pool(rows_per_venue: list[list[BookingRow]], processes: int) -> Decimal:
+    with futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        return sum(executor.map(compute_row_reimbursements, rows_per_venue))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the computation of reimbursements.")
+    parser.add_argument("--venues", type=int, default=50, help="number of venues")
+    parser.add_argument("--bookings", type=int, default=5000, help="number of bookings per venue over the year")
+    parser.add_argument("--processes", type=int, default=4, help="number of worker processes for rows-pool")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    args = parser.parse_args()
+
+    rows_per_venue = generate_rows(args.venues, args.bookings, args.seed)
+    total_bookings = args.venues * args.bookings
+
+    results = {}
+    for name, function, function_args in (
+        ("rows", run_rows, (rows_per_venue,)),
+        ("rows-pool", run_rows_pool, (rows_per_venue, args.processes)),
+    ):
+        start = time.perf_counter()
+        results[name] = function(*function_args)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>9}: {elapsed:.2f}s, {total_bookings / elapsed:.0f} bookings/s, "
+            f"total reimbursed: {results[name]:.2f}"
+        )
+
+    if len(set(results.values())) != 1:
+        print("Warning: reimbursed totals differ")
+
+
+if __name__ == "__main__":
+    main()
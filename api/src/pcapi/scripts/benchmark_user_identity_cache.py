@@ -0,0 +1,99 @@
+"""Benchmark the resolution of the authenticated user on the hottest
+endpoints authenticated with a session cookie.
+
+The script creates a pro user, and sends the same requests many times
+with the Flask test client, twice:
+
+- "uncached": the session is checked before fetching the user on each
+  request, as we used to do (``USER_IDENTITY_CACHE_TTL`` is set to 0);
+- "cached": the session is found in the cache of sessions (see
+  `identity_cache`).
+
+For each endpoint, it prints the number of SQL queries per request
+(i.e. database round trips) and the time spent in these queries. It
+must only be run on a local development database, since it creates
+users.
+
+Usage:
+
+    $ python benchmark_user_identity_cache.py --requests 200
+"""
+
+import argparse
+import time
+
+import sqlalchemy
+
+from pcapi import settings
+import pcapi.core.offers.factories as offers_factories
+import pcapi.core.users.factories as users_factories
+from pcapi.flask_app import app
+from pcapi.models import db
+
+
+PRO_ENDPOINTS = ("/users/current", "/offerers/names")
+
+queries = {"count": 0, "duration": 0.0}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._benchmark_start = time.perf_counter()  # pylint: disable=protected-access
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries["count"] += 1
+    queries["duration"] += time.perf_counter() - context._benchmark_start  # pylint: disable=protected-access
+
+
+def create_data() -> str:
+    pro = offers_factories.UserOffererFactory().user
+    db.session.commit()
+    return pro.email
+
+
+def run(name: str, client, endpoint: str, requests: int) -> None:
+    client.get(endpoint)  # fill the cache, if any
+    queries.update(count=0, duration=0.0)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(endpoint)
+        if response.status_code != 200:
+            raise RuntimeError(f"Unexpected response on {endpoint}: {response.status_code} {response.json}")
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>8} {endpoint:<30}: {queries['count'] / requests:.1f} queries/request, "
+        f"{queries['duration'] * 1000 / requests:.2f} ms in queries/request, {requests / elapsed:.1f} requests/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the resolution of the authenticated user.")
+    parser.add_argument("--requests", type=int, default=200, help="number of requests per endpoint")
+    args = parser.parse_args()
+
+    if not settings.IS_DEV:
+        raise RuntimeError("This script creates data and must only be run on a development database")
+
+    sqlalchemy.event.listen(sqlalchemy.engine.Engine, "before_cursor_execute", _before_cursor_execute)
+    sqlalchemy.event.listen(sqlalchemy.engine.Engine, "after_cursor_execute", _after_cursor_execute)
+    initial_ttl = settings.USER_IDENTITY_CACHE_TTL
+    with app.app_context():
+        pro_email = create_data()
+        pro_client = app.test_client()
+        response = pro_client.post(
+            "/users/signin", json={"identifier": pro_email, "password": users_factories.DEFAULT_PASSWORD}
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Could not sign in: {response.status_code} {response.json}")
+
+        try:
+            for name, ttl in (("uncached", 0), ("cached", initial_ttl or 60)):
+                settings.USER_IDENTITY_CACHE_TTL = ttl
+                for endpoint in PRO_ENDPOINTS:
+                    run(name, pro_client, endpoint, args.requests)
+        finally:
+            settings.USER_IDENTITY_CACHE_TTL = initial_ttl
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark the computation of the wallet balances of all users.
+
+The script computes the wallet balances and writes them to a zipped
+CSV file (as sent by `send_wallet_balances`) twice:
+
+- "per-row": the `get_wallet_balance()` SQL function is called twice
+  per user, and all balances and the whole CSV are held in memory, as
+  we used to do;
+- "streamed": balances are computed with a single aggregation of all
+  bookings (see `get_all_users_wallet_balances`), and streamed to the
+  zipped CSV file by batches.
+
+With ``--users``, it first creates as many beneficiaries (with a few
+bookings each). It must then only be run on a local development
+database.
+
+Usage:
+
+    $ python benchmark_wallet_balances.py --users 1000 --batch-size 10000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from sqlalchemy import func
+
+from pcapi import settings
+import pcapi.core.bookings.factories as bookings_factories
+import pcapi.core.offers.factories as offers_factories
+import pcapi.core.users.factories as users_factories
+from pcapi.core.users.models import User
+from pcapi.domain.payments import generate_wallet_balances_csv
+from pcapi.domain.payments import iter_wallet_balances_csv
+from pcapi.flask_app import app
+from pcapi.models import db
+from pcapi.models.wallet_balance import WalletBalance
+from pcapi.repository.user_queries import get_all_users_wallet_balances
+from pcapi.utils.mailing import _get_zipfile_content
+
+
+def create_data(users: int) -> None:
+    stock = offers_factories.ThingStockFactory(price=10, quantity=None)
+    for beneficiary in users_factories.BeneficiaryGrant18Factory.create_batch(users):
+        bookings_factories.IndividualBookingFactory(individualBooking__user=beneficiary, stock=stock)
+        bookings_factories.UsedIndividualBookingFactory(individualBooking__user=beneficiary, stock=stock)
+        bookings_factories.CancelledIndividualBookingFactory(individualBooking__user=beneficiary, stock=stock)
+    db.session.commit()
+
+
+def get_per_row_zipfile_content() -> bytes:
+    balances = [
+        WalletBalance(user_id, current, real)
+        for user_id, current, real in db.session.query(
+            User.id, func.get_wallet_balance(User.id, False), func.get_wallet_balance(User.id, True)
+        )
+        .filter(User.deposits != None)  # pylint: disable=singleton-comparison
+        .order_by(User.id)
+    ]
+    return _get_zipfile_content(generate_wallet_balances_csv(balances), "balances.csv")
+
+
+def get_streamed_zipfile_content(batch_size: int) -> bytes:
+    balances = get_all_users_wallet_balances(batch_size)
+    return _get_zipfile_content(iter_wallet_balances_csv(balances, batch_size), "balances.csv")
+
+
+def run(name: str, function, *args) -> bytes:
+    tracemalloc.start()
+    start = time.perf_counter()
+    content = function(*args)
+    elapsed = time.perf_counter() - start
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.rollback()
+    print(f"{name:>8}: {elapsed:.2f}s, peak memory: {peak / 1024 / 1024:.1f} MiB, zip: {len(content)} bytes")
+    return content
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the computation of wallet balances.")
+    parser.add_argument("--users", type=int, default=0, help="number of beneficiaries to create first")
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.WALLET_BALANCES_BATCH_SIZE, help="size of streamed batches"
+    )
+    args = parser.parse_args()
+
+    if args.users and not settings.IS_DEV:
+        raise RuntimeError("This script creates data and must only be run on a development database")
+
+    with app.app_context():
+        if args.users:
+            create_data(args.users)
+        print(f"{User.query.filter(User.deposits.any()).count()} user(s) with a deposit")
+        per_row = run("per-row", get_per_row_zipfile_content)
+        streamed = run("streamed", get_streamed_zipfile_content, args.batch_size)
+        if len(per_row) != len(streamed):
+            print("Warning: zip files have different sizes, balances may differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,9 @@ from pcapi.core.bookings.api import recompute_dnBookedQuantity
 from pcapi.core.bookings.models import Booking
 from pcapi.core.bookings.models import BookingCancellationReasons
 from pcapi.core.bookings.models import BookingStatus
+from pcapi.core.bookings.models import IndividualBooking
 import pcapi.core.bookings.repository as bookings_repository
+import pcapi.core.payments.repository as payments_repository
 from pcapi.domain.user_emails import send_expired_bookings_recap_email_to_beneficiary
 from pcapi.domain.user_emails import send_expired_individual_bookings_recap_email_to_offerer
 from pcapi.models import db
@@ -114,6 +116,16 @@ def cancel_expired_bookings(query: Query, batch_size: int = 500):
             for row in db.session.query(Booking.stockId).filter(Booking.id.in_(expiring_booking_ids)).distinct().all()
         ]
         recompute_dnBookedQuantity(stocks_to_recompute)
+        # Recompute denormalized deposit spending
+        deposits_to_recompute = [
+            row[0]
+            for row in db.session.query(IndividualBooking.depositId)
+            .join(IndividualBooking.booking)
+            .filter(Booking.id.in_(expiring_booking_ids), IndividualBooking.depositId.isnot(None))
+            .distinct()
+            .all()
+        ]
+        payments_repository.recompute_deposit_spending(deposits_to_recompute)
         db.session.commit()
 
         updated_total += updated
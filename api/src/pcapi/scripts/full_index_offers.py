@@ -1,40 +1,215 @@
+from concurrent import futures
 import datetime
 import logging
-import statistics
+import multiprocessing
+import queue
 import time
 
 import click
 from flask import Blueprint
+from flask import current_app
 import pytz
-from sqlalchemy.orm import joinedload
+import sqlalchemy as sqla
 
-import pcapi.core.offerers.models as offerers_models
 import pcapi.core.offers.models as offers_models
 from pcapi.core.search.backends import algolia
 from pcapi.core.search.backends import appsearch
+from pcapi.core.search.backends import base
+from pcapi.models import db
+from pcapi.repository import offer_queries
+from pcapi.utils.db import get_keyset_batches
 
 
 BATCH_SIZE = 1_000
-REPORT_EVERY = 10_000
+REPORT_EVERY = 10  # seconds
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 5  # seconds, multiplied by the attempt number
+# One hash per run, i.e. per backend and range, with the last processed
+# id of each partition.
+REDIS_CHECKPOINTS = "full_index_offers:checkpoints:{backend_name}:{start}-{end}"
 
 logger = logging.getLogger(__name__)
 blueprint = Blueprint(__name__, __name__)
 
+# Set in each worker process by `_init_worker()`.
+_progress_queue = None
 
-def _get_eta(end, current, elapsed_per_batch):
-    left_to_do = end - current
-    eta = left_to_do / BATCH_SIZE * statistics.mean(elapsed_per_batch)
-    eta = datetime.datetime.now() + datetime.timedelta(seconds=eta)
-    eta = eta.astimezone(pytz.timezone("Europe/Paris"))
-    eta = eta.strftime("%d/%m/%Y %H:%M:%S")
-    return eta
+
+def _get_backend(backend_name: str) -> base.SearchBackend:
+    return {"algolia": algolia.AlgoliaBackend, "appsearch": appsearch.AppSearchBackend}[backend_name]()
+
+
+def _get_partitions(start: int, end: int, count: int) -> list[tuple[int, int]]:
+    """Split ``[start, end]`` into ``count`` partitions that hold
+    (roughly) the same number of active offers.
+    """
+    part = sqla.func.ntile(count).over(order_by=offers_models.Offer.id).label("part")
+    ids = (
+        db.session.query(offers_models.Offer.id.label("id"), part)
+        .filter(offers_models.Offer.isActive.is_(True), offers_models.Offer.id.between(start, end))
+        .subquery()
+    )
+    upper_bounds = [
+        upper_bound
+        for upper_bound, in db.session.query(sqla.func.max(ids.c.id)).group_by(ids.c.part).order_by(ids.c.part)
+    ]
+    partitions = []
+    lower_bound = start
+    for upper_bound in upper_bounds:
+        partitions.append((lower_bound, upper_bound))
+        lower_bound = upper_bound + 1
+    if partitions:
+        partitions[-1] = (partitions[-1][0], end)
+    return partitions
+
+
+def _get_checkpoints_key(backend_name: str, start: int, end: int) -> str:
+    return REDIS_CHECKPOINTS.format(backend_name=backend_name, start=start, end=end)
+
+
+def _get_partition_field(partition: tuple[int, int]) -> str:
+    return f"{partition[0]}-{partition[1]}"
+
+
+def _get_checkpoints(checkpoints_key: str) -> dict[tuple[int, int], int]:
+    """Return the last processed id of each partition of a previous
+    run, if any.
+    """
+    checkpoints = {}
+    for field, last_id in current_app.redis_client.hgetall(checkpoints_key).items():
+        partition_start, partition_end = field.split("-")
+        checkpoints[(int(partition_start), int(partition_end))] = int(last_id)
+    return checkpoints
+
+
+def _prepare_run(
+    backend_name: str, start: int, end: int, processes: int, restart: bool
+) -> tuple[str, dict[tuple[int, int], int]]:
+    """Return the Redis key of the checkpoints of the run on
+    ``[start, end]``, and the last processed id of each partition.
+
+    Partitions depend on the offers that are active when the script
+    is first run on this range: they are reused when resuming.
+    """
+    redis_client = current_app.redis_client
+    checkpoints_key = _get_checkpoints_key(backend_name, start, end)
+    if restart:
+        redis_client.delete(checkpoints_key)
+
+    checkpoints = _get_checkpoints(checkpoints_key)
+    if checkpoints:
+        print(f"Resuming previous run on {len(checkpoints)} partitions")
+        return checkpoints_key, checkpoints
+
+    partitions = _get_partitions(start, end, processes)
+    checkpoints = {partition: partition[0] - 1 for partition in partitions}
+    if checkpoints:
+        redis_client.hset(
+            checkpoints_key,
+            mapping={_get_partition_field(partition): last_id for partition, last_id in checkpoints.items()},
+        )
+    return checkpoints_key, checkpoints
+
+
+def _index_with_retries(backend: base.SearchBackend, offers: list[offers_models.Offer]) -> bool:
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            # Index all offers, even if they look unchanged: the
+            # search engine may have been emptied or recreated.
+            backend.index_offers(offers, force=True)
+            return True
+        except Exception as exc:  # pylint: disable=broad-except
+            if attempt == MAX_ATTEMPTS:
+                logger.exception(
+                    "Full offer reindexation: error while reindexing from %d to %d: %s",
+                    offers[0].id,
+                    offers[-1].id,
+                    exc,
+                )
+                return False
+            logger.warning(
+                "Full offer reindexation: error while reindexing from %d to %d, will retry: %s",
+                offers[0].id,
+                offers[-1].id,
+                exc,
+            )
+            time.sleep(RETRY_DELAY * attempt)
+    return False  # make pylint happy
+
+
+def _index_partition(backend_name: str, checkpoints_key: str, partition: tuple[int, int]) -> list[tuple[int, int]]:
+    """Index all eligible offers of the partition and return the
+    bounds of batches that could not be indexed.
+
+    The last processed id is stored in Redis after each batch, so
+    that an interrupted run resumes where it stopped.
+    """
+    backend = _get_backend(backend_name)
+    redis_client = current_app.redis_client
+    field = _get_partition_field(partition)
+    start, end = partition
+    last_id = int(redis_client.hget(checkpoints_key, field) or start - 1)
+    failed = []
+
+    query = offers_models.Offer.query.filter(
+        offers_models.Offer.isActive.is_(True),
+        offers_models.Offer.id <= end,
+    )
+    for offer_ids in get_keyset_batches(query, offers_models.Offer.id, BATCH_SIZE, after=last_id):
+        offers = offer_queries.get_offers_for_indexation(offer_ids)
+        to_index = [offer for offer in offers if offer.is_eligible_for_search]
+        if to_index and not _index_with_retries(backend, to_index):
+            failed.append((offer_ids[0], offer_ids[-1]))
+
+        processed = offer_ids[-1] - last_id
+        last_id = offer_ids[-1]
+        redis_client.hset(checkpoints_key, field, last_id)
+        _report_progress(processed, len(to_index))
+
+    _report_progress(end - last_id, 0)
+    return failed
+
+
+def _report_progress(processed_ids: int, indexed_offers: int) -> None:
+    if _progress_queue is not None:
+        _progress_queue.put((processed_ids, indexed_offers))
+
+
+def _init_worker(progress_queue: multiprocessing.Queue) -> None:
+    # pylint: disable=global-statement
+    global _progress_queue
+    _progress_queue = progress_queue
+
+    from pcapi.flask_app import app
+
+    # Do not share database connections with the parent process.
+    db.engine.dispose()
+    app.app_context().push()
+
+
+def _print_report(start_time: float, total_ids: int, processed_ids: int, indexed_offers: int) -> None:
+    if not total_ids:
+        return
+    elapsed = time.perf_counter() - start_time
+    speed = processed_ids / elapsed if elapsed else 0
+    if speed:
+        eta = datetime.datetime.now() + datetime.timedelta(seconds=(total_ids - processed_ids) / speed)
+        eta = eta.astimezone(pytz.timezone("Europe/Paris")).strftime("%d/%m/%Y %H:%M:%S")
+    else:
+        eta = "?"
+    print(
+        f"  => {processed_ids}/{total_ids} ids ({100 * processed_ids / total_ids:.1f}%) | "
+        f"{indexed_offers} offers indexed ({indexed_offers / elapsed if elapsed else 0:.0f}/s) | eta = {eta}"
+    )
 
 
 @blueprint.cli.command("full_index_offers")
 @click.argument("backend", required=True, type=click.Choice(("algolia", "appsearch")))
 @click.argument("start", type=int, required=True)
 @click.argument("end", type=int, required=True)
-def full_index_offers(backend, start, end):
+@click.option("--processes", help="Number of worker processes", type=int, default=4)
+@click.option("--restart", help="Ignore checkpoints of a previous run", is_flag=True, default=False)
+def full_index_offers(backend, start, end, processes, restart):
     """Reindex all bookable offers.
 
     The script iterates over all active offers. For each offer, it
@@ -44,20 +219,23 @@ def full_index_offers(backend, start, end):
     normally-run code. That way, this script skips a lot of
     unnecessary unindexation requests.
 
-    This script processes batches of 1.000 offers (note that HTTP
-    requests to App Search cannot have include more than 100 offers)
-    and reports back every 10.000 offers.
+    The ``[start, end]`` range is split into as many partitions as
+    there are worker processes (see ``--processes``). Each partition
+    is processed by batches of 1.000 offers (note that HTTP requests
+    to App Search cannot have include more than 100 offers). Failed
+    batches are automatically retried. Batches that still fail are
+    listed at the end.
 
-    Errors are logged and are not blocking. You MUST check the logs
-    for batches that failed and MUST re-run all these batches.
-
-    Obviously, the script takes a lot of time. You should run multiple
-    instances of it at the same time. 4 concurrent instances looks
-    like a good compromise.
+    The last processed id of each partition is stored in Redis, for
+    this backend and range. If the script is interrupted, run it again
+    with the same arguments and it will resume where it stopped (unless
+    ``--restart`` is given). Checkpoints are deleted once all partitions
+    are done.
+    Aggregate progress is reported every 10 seconds.
 
     Usage:
 
-        $ flask full_index_offers.py algolia 10_000_000 20_000_000
+        $ flask full_index_offers.py algolia 10_000_000 20_000_000 --processes 4
 
     Using "_" as thousands separator is supported (and encouraged for
     clarity).
@@ -65,47 +243,49 @@ def full_index_offers(backend, start, end):
     """
     if start > end:
         raise ValueError('"start" must be less than "end"')
-    backend = {"algolia": algolia.AlgoliaBackend(), "appsearch": appsearch.AppSearchBackend()}[backend]
 
-    queue = []
+    checkpoints_key, checkpoints = _prepare_run(backend, start, end, processes, restart)
+    partitions = sorted(checkpoints)
+    total_ids = partitions[-1][1] - partitions[0][0] + 1 if partitions else 0
+    processed_ids = sum(last_id - partition[0] + 1 for partition, last_id in checkpoints.items())
+    indexed_offers = 0
+    failed = []
+    # Release database connections before forking worker processes.
+    db.session.remove()
+    db.engine.dispose()
 
-    def enqueue_or_index(q, offer, force_index=False):
-        if offer:
-            q.append(offer)
-        if force_index or len(q) > BATCH_SIZE:
+    start_time = time.perf_counter()
+    last_report = start_time
+    progress_queue = multiprocessing.Queue()
+    with futures.ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=(progress_queue,)
+    ) as executor:
+        pending = {executor.submit(_index_partition, backend, checkpoints_key, partition) for partition in partitions}
+        while pending:
             try:
-                backend.index_offers(q)
-            except Exception as exc:  # pylint: disable=broad-except
-                logger.exception(
-                    "Full offer reindexation: error while reindexing from %d to %d: %s", q[0].id, q[-1].id, exc
-                )
-            q.clear()
+                processed, indexed = progress_queue.get(timeout=1)
+                processed_ids += processed
+                indexed_offers += indexed
+            except queue.Empty:
+                pass
+            for future in [future for future in pending if future.done()]:
+                pending.remove(future)
+                failed.extend(future.result())
+            if time.perf_counter() - last_report >= REPORT_EVERY:
+                last_report = time.perf_counter()
+                _print_report(start_time, total_ids, processed_ids, indexed_offers)
 
-    to_report = 0
-    elapsed_per_batch = []
+    while not progress_queue.empty():
+        processed, indexed = progress_queue.get()
+        processed_ids += processed
+        indexed_offers += indexed
+    _print_report(start_time, total_ids, processed_ids, indexed_offers)
 
-    while start <= end:
-        start_time = time.perf_counter()
-        offers = (
-            offers_models.Offer.query.options(
-                joinedload(offers_models.Offer.venue).joinedload(offerers_models.Venue.managingOfferer)
-            )
-            .options(joinedload(offers_models.Offer.criteria))
-            .options(joinedload(offers_models.Offer.mediations))
-            .options(joinedload(offers_models.Offer.product))
-            .options(joinedload(offers_models.Offer.stocks))
-            .filter(offers_models.Offer.isActive.is_(True), offers_models.Offer.id.between(start, start + BATCH_SIZE))
-            .order_by(offers_models.Offer.id)
-        )
-        for offer in offers:
-            if offer.is_eligible_for_search:
-                enqueue_or_index(queue, offer)
-        elapsed_per_batch.append(int(time.perf_counter() - start_time))
-        start = start + BATCH_SIZE
-        eta = _get_eta(end, start, elapsed_per_batch)
-        to_report += BATCH_SIZE
-        if to_report >= REPORT_EVERY:
-            to_report = 0
-            print(f"  => OK: {start} | eta = {eta}")
-    enqueue_or_index(queue, offer=None, force_index=True)
+    # All partitions are done: failed batches are not resumed but run
+    # again on their own range.
+    current_app.redis_client.delete(checkpoints_key)
+    if failed:
+        print("Some batches could not be indexed, run the script again on the following ranges:")
+        for batch_start, batch_end in sorted(failed):
+            print(f"  {batch_start} {batch_end}")
     print("Done")
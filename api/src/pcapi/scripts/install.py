@@ -13,8 +13,10 @@ def install_commands(app):
         "pcapi.scripts.offerer.commands",
         "pcapi.scripts.payment.banishment_command",
         "pcapi.scripts.payment.generate_payments",
+        "pcapi.scripts.payment.recompute_deposit_spending",
         "pcapi.scripts.provider.check_provider_api",
         "pcapi.scripts.sandbox",
+        "pcapi.scripts.stock.import_activation_codes",
         "pcapi.scripts.update_providables",
         "pcapi.workers.worker",
     )
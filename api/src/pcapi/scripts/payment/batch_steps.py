@@ -1,6 +1,8 @@
+from concurrent import futures
 from datetime import datetime
 import hashlib
 import logging
+import multiprocessing
 import pathlib
 import tempfile
 from typing import Iterable
@@ -8,6 +10,7 @@ from typing import Optional
 
 from sqlalchemy.sql.functions import coalesce
 
+from pcapi import settings
 from pcapi.core.bookings.models import Booking
 import pcapi.core.bookings.repository as booking_repository
 from pcapi.core.offerers.models import Venue
@@ -16,17 +19,15 @@ from pcapi.domain.admin_emails import send_payment_details_email
 from pcapi.domain.admin_emails import send_payment_message_email
 from pcapi.domain.admin_emails import send_payments_report_emails
 from pcapi.domain.admin_emails import send_wallet_balances_email
-from pcapi.domain.payments import create_payment_for_booking
-from pcapi.domain.payments import filter_out_already_paid_for_bookings
-from pcapi.domain.payments import filter_out_bookings_without_cost
+from pcapi.domain.payments import create_payment_row_for_booking_row
 from pcapi.domain.payments import generate_message_file
 from pcapi.domain.payments import generate_payment_details_csv
 from pcapi.domain.payments import generate_venues_csv
-from pcapi.domain.payments import generate_wallet_balances_csv
+from pcapi.domain.payments import iter_wallet_balances_csv
 from pcapi.domain.payments import make_transaction_label
 from pcapi.domain.payments import validate_message_file_structure
 from pcapi.domain.reimbursement import CustomRuleFinder
-from pcapi.domain.reimbursement import find_all_booking_reimbursements
+from pcapi.domain.reimbursement import find_all_booking_row_reimbursements
 from pcapi.models.db import db
 from pcapi.models.payment import Payment
 from pcapi.models.payment_message import PaymentMessage
@@ -39,6 +40,9 @@ from pcapi.utils.mailing import MailServiceException
 
 logger = logging.getLogger(__name__)
 
+# Set in each worker process of `generate_new_payments()` by `_init_payments_worker()`.
+_custom_rule_finder = None
+
 
 def include_error_and_retry_payments_in_batch(batch_date: datetime):
     statuses = [TransactionStatus.RETRY, TransactionStatus.ERROR]
@@ -69,44 +73,98 @@ def get_venues_to_reimburse(cutoff_date: datetime) -> Iterable[tuple[id, str]]:
     # fmt: on
 
 
-def generate_new_payments(cutoff_date: datetime, batch_date: datetime) -> None:
-    n_payments = 0
+def _init_payments_worker() -> None:
+    # pylint: disable=global-statement
+    global _custom_rule_finder
+
+    from pcapi.flask_app import app
+
+    app.app_context().push()
+    _custom_rule_finder = CustomRuleFinder()
+
+
+def _generate_payments_for_venue_in_worker(
+    venue_id: int, venue_name: str, cutoff_date: datetime, batch_date: datetime
+) -> int:
+    return _generate_payments_for_venue(venue_id, venue_name, cutoff_date, batch_date, _custom_rule_finder)
+
+
+def _generate_payments_for_venue(
+    venue_id: int,
+    venue_name: str,
+    cutoff_date: datetime,
+    batch_date: datetime,
+    custom_rule_finder: CustomRuleFinder,
+) -> int:
+    logger.info("[BATCH][PAYMENTS] Fetching bookings for venue: %s", venue_name, extra={"venue": venue_id})
+    rows = booking_repository.find_booking_rows_eligible_for_payment_for_venue(venue_id, cutoff_date)
+    logger.info("[BATCH][PAYMENTS] Calculating reimbursements for venue: %s", venue_name, extra={"venue": venue_id})
+    reimbursements = find_all_booking_row_reimbursements(rows, custom_rule_finder)
+    transaction_label = make_transaction_label(datetime.utcnow())
+    payment_rows = [
+        create_payment_row_for_booking_row(reimbursement, batch_date, transaction_label)
+        for reimbursement in reimbursements
+        if reimbursement.reimbursed_amount > 0 and reimbursement.row.paymentId is None
+    ]
+    if not payment_rows:
+        logger.info("[BATCH][PAYMENTS] No payments generated for venue: %s", venue_name, extra={"venue": venue_id})
+        return 0
+
+    logger.info(
+        "[BATCH][PAYMENTS] Inserting payments for venue: %s",
+        venue_name,
+        extra={"venue": venue_id, "payments": len(payment_rows)},
+    )
+    payments_api.copy_payments(payment_rows)
+    db.session.commit()
+
+    logger.info(
+        "[BATCH][PAYMENTS] Saved %i payments for venue: %s",
+        len(payment_rows),
+        venue_name,
+        extra={"venue": venue_id, "payments": len(payment_rows)},
+    )
+    return len(payment_rows)
+
+
+def generate_new_payments(
+    cutoff_date: datetime, batch_date: datetime, processes: int = settings.PAYMENTS_GENERATION_PROCESSES
+) -> None:
+    """Create payments for all used bookings that have not been paid yet.
+
+    Bookings are fetched as plain rows and payments are inserted with
+    COPY. Venues are independent (the cumulative revenue that
+    reimbursement rules depend on is computed per venue), so they are
+    spread across ``processes`` worker processes if there are more
+    than one.
+    """
     logger.info("Fetching venues to reimburse")
     venues_to_reimburse = get_venues_to_reimburse(cutoff_date)
     logger.info("Found %d venues to reimburse", len(venues_to_reimburse))
-    custom_rule_finder = CustomRuleFinder()
     n_payments = 0
-    for venue_id, venue_name in venues_to_reimburse:
-        logger.info("[BATCH][PAYMENTS] Fetching bookings for venue: %s", venue_name, extra={"venue": venue_id})
-        bookings = booking_repository.find_bookings_eligible_for_payment_for_venue(venue_id, cutoff_date)
-        logger.info("[BATCH][PAYMENTS] Calculating reimbursements for venue: %s", venue_name, extra={"venue": venue_id})
-        reimbursements = find_all_booking_reimbursements(bookings, custom_rule_finder)
-        to_pay = filter_out_already_paid_for_bookings(filter_out_bookings_without_cost(reimbursements))
-        if not to_pay:
-            logger.info("[BATCH][PAYMENTS] No payments generated for venue: %s", venue_name, extra={"venue": venue_id})
-            continue
-        n_payments += len(to_pay)
-
-        logger.info(
-            "[BATCH][PAYMENTS] Creating Payment objects for venue: %s",
-            venue_name,
-            extra={"venue": venue_id, "payments": len(to_pay)},
-        )
-        payments = [create_payment_for_booking(reimbursement, batch_date) for reimbursement in to_pay]
-        logger.info(
-            "[BATCH][PAYMENTS] Inserting Payment objects for venue: %s",
-            venue_name,
-            extra={"venue": venue_id, "payments": len(to_pay)},
-        )
-        db.session.bulk_save_objects(payments)
-        db.session.commit()
-
-        logger.info(
-            "[BATCH][PAYMENTS] Saved %i payments for venue: %s",
-            len(payments),
-            venue_name,
-            extra={"venue": venue_id, "payments": len(payments)},
-        )
+    if processes > 1 and len(venues_to_reimburse) > 1:
+        # Workers are spawned rather than forked, so that they do not
+        # inherit the database connections, Redis client and locks of
+        # this process: each one sets up its own app in
+        # `_init_payments_worker()`. End our transaction while they run.
+        db.session.remove()
+        with futures.ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_payments_worker,
+        ) as executor:
+            jobs = [
+                executor.submit(_generate_payments_for_venue_in_worker, venue_id, venue_name, cutoff_date, batch_date)
+                for venue_id, venue_name in venues_to_reimburse
+            ]
+            for job in futures.as_completed(jobs):
+                n_payments += job.result()
+    else:
+        custom_rule_finder = CustomRuleFinder()
+        for venue_id, venue_name in venues_to_reimburse:
+            n_payments += _generate_payments_for_venue(
+                venue_id, venue_name, cutoff_date, batch_date, custom_rule_finder
+            )
 
     # Create all payment statuses. We get payments created above by
     # looking at their batch date.
@@ -218,12 +276,14 @@ def send_wallet_balances(recipients: list[str]) -> None:
     if not recipients:
         raise Exception("[BATCH][PAYMENTS] Missing PASS_CULTURE_WALLET_BALANCES_RECIPIENTS in environment variables")
 
+    # Balances are streamed from the database to the zipped CSV
+    # attachment, they are never all held in memory.
     balances = get_all_users_wallet_balances()
-    csv = generate_wallet_balances_csv(balances)
-    logger.info("[BATCH][PAYMENTS] Sending %s wallet balances", len(balances))
+    csv_chunks = iter_wallet_balances_csv(balances)
+    logger.info("[BATCH][PAYMENTS] Sending wallet balances")
     logger.info("[BATCH][PAYMENTS] Recipients of email: %s", recipients)
     try:
-        send_wallet_balances_email(csv, recipients)
+        send_wallet_balances_email(csv_chunks, recipients)
     except MailServiceException as exception:
         logger.exception("[BATCH][PAYMENTS] Error while sending users wallet balances email to MailJet: %s", exception)
 
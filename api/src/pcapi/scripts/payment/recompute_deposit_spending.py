@@ -0,0 +1,37 @@
+import logging
+
+import click
+from flask import Blueprint
+
+from pcapi.core.payments import repository as payments_repository
+from pcapi.core.payments.models import Deposit
+from pcapi.models import db
+
+
+blueprint = Blueprint(__name__, __name__)
+logger = logging.getLogger(__name__)
+
+
+@blueprint.cli.command("recompute_deposit_spending")
+@click.option("--batch-size", type=int, default=1000, help="Number of deposits updated in each transaction")
+def recompute_deposit_spending(batch_size: int):
+    """Recompute the denormalized spending of all deposits.
+
+    Must be run once the columns have been added, before the
+    USE_DENORMALIZED_DEPOSIT_SPENDING feature flag is activated.
+    """
+    last_id = 0
+    while True:
+        deposit_ids = [
+            deposit_id
+            for deposit_id, in Deposit.query.with_entities(Deposit.id)
+            .filter(Deposit.id > last_id)
+            .order_by(Deposit.id)
+            .limit(batch_size)
+        ]
+        if not deposit_ids:
+            break
+        payments_repository.recompute_deposit_spending(deposit_ids)
+        db.session.commit()
+        last_id = deposit_ids[-1]
+        logger.info("Recomputed spending of deposits", extra={"last_deposit": last_id})
@@ -0,0 +1,41 @@
+import datetime
+from typing import Optional
+
+import click
+from flask import Blueprint
+
+from pcapi.core.offers import api as offers_api
+from pcapi.core.offers.models import Stock
+from pcapi.models.api_errors import ApiErrors
+
+
+blueprint = Blueprint(__name__, __name__)
+
+
+@blueprint.cli.command("import_activation_codes")
+@click.option("--stock-id", type=int, required=True, help="Id of the stock")
+@click.option(
+    "--expiration-datetime",
+    type=click.DateTime(),
+    default=None,
+    help="Expiration date (UTC) of the codes",
+)
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_activation_codes(stock_id: int, expiration_datetime: Optional[datetime.datetime], path: str) -> None:
+    """Import activation codes of a stock from a file, with one code per
+    line. Blank lines are ignored. Rejected codes are printed.
+    """
+    stock = Stock.query.get(stock_id)
+    if not stock:
+        raise click.ClickException(f"Stock {stock_id} does not exist")
+
+    with open(path, encoding="utf-8") as codes_file:
+        codes = (line for line in codes_file if line.strip())
+        try:
+            report = offers_api.import_activation_codes(stock, codes, expiration_datetime)
+        except ApiErrors as errors:
+            raise click.ClickException(str(errors.errors))
+
+    for code, reason in report.rejected.items():
+        click.echo(f"Rejected ({reason.value}): {code}")
+    click.echo(f"{report.inserted} code(s) imported, {len(report.rejected)} rejected")
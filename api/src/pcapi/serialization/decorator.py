@@ -1,5 +1,6 @@
 from functools import wraps
 import logging
+from types import GeneratorType
 from typing import Any
 from typing import Callable
 from typing import Iterable
@@ -9,6 +10,7 @@ from typing import Type
 from flask import Response
 from flask import make_response
 from flask import request
+from flask import stream_with_context
 import pydantic
 from pydantic import BaseModel
 from spectree.spec import SpecTree
@@ -52,6 +54,11 @@ def _make_string_response(content: Optional[BaseModel], status_code: int, header
     if not content:
         raise ApiErrors({"configuration": "You need to provide a response body model if the status code is not 204"})
 
+    if isinstance(content, GeneratorType):
+        # Stream the response. The request context (and thus the
+        # database session) is kept until the whole content is sent.
+        return Response(stream_with_context(content), status_code, headers or {})
+
     response = make_response(content, status_code, headers or {})
     return response
 
@@ -154,6 +161,9 @@ def spectree_serialize(
                     raise ApiErrors(error_dict)
 
             result = route(*args, **kwargs)
+            if isinstance(result, Response):
+                # The route has built its own response (e.g. from a cache).
+                return result
             if json_format:
                 return _make_json_response(
                     content=result,
@@ -116,9 +116,19 @@ SENTRY_DSN = os.environ.get("SENTRY_DSN", "https://0470142cf8d44893be88ecded2a14
 SENTRY_SAMPLE_RATE = float(os.environ.get("SENTRY_SAMPLE_RATE", 0))
 
 
+# FEATURE FLAGS
+# Feature flags are kept in memory by each process (see `pcapi.models.feature`), 0 disables it.
+FEATURES_SNAPSHOT_TTL = int(os.environ.get("FEATURES_SNAPSHOT_TTL", 30))
+
+
 # USERS
 MAX_FAVORITES = int(os.environ.get("MAX_FAVORITES", 100))  # 0 is unlimited
 MAX_API_KEY_PER_OFFERER = int(os.environ.get("MAX_API_KEY_PER_OFFERER", 5))
+API_KEY_CACHE_TTL = int(os.environ.get("API_KEY_CACHE_TTL", 60))
+
+
+# OFFERS
+ACTIVATION_CODES_CHUNK_SIZE = int(os.environ.get("ACTIVATION_CODES_CHUNK_SIZE", 10_000))
 
 
 # MAIL
@@ -147,6 +157,15 @@ MAX_PHONE_VALIDATION_ATTEMPTS = int(os.environ.get("MAX_PHONE_VALIDATION_ATTEMPT
 SENT_SMS_COUNTER_TTL = int(os.environ.get("SENT_SMS_COUNTER_TTL", 12 * 60 * 60))
 PHONE_VALIDATION_ATTEMPTS_TTL = int(os.environ.get("PHONE_VALIDATION_ATTEMPTS_TTL", 30 * 24 * 60 * 60))
 
+# PROVIDERS
+# Thumbs are standardized in worker processes and uploaded by threads.
+PROVIDERS_THUMB_PROCESSES = int(os.environ.get("PROVIDERS_THUMB_PROCESSES", 2))
+PROVIDERS_THUMB_UPLOAD_THREADS = int(os.environ.get("PROVIDERS_THUMB_UPLOAD_THREADS", 4))
+PROVIDERS_THUMB_MAX_PENDING = int(os.environ.get("PROVIDERS_THUMB_MAX_PENDING", 20))
+
+# PRO HOMEPAGE
+VENUES_STATS_CACHE_TTL = int(os.environ.get("VENUES_STATS_CACHE_TTL", 60))
+
 # ALGOLIA
 ALGOLIA_API_KEY = os.environ.get("ALGOLIA_API_KEY", "dummy-key")
 ALGOLIA_APPLICATION_ID = os.environ.get("ALGOLIA_APPLICATION_ID", "dummy-app-id")
@@ -202,11 +221,16 @@ MAILJET_HTTP_TIMEOUT = int(os.environ.get("MAILJET_HTTP_TIMEOUT", 5))
 # JWT
 JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
 
+# Sessions of authenticated users (see `pcapi.core.users.identity_cache`)
+USER_IDENTITY_CACHE_TTL = int(os.environ.get("USER_IDENTITY_CACHE_TTL", 60))
+
 
 # TITELIVE
 TITELIVE_FTP_URI = os.environ.get("FTP_TITELIVE_URI")
 TITELIVE_FTP_USER = os.environ.get("FTP_TITELIVE_USER")
 TITELIVE_FTP_PWD = os.environ.get("FTP_TITELIVE_PWD")
+# Archives bigger than that (in bytes) are downloaded to a temporary file.
+TITELIVE_FTP_SPOOL_MAX_SIZE = int(os.environ.get("TITELIVE_FTP_SPOOL_MAX_SIZE", 10 * 1024 * 1024))
 
 
 # JOUVE
@@ -226,6 +250,7 @@ ALLOCINE_API_KEY = os.environ.get("ALLOCINE_API_KEY")
 FNAC_API_TOKEN = os.environ.get("PROVIDER_FNAC_BASIC_AUTHENTICATION_TOKEN")
 FNAC_API_URL = "https://passculture-fr.ws.fnac.com/api/v1/pass-culture/stocks"
 PROVIDERS_SYNC_WORKERS_POOL_SIZE = int(os.environ.get("SYNC_WORKERS_POOL_SIZE", 5))
+PROVIDERS_SYNC_MAX_WORKERS_PER_PROVIDER = int(os.environ.get("SYNC_MAX_WORKERS_PER_PROVIDER", 2))
 
 
 # DEMARCHES SIMPLIFIEES
@@ -267,6 +292,8 @@ PASS_CULTURE_IBAN = os.environ.get("PASS_CULTURE_IBAN")
 PASS_CULTURE_BIC = os.environ.get("PASS_CULTURE_BIC")
 PASS_CULTURE_REMITTANCE_CODE = os.environ.get("PASS_CULTURE_REMITTANCE_CODE")
 PAYMENTS_CSV_DETAILS_BATCH_SIZE = os.environ.get("PAYMENTS_CSV_DETAILS_BATCH_SIZE", 10_000)
+WALLET_BALANCES_BATCH_SIZE = int(os.environ.get("WALLET_BALANCES_BATCH_SIZE", 10_000))
+PAYMENTS_GENERATION_PROCESSES = int(os.environ.get("PAYMENTS_GENERATION_PROCESSES", 1))
 
 # GOOGLE
 GOOGLE_KEY = os.environ.get("PC_GOOGLE_KEY_64")
@@ -317,6 +344,8 @@ APPS_FLYER_IOS_API_KEY = os.environ.get("APPS_FLYER_IOS_API_KEY", "")
 SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", _default_search_backend)
 APPSEARCH_API_KEY = os.environ.get("APPSEARCH_API_KEY", "")
 APPSEARCH_HOST = os.environ.get("APPSEARCH_HOST", "")
+APPSEARCH_MAX_CONCURRENT_REQUESTS = int(os.environ.get("APPSEARCH_MAX_CONCURRENT_REQUESTS", 4))
+APPSEARCH_DOCUMENT_HASHES_TTL = int(os.environ.get("APPSEARCH_DOCUMENT_HASHES_TTL", 7 * 24 * 60 * 60))  # seconds
 
 # ADAGE
 ADAGE_API_KEY = os.environ.get("ADAGE_API_KEY", None)
@@ -0,0 +1,11 @@
+from io import StringIO
+
+
+def pop_csv_output(output: StringIO, encoding: str = "utf-8") -> bytes:
+    """Return what has been written to ``output`` as encoded bytes, and
+    empty it, so that a CSV file can be written (and sent) by chunks.
+    """
+    data = output.getvalue()
+    output.seek(0)
+    output.truncate()
+    return data.encode(encoding)
@@ -30,6 +30,40 @@ def get_batches(query, key, batch_size):
         yield query.filter(key.between(start, end))
 
 
+def get_keyset_batches(
+    query, key, batch_size: int, after: typing.Optional[typing.Any] = None, offset: int = 0
+) -> typing.Iterator[list]:
+    """Yield the values of ``key`` (usually a primary key) of the rows
+    of the requested query, by batches of ``batch_size``, in ascending
+    order.
+
+    Each batch starts right after the last key of the previous batch
+    (``WHERE key > :last ORDER BY key LIMIT :batch_size``). Unlike
+    ``OFFSET``, that uses the index on ``key`` and costs the same for
+    the first and the last batch. Rows that are added or removed while
+    iterating do not shift the next batches either.
+
+    Iteration starts after ``after`` if given. ``offset`` skips that
+    many rows first, with a single ``OFFSET`` query.
+    """
+    query = query.with_entities(key).order_by(None).order_by(key)
+    if after is not None:
+        query = query.filter(key > after)
+    if offset:
+        after = query.offset(offset - 1).limit(1).scalar()
+        if after is None:
+            return
+    while True:
+        batch_query = query if after is None else query.filter(key > after)
+        keys = [value for value, in batch_query.limit(batch_size)]
+        if not keys:
+            return
+        yield keys
+        if len(keys) < batch_size:
+            return
+        after = keys[-1]
+
+
 class MagicEnum(sqla_types.TypeDecorator):
     """A column type that stores an instance of a Python Enum object as a
     string or integer (depending on the type of the enum).
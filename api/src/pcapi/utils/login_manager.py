@@ -7,10 +7,10 @@ from flask import jsonify
 from flask import request
 from flask import session
 
+from pcapi.core.users import identity_cache
 from pcapi.core.users.models import User
 from pcapi.models.api_errors import ApiErrors
 from pcapi.repository.user_session_queries import delete_user_session
-from pcapi.repository.user_session_queries import existing_user_session
 from pcapi.repository.user_session_queries import register_user_session
 
 
@@ -33,7 +33,7 @@ def get_request_authorization():
 def get_user_with_id(user_id):
     session.permanent = True
     session_uuid = session.get("session_uuid")
-    if existing_user_session(user_id, session_uuid):
+    if identity_cache.user_session_exists(user_id, session_uuid):
         return User.query.get(user_id)
     return None
 
@@ -57,3 +57,4 @@ def discard_session():
     user_id = session.get("user_id")
     session.clear()
     delete_user_session(user_id, session_uuid)
+    identity_cache.forget_sessions(user_id, [session_uuid])
@@ -2,6 +2,8 @@ import base64
 from datetime import datetime
 import io
 from pprint import pformat
+from typing import Iterable
+from typing import Union
 import zipfile
 
 from flask import render_template
@@ -163,13 +165,21 @@ def make_payment_message_email(xml: str, venues_csv, checksum: bytes) -> dict:
     }
 
 
-def _get_zipfile_content(content: str, filename: str):
+def _get_zipfile_content(content: Union[str, Iterable[str]], filename: str):
     """Return the content of a ZIP fie that would include a single file
     with the requested content and filename.
+
+    The content may be given as an iterable of chunks, which are then
+    compressed one after the other.
     """
     stream = io.BytesIO()
     with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
-        zf.writestr(filename, content)
+        if isinstance(content, str):
+            zf.writestr(filename, content)
+        else:
+            with zf.open(filename, mode="w") as zipped_file:
+                for chunk in content:
+                    zipped_file.write(chunk.encode("utf-8"))
     stream.seek(0)
     return stream.read()
 
@@ -218,7 +228,7 @@ def make_payments_report_email(not_processable_csv: str, n_payments_by_status: d
     }
 
 
-def make_wallet_balances_email(csv: str) -> dict:
+def make_wallet_balances_email(csv: Union[str, Iterable[str]]) -> dict:
     now = datetime.utcnow()
     csv_filename = "soldes_des_utilisateurs_{}.csv".format(now.strftime("%Y%m%d"))
     zipfile_content = _get_zipfile_content(csv, csv_filename)
@@ -0,0 +1,9 @@
+from pcapi.workers import worker
+from pcapi.workers.decorators import job
+
+
+@job(worker.default_queue)
+def process_booking_outbox_job() -> None:
+    from pcapi.core.bookings.api import process_booking_outbox  # avoid import loop
+
+    process_booking_outbox()
@@ -0,0 +1,96 @@
+import ftplib
+import io
+from unittest.mock import MagicMock
+from unittest.mock import patch
+import zipfile
+
+import pytest
+
+from pcapi.connectors import ftp_titelive
+from pcapi.core.testing import override_settings
+
+
+@pytest.fixture(name="ftp")
+def ftp_fixture():
+    with override_settings(TITELIVE_FTP_USER="user", TITELIVE_FTP_PWD="password"):
+        with patch("pcapi.connectors.ftp_titelive.get_titelive_ftp") as get_titelive_ftp:
+            yield get_titelive_ftp
+    ftp_titelive.close_titelive_ftp()
+
+
+class ConnectToTiteliveFtpTest:
+    def test_reuse_connection(self, ftp):
+        connection1 = ftp_titelive.connect_to_titelive_ftp()
+        connection2 = ftp_titelive.connect_to_titelive_ftp()
+
+        assert connection1 is connection2
+        assert ftp.call_count == 1
+        connection1.login.assert_called_once_with("user", "password")
+
+    def test_reconnect_when_connection_is_lost(self, ftp):
+        ftp.side_effect = [MagicMock(), MagicMock()]
+        connection1 = ftp_titelive.connect_to_titelive_ftp()
+        connection1.voidcmd.side_effect = EOFError()
+
+        connection2 = ftp_titelive.connect_to_titelive_ftp()
+
+        assert connection2 is not connection1
+        connection1.quit.assert_called_once()
+        connection2.login.assert_called_once_with("user", "password")
+
+    def test_reconnect_after_close(self, ftp):
+        ftp_titelive.connect_to_titelive_ftp()
+        ftp_titelive.close_titelive_ftp()
+        ftp_titelive.connect_to_titelive_ftp()
+
+        assert ftp.call_count == 2
+
+
+class GetZipFileFromFtpTest:
+    @override_settings(TITELIVE_FTP_SPOOL_MAX_SIZE=10)
+    def test_spool_archive_to_disk(self, ftp):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zip_file:
+            zip_file.writestr("9782016261903_1_75.jpg", b"fake image")
+
+        def retrbinary(command, callback):
+            assert command == "RETR Atoo/livres_tl20210101.zip"
+            for chunk in (archive.getvalue()[:20], archive.getvalue()[20:]):
+                callback(chunk)
+
+        ftp.return_value.retrbinary.side_effect = retrbinary
+
+        zip_file = ftp_titelive.get_zip_file_from_ftp("livres_tl20210101.zip", "Atoo")
+
+        assert zip_file.filename == "livres_tl20210101.zip"
+        assert zip_file.namelist() == ["9782016261903_1_75.jpg"]
+        assert zip_file.read("9782016261903_1_75.jpg") == b"fake image"
+        assert zip_file.fp._rolled  # pylint: disable=protected-access
+
+
+class StreamLinesFromFtpTest:
+    def test_stream_lines(self, ftp):
+        connection = ftp.return_value
+        data_connection = connection.transfercmd.return_value.__enter__.return_value
+        data_connection.makefile.return_value.__enter__.return_value = io.StringIO("line 1\nline 2\n")
+
+        lines = ftp_titelive.stream_lines_from_ftp("Quotidien30.tit", "livre3_11", encoding="iso-8859-1")
+
+        assert list(lines) == ["line 1\n", "line 2\n"]
+        connection.transfercmd.assert_called_once_with("RETR livre3_11/Quotidien30.tit")
+        data_connection.makefile.assert_called_once_with("r", encoding="iso-8859-1")
+        connection.voidresp.assert_called_once()
+
+    def test_reset_connection_when_interrupted(self, ftp):
+        connection = ftp.return_value
+        data_connection = connection.transfercmd.return_value.__enter__.return_value
+        data_connection.makefile.return_value.__enter__.return_value = io.StringIO("line 1\nline 2\n")
+        connection.voidresp.side_effect = ftplib.error_temp("426 Connection closed; transfer aborted.")
+
+        lines = ftp_titelive.stream_lines_from_ftp("Quotidien30.tit", "livre3_11", encoding="iso-8859-1")
+        assert next(lines) == "line 1\n"
+        lines.close()
+
+        connection.quit.assert_called_once()
+        ftp_titelive.connect_to_titelive_ftp()
+        assert ftp.call_count == 2
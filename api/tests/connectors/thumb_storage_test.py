@@ -0,0 +1,49 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from pcapi.connectors.thumb_storage import ThumbPool
+import pcapi.sandboxes
+
+
+IMAGE_PATH = Path(pcapi.sandboxes.__path__[0]) / "providers" / "titelive_mocks" / "provider_thumb.jpeg"
+
+
+class ThumbPoolTest:
+    @pytest.mark.parametrize("processes", [0, 1])
+    @patch("pcapi.core.object_storage.store_public_object")
+    def test_store_standardized_image_under_each_id(self, mocked_store_public_object, processes):
+        with ThumbPool(processes=processes, threads=2, max_pending=2) as pool:
+            pool.submit(IMAGE_PATH.read_bytes(), ["products/AE", "products/AE_1"], context="product")
+            results = pool.collect()
+
+        assert results == [("product", None)]
+        stored_ids = {call.kwargs["object_id"] for call in mocked_store_public_object.call_args_list}
+        assert stored_ids == {"products/AE", "products/AE_1"}
+        for call in mocked_store_public_object.call_args_list:
+            assert call.kwargs["content_type"] == "image/jpeg"
+            assert call.kwargs["blob"].startswith(b"\xff\xd8")  # JPEG
+
+    @patch("pcapi.core.object_storage.store_public_object")
+    def test_report_errors(self, mocked_store_public_object):
+        mocked_store_public_object.side_effect = [None, ValueError("Storage is down")]
+
+        with ThumbPool(processes=0, threads=1, max_pending=10) as pool:
+            pool.submit(IMAGE_PATH.read_bytes(), ["products/AE"], context=1)
+            pool.submit(IMAGE_PATH.read_bytes(), ["products/A9"], context=2)
+            results = dict(pool.collect())
+
+        assert results[1] is None
+        assert isinstance(results[2], ValueError)
+
+    @patch("pcapi.core.object_storage.store_public_object")
+    def test_limit_pending_thumbs(self, mocked_store_public_object):
+        with ThumbPool(processes=0, threads=2, max_pending=1) as pool:
+            for i in range(3):
+                pool.submit(IMAGE_PATH.read_bytes(), [f"products/{i}"], context=i)
+                assert len(pool.pending) <= 1
+            results = pool.collect()
+
+        assert sorted(context for context, _ in results) == [0, 1, 2]
+        assert mocked_store_public_object.call_count == 3
@@ -1,10 +1,13 @@
+from concurrent import futures
 from datetime import datetime
 from datetime import timedelta
+import time
 from unittest import mock
 
 from dateutil.relativedelta import relativedelta
 from freezegun import freeze_time
 import pytest
+import redis
 from sqlalchemy import create_engine
 import sqlalchemy.exc
 from sqlalchemy.sql import text
@@ -13,6 +16,7 @@ from pcapi.core.bookings import api
 from pcapi.core.bookings import exceptions
 from pcapi.core.bookings import factories as booking_factories
 from pcapi.core.bookings import models
+from pcapi.core.bookings import validation
 from pcapi.core.bookings.models import Booking
 from pcapi.core.bookings.models import BookingCancellationReasons
 from pcapi.core.bookings.models import BookingStatus
@@ -26,6 +30,7 @@ from pcapi.core.testing import assert_num_queries
 from pcapi.core.testing import override_features
 from pcapi.core.users.external.batch import BATCH_DATETIME_FORMAT
 import pcapi.core.users.factories as users_factories
+from pcapi.core.users.models import User
 from pcapi.models import api_errors
 from pcapi.models.db import db
 import pcapi.notifications.push.testing as push_testing
@@ -34,6 +39,35 @@ from pcapi.utils.token import random_token
 from tests.conftest import clean_database
 
 
+def _book_concurrently(app, user_ids: list[int], stock_id: int) -> list[str]:
+    """Book the stock for each user, from as many threads, with the
+    atomic reservation. The checks are slowed down so that bookings
+    overlap, and must be serialized by locks to be correct.
+    """
+    check_expenses_limits = validation.check_expenses_limits
+
+    def slow_check_expenses_limits(*args, **kwargs):
+        time.sleep(0.1)
+        check_expenses_limits(*args, **kwargs)
+
+    def book(user_id):
+        with app.app_context():
+            try:
+                beneficiary = User.query.get(user_id)
+                api._book_offer_with_atomic_reservation(beneficiary, stock_id, 1)
+                return "booked"
+            except exceptions.OfferIsAlreadyBooked:
+                return "already booked"
+            except exceptions.StockIsNotBookable:
+                return "sold out"
+            finally:
+                db.session.remove()
+
+    with mock.patch("pcapi.core.bookings.validation.check_expenses_limits", slow_check_expenses_limits):
+        with futures.ThreadPoolExecutor(max_workers=len(user_ids)) as executor:
+            return list(executor.map(book, user_ids))
+
+
 class BookOfferConcurrencyTest:
     @clean_database
     def test_create_booking(self, app):
@@ -52,6 +86,49 @@ class BookOfferConcurrencyTest:
         assert models.Booking.query.count() == 0
         assert offers_models.Stock.query.filter_by(id=stock.id, dnBookedQuantity=5).count() == 1
 
+    @clean_database
+    def test_create_booking_with_atomic_reservation_locks_beneficiary(self, app):
+        beneficiary = users_factories.BeneficiaryGrant18Factory()
+        stock = offers_factories.StockFactory(price=10, dnBookedQuantity=5)
+
+        # open a second connection on purpose and lock the beneficiary
+        engine = create_engine(app.config["SQLALCHEMY_DATABASE_URI"])
+        with engine.connect() as connection:
+            connection.execute(
+                text("""SELECT * FROM "user" WHERE "user".id = :user_id FOR UPDATE"""), user_id=beneficiary.id
+            )
+
+            with pytest.raises(sqlalchemy.exc.OperationalError):
+                api._book_offer_with_atomic_reservation(beneficiary, stock.id, 1)
+
+        assert models.Booking.query.count() == 0
+        assert offers_models.Stock.query.filter_by(id=stock.id, dnBookedQuantity=5).count() == 1
+
+    @clean_database
+    def test_concurrent_double_booking_with_atomic_reservation(self, app):
+        beneficiary = users_factories.BeneficiaryGrant18Factory()
+        stock = offers_factories.StockFactory(price=10, quantity=10)
+
+        results = _book_concurrently(app, [beneficiary.id, beneficiary.id], stock.id)
+
+        assert sorted(results) == ["already booked", "booked"]
+        assert models.Booking.query.count() == 1
+        assert offers_models.Stock.query.get(stock.id).dnBookedQuantity == 1
+
+    @clean_database
+    def test_concurrent_bookings_claim_distinct_activation_codes(self, app):
+        beneficiaries = users_factories.BeneficiaryGrant18Factory.create_batch(3)
+        stock = offers_factories.StockWithActivationCodesFactory(quantity=2, activationCodes=["code-1", "code-2"])
+
+        results = _book_concurrently(app, [beneficiary.id for beneficiary in beneficiaries], stock.id)
+
+        assert sorted(results) == ["booked", "booked", "sold out"]
+        codes = offers_models.ActivationCode.query.filter_by(stockId=stock.id).all()
+        booking_ids = {code.bookingId for code in codes}
+        assert None not in booking_ids
+        assert booking_ids == {booking.id for booking in models.Booking.query.all()}
+        assert offers_models.Stock.query.get(stock.id).dnBookedQuantity == 2
+
     @clean_database
     def test_cancel_booking(self, app):
         booking = booking_factories.IndividualBookingFactory(stock__dnBookedQuantity=1)
@@ -370,6 +447,112 @@ class BookOfferTest:
                 "noActivationCodeAvailable": ["Ce stock ne contient plus de code d'activation disponible."]
             }
 
+    class WithAtomicStockReservationTest:
+        @override_features(ENABLE_ATOMIC_STOCK_RESERVATION=True)
+        def test_create_booking(self):
+            beneficiary = users_factories.BeneficiaryGrant18Factory()
+            stock = offers_factories.StockFactory(price=10, quantity=10, dnBookedQuantity=5)
+
+            booking = api.book_offer(beneficiary=beneficiary, stock_id=stock.id, quantity=1)
+
+            assert booking.individualBooking.userId == beneficiary.id
+            assert booking.stock == stock
+            assert stock.dnBookedQuantity == 6
+            assert len(mails_testing.outbox) == 2
+
+        @override_features(ENABLE_ATOMIC_STOCK_RESERVATION=True)
+        def test_raise_if_stock_is_sold_out_during_checks(self):
+            beneficiary = users_factories.BeneficiaryGrant18Factory()
+            stock = offers_factories.StockFactory(price=10, quantity=1)
+
+            def book_last_item_concurrently(*args):
+                offers_models.Stock.query.filter_by(id=stock.id).update({"dnBookedQuantity": 1})
+
+            with mock.patch(
+                "pcapi.core.bookings.validation.check_expenses_limits", side_effect=book_last_item_concurrently
+            ):
+                with pytest.raises(exceptions.StockIsNotBookable):
+                    api.book_offer(beneficiary=beneficiary, stock_id=stock.id, quantity=1)
+
+            assert models.Booking.query.count() == 0
+
+        @override_features(ENABLE_ATOMIC_STOCK_RESERVATION=True, ENABLE_ACTIVATION_CODES=True)
+        def test_book_offer_with_activation_code(self):
+            beneficiary = users_factories.BeneficiaryGrant18Factory()
+            stock = offers_factories.StockWithActivationCodesFactory()
+
+            booking = api.book_offer(beneficiary=beneficiary, stock_id=stock.id, quantity=1)
+
+            assert booking.activationCode == stock.activationCodes[0]
+            assert stock.dnBookedQuantity == 1
+
+
+@pytest.mark.usefixtures("db_session")
+class ProcessBookingOutboxTest:
+    @mock.patch("pcapi.core.bookings.api.process_booking_outbox_job.delay")
+    def test_events_are_processed_later_if_job_cannot_be_enqueued(self, mocked_delay):
+        mocked_delay.side_effect = redis.exceptions.ConnectionError()
+        beneficiary = users_factories.BeneficiaryGrant18Factory()
+        stock = offers_factories.StockFactory(offer__bookingEmail="offerer@example.com")
+
+        booking = api.book_offer(beneficiary=beneficiary, stock_id=stock.id, quantity=1)
+
+        assert booking.id is not None
+        assert models.BookingOutboxEvent.query.count() == 3
+        assert not mails_testing.outbox
+        assert not push_testing.requests
+
+        processed = api.process_booking_outbox()
+
+        assert processed == 3
+        assert models.BookingOutboxEvent.query.count() == 0
+        assert len(mails_testing.outbox) == 2
+        assert len(push_testing.requests) == 1
+
+    @mock.patch("pcapi.core.bookings.api.update_external_user")
+    def test_failed_event_is_retried_later(self, mocked_update_external_user):
+        booking = booking_factories.IndividualBookingFactory()
+        event = models.BookingOutboxEvent(booking=booking, type=models.BookingOutboxEventType.UPDATE_EXTERNAL_USER)
+        db.session.add(event)
+        db.session.commit()
+        mocked_update_external_user.side_effect = ValueError("Batch is down")
+
+        assert api.process_booking_outbox() == 1
+
+        event = models.BookingOutboxEvent.query.one()
+        assert event.attempts == 1
+        assert event.lastError == "ValueError: Batch is down"
+        assert event.availableAt > datetime.utcnow()
+        assert api.process_booking_outbox() == 0
+
+        mocked_update_external_user.side_effect = None
+        with freeze_time(datetime.utcnow() + api.BOOKING_OUTBOX_RETRY_DELAY):
+            assert api.process_booking_outbox() == 1
+
+        assert models.BookingOutboxEvent.query.count() == 0
+        mocked_update_external_user.assert_called_with(booking.individualBooking.user)
+
+    def test_get_booking_outbox_status(self):
+        booking = booking_factories.IndividualBookingFactory()
+        with freeze_time(datetime.utcnow() - timedelta(minutes=2)):
+            db.session.add(
+                models.BookingOutboxEvent(booking=booking, type=models.BookingOutboxEventType.UPDATE_EXTERNAL_USER)
+            )
+        db.session.add(
+            models.BookingOutboxEvent(
+                booking=booking,
+                type=models.BookingOutboxEventType.BENEFICIARY_CONFIRMATION_EMAIL,
+                attempts=api.BOOKING_OUTBOX_MAX_ATTEMPTS,
+            )
+        )
+        db.session.commit()
+
+        status = api.get_booking_outbox_status()
+
+        assert status["pending_events"] == 1
+        assert status["failed_events"] == 1
+        assert 120 <= status["lag"] < 180
+
 
 @pytest.mark.usefixtures("db_session")
 class CancelByBeneficiaryTest:
@@ -380,6 +563,7 @@ class CancelByBeneficiaryTest:
         queries = 1  # select booking
         queries += 1  # select stock for update
         queries += 1  # refresh booking
+        queries += 4  # (update deposit spending): select individualBooking ; deposit ; offer ; update deposit
         queries += 3  # update stock ; update booking ; release savepoint
         queries += 8  # (update batch attributes): select booking ; individualBooking ; user ; user.bookings ; deposit ; user_offerer ; favorites ; stock
         queries += 1  # select offer
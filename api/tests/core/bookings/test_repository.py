@@ -4,6 +4,8 @@ from datetime import datetime
 from datetime import time
 from datetime import timedelta
 from io import StringIO
+import tracemalloc
+from unittest import mock
 
 from dateutil import tz
 from dateutil.relativedelta import relativedelta
@@ -12,6 +14,7 @@ import pytest
 from pytest import fixture
 
 import pcapi.core.bookings.factories as bookings_factories
+from pcapi.core.bookings.models import Booking
 from pcapi.core.bookings.models import BookingStatus
 import pcapi.core.bookings.repository as booking_repository
 from pcapi.core.bookings.repository import get_bookings_from_deposit
@@ -75,7 +78,7 @@ def test_find_not_cancelled_bookings_by_stock(app):
     assert set(all_not_cancelled_bookings) == {used_booking, not_cancelled_booking}
 
 
-class FindPaymentEligibleBookingsForVenueTest:
+class FindPaymentEligibleBookingRowsForVenueTest:
     def test_basics(self, app: fixture):
         # Given
         cutoff = datetime.now()
@@ -127,13 +130,11 @@ class FindPaymentEligibleBookingsForVenueTest:
         )
 
         # When
-        bookings = booking_repository.find_bookings_eligible_for_payment_for_venue(venue.id, cutoff)
+        rows = booking_repository.find_booking_rows_eligible_for_payment_for_venue(venue.id, cutoff)
 
         # Then
-        assert len(bookings) == 2
-        assert bookings[0] == past_event_booking
-        assert bookings[1] == thing_booking
-        assert future_event_booking not in bookings
+        assert [row.id for row in rows] == [past_event_booking.id, thing_booking.id]
+        assert future_event_booking.id not in {row.id for row in rows}
 
     def test_cutoff_date(self, app):
         venue = offers_factories.VenueFactory()
@@ -143,8 +144,34 @@ class FindPaymentEligibleBookingsForVenueTest:
         )
         bookings_factories.UsedIndividualBookingFactory(dateUsed=cutoff, stock__offer__venue=venue)
 
-        bookings = booking_repository.find_bookings_eligible_for_payment_for_venue(venue.id, cutoff)
-        assert bookings == [booking1]
+        rows = booking_repository.find_booking_rows_eligible_for_payment_for_venue(venue.id, cutoff)
+        assert [row.id for row in rows] == [booking1.id]
+
+    def test_order_and_columns(self, app):
+        cutoff = datetime.now()
+        venue = offers_factories.VenueFactory()
+        offers_factories.BankInformationFactory(venue=venue, iban="iban1", bic="bic1")
+        booking1 = bookings_factories.UsedIndividualBookingFactory(
+            dateUsed=cutoff - timedelta(days=1), stock__offer__venue=venue
+        )
+        booking2 = bookings_factories.UsedIndividualBookingFactory(
+            dateUsed=cutoff - timedelta(days=2), stock__offer__venue=venue
+        )
+        paid_booking = bookings_factories.UsedIndividualBookingFactory(
+            dateUsed=cutoff - timedelta(days=1), stock__offer__venue=venue
+        )
+        payment = PaymentFactory(booking=paid_booking)
+        bookings_factories.UsedIndividualBookingFactory(dateUsed=cutoff, stock__offer__venue=venue)
+
+        rows = booking_repository.find_booking_rows_eligible_for_payment_for_venue(venue.id, cutoff)
+
+        assert [row.id for row in rows] == [paid_booking.id, booking2.id, booking1.id]
+        assert [row.paymentId for row in rows] == [payment.id, None, None]
+        row = rows[1]
+        assert row.offerId == booking2.stock.offerId
+        assert row.subcategoryId == booking2.stock.offer.subcategoryId
+        assert row.offererName == venue.managingOfferer.name
+        assert (row.venueIban, row.venueBic, row.offererIban) == ("iban1", "bic1", None)
 
 
 class FindByTest:
@@ -1806,7 +1833,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert headers == [
             "Lieu",
             "Nom de l’offre",
@@ -1861,7 +1888,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        _, *data = csv.reader(StringIO(bookings_csv))
+        _, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 2
 
     def test_should_not_duplicate_bookings_when_user_is_admin_and_bookings_offerer_has_multiple_user(
@@ -1882,7 +1909,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        _, *data = csv.reader(StringIO(bookings_csv))
+        _, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 2
 
     def test_should_return_event_booking_when_booking_is_on_an_event(self, app: fixture):
@@ -1911,7 +1938,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert headers == [
             "Lieu",
             "Nom de l’offre",
@@ -1973,7 +2000,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 1
         data_dict = dict(zip(headers, data[0]))
         assert (
@@ -2008,7 +2035,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 1
         data_dict = dict(zip(headers, data[0]))
         assert (
@@ -2043,7 +2070,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 1
         data_dict = dict(zip(headers, data[0]))
         assert data_dict["Statut de la contremarque"] == booking_repository.BOOKING_STATUS_LABELS[BookingStatus.USED]
@@ -2079,7 +2106,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        _, *data = csv.reader(StringIO(bookings_csv))
+        _, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 2
 
     def test_should_not_return_bookings_when_offerer_link_is_not_validated(self, app: fixture):
@@ -2101,7 +2128,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        _, *data = csv.reader(StringIO(bookings_csv))
+        _, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 0
 
     def test_should_return_booking_date_with_offerer_timezone_when_venue_is_digital(self, app: fixture):
@@ -2129,7 +2156,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 1
         data_dict = dict(zip(headers, data[0]))
         assert data_dict["Date et heure de réservation"] == str(booking_date.astimezone(tz.gettz("America/Cayenne")))
@@ -2159,7 +2186,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 1
         data_dict = dict(zip(headers, data[0]))
         assert data_dict["ISBN"] == "9876543234"
@@ -2218,7 +2245,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 3
         data_dicts = [dict(zip(headers, line)) for line in data]
         assert data_dicts[0]["Lieu"] == venue_for_event.name
@@ -2282,7 +2309,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 3
         data_dicts = [dict(zip(headers, line)) for line in data]
         assert data_dicts[0]["Lieu"] == venue_for_event.publicName
@@ -2305,7 +2332,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 1
         data_dict = dict(zip(headers, data[0]))
         assert data_dict["Nom de l’offre"] == booking_two.stock.offer.name
@@ -2334,7 +2361,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 1
         data_dict = dict(zip(headers, data[0]))
         assert data_dict["Contremarque"] == expected_booking.token
@@ -2370,7 +2397,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 2
         data_dicts = [dict(zip(headers, line)) for line in data]
         tokens = [booking["Contremarque"] for booking in data_dicts]
@@ -2401,7 +2428,7 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 1
         data_dict = dict(zip(headers, data[0]))
         assert data_dict["Date et heure de réservation"] == str(
@@ -2443,12 +2470,82 @@ class GetCsvReportTest:
         )
 
         # Then
-        headers, *data = csv.reader(StringIO(bookings_csv))
+        headers, *data = csv.reader(StringIO(b"".join(bookings_csv).decode("utf-8-sig")))
         assert len(data) == 2
         data_dicts = [dict(zip(headers, line)) for line in data]
         tokens = [booking["Contremarque"] for booking in data_dicts]
         assert sorted(tokens) == sorted([cayenne_booking.token, mayotte_booking.token])
 
+    @mock.patch("pcapi.core.bookings.repository.CSV_REPORT_BATCH_SIZE", 2)
+    def test_should_stream_report_by_batches(self, app: fixture):
+        # Given
+        pro = users_factories.ProFactory()
+        offerer = offers_factories.OffererFactory()
+        offers_factories.UserOffererFactory(user=pro, offerer=offerer)
+        stock = offers_factories.ThingStockFactory(offer__venue__managingOfferer=offerer)
+        bookings_factories.BookingFactory.create_batch(6, stock=stock)
+
+        # When
+        bookings_csv = booking_repository.get_csv_report(
+            user=pro, booking_period=(one_year_before_booking, one_year_after_booking)
+        )
+
+        # Then
+        # The header (with a BOM) and each batch of bookings are sent
+        # separately, so that the whole report is never held in memory.
+        header, *batches = list(bookings_csv)
+        assert header.startswith("\ufeffLieu".encode("utf-8"))
+        assert len(header.decode("utf-8-sig").splitlines()) == 1
+        assert len(batches) == 3
+        assert all(len(batch.decode("utf-8").splitlines()) == 2 for batch in batches)
+
+    @mock.patch("pcapi.core.bookings.repository.CSV_REPORT_BATCH_SIZE", 50)
+    def test_should_stream_large_report_in_bounded_memory(self, app: fixture):
+        # Given
+        pro = users_factories.ProFactory()
+        offerer = offers_factories.OffererFactory()
+        offers_factories.UserOffererFactory(user=pro, offerer=offerer)
+        stock = offers_factories.ThingStockFactory(offer__venue__managingOfferer=offerer, quantity=None)
+        booking = bookings_factories.BookingFactory(stock=stock, amount=0)
+        # Copy the booking many times, with distinct tokens (lowercase,
+        # unlike generated tokens).
+        columns = ", ".join(
+            f'"{column.name}"' for column in Booking.__table__.columns if column.name not in ("id", "token")
+        )
+        db.session.execute(
+            f"""
+            INSERT INTO booking ({columns}, token)
+            SELECT {columns}, 'x' || lpad(to_hex(i), 5, '0')
+            FROM booking, generate_series(1, 5000) AS i
+            WHERE booking.id = :booking_id
+            """,
+            {"booking_id": booking.id},
+        )
+
+        def export():
+            size = lines = 0
+            for chunk in booking_repository.get_csv_report(
+                user=pro, booking_period=(one_year_before_booking, one_year_after_booking)
+            ):
+                size += len(chunk)
+                lines += chunk.count(b"\n")
+            return size, lines
+
+        export()  # warm up, so that lazily initialized objects are not measured
+
+        # When
+        tracemalloc.start()
+        try:
+            report_size, report_lines = export()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # Then
+        assert report_lines == 1 + 5001
+        # A report built in memory would take at least its own size.
+        assert peak < report_size / 5
+
 
 class FindSoonToBeExpiredBookingsTest:
     def test_should_return_only_soon_to_be_expired_individual_bookings(self, app: fixture):
@@ -5,6 +5,7 @@ from pcapi.core.bookings.models import BookingStatus
 from pcapi.core.educational.factories import EducationalInstitutionFactory
 from pcapi.core.educational.factories import EducationalYearFactory
 from pcapi.core.educational.repository import get_confirmed_educational_bookings_amount
+from pcapi.core.testing import assert_num_queries
 
 
 class EducationalRepositoryTest:
@@ -65,3 +66,30 @@ class EducationalRepositoryTest:
 
         total_amount = get_confirmed_educational_bookings_amount(educational_institution.id, educational_year.adageId)
         assert total_amount == Decimal(1200.00)
+
+    def test_get_confirmed_educational_bookings_amount_in_one_query(self, db_session):
+        educational_institution = EducationalInstitutionFactory()
+        educational_year = EducationalYearFactory(adageId="1")
+        EducationalBookingFactory.create_batch(
+            3,
+            amount=Decimal(10.00),
+            quantity=2,
+            educationalBooking__educationalInstitution=educational_institution,
+            educationalBooking__educationalYear=educational_year,
+            status=BookingStatus.CONFIRMED,
+        )
+
+        with assert_num_queries(1):
+            total_amount = get_confirmed_educational_bookings_amount(
+                educational_institution.id, educational_year.adageId
+            )
+
+        assert total_amount == Decimal(60.00)
+
+    def test_get_confirmed_educational_bookings_amount_without_bookings(self, db_session):
+        educational_institution = EducationalInstitutionFactory()
+        educational_year = EducationalYearFactory(adageId="1")
+
+        total_amount = get_confirmed_educational_bookings_amount(educational_institution.id, educational_year.adageId)
+
+        assert total_amount == Decimal(0)
@@ -4,7 +4,10 @@ from unittest.mock import patch
 from freezegun import freeze_time
 import pytest
 
+import pcapi.core.bookings.api as bookings_api
+import pcapi.core.bookings.factories as bookings_factories
 from pcapi.core.offerers import api as offerers_api
+from pcapi.core.offerers import api_key_cache
 from pcapi.core.offerers import factories as offerers_factories
 from pcapi.core.offerers import models as offerers_models
 from pcapi.core.offerers.exceptions import ValidationTokenNotFoundError
@@ -249,6 +252,53 @@ class ApiKeyTest:
         assert not offerers_api.find_api_key("development_prefix_value")
 
 
+class ApiKeyCacheTest:
+    def setup_method(self):
+        api_key_cache.clear_local_cache()
+
+    def test_verified_secret_is_cached(self):
+        offerer = offers_factories.OffererFactory()
+        generated_key = offerers_api.generate_and_save_api_key(offerer.id)
+        assert offerers_api.find_api_key(generated_key).offerer == offerer
+
+        with patch.object(ApiKey, "check_secret") as mocked_check_secret:
+            assert offerers_api.find_api_key(generated_key).offerer == offerer
+            api_key_cache.clear_local_cache()  # as if the next call was made by another process
+            assert offerers_api.find_api_key(generated_key).offerer == offerer
+        mocked_check_secret.assert_not_called()
+
+    def test_metrics(self):
+        offerer = offers_factories.OffererFactory()
+        generated_key = offerers_api.generate_and_save_api_key(offerer.id)
+        offerers_api.find_api_key(generated_key)  # miss
+        offerers_api.find_api_key(generated_key)  # local hit
+        offerers_api.find_api_key(generated_key)  # local hit
+
+        assert api_key_cache.pop_metrics() == {"miss": 1, "local_hit": 2}
+        assert api_key_cache.pop_metrics() == {}
+
+    def test_wrong_secret_is_not_cached(self):
+        offerer = offers_factories.OffererFactory()
+        generated_key = offerers_api.generate_and_save_api_key(offerer.id)
+        wrong_key = generated_key[:-1] + ("0" if generated_key[-1] != "0" else "1")
+
+        assert offerers_api.find_api_key(wrong_key) is None
+        assert offerers_api.find_api_key(wrong_key) is None
+        assert api_key_cache.pop_metrics() == {"miss": 2}
+
+    def test_deleted_key_is_forgotten(self, app):
+        user_offerer = offers_factories.UserOffererFactory()
+        generated_key = offerers_api.generate_and_save_api_key(user_offerer.offerer.id)
+        api_key = offerers_api.find_api_key(generated_key)
+        redis_key = api_key_cache.REDIS_VERIFIED_SECRET.format(prefix=api_key.prefix)
+        assert app.redis_client.get(redis_key)
+
+        offerers_api.delete_api_key_by_user(user_offerer.user, api_key.prefix)
+
+        assert app.redis_client.get(redis_key) is None
+        assert offerers_api.find_api_key(generated_key) is None
+
+
 class CreateOffererTest:
     @patch("pcapi.core.offerers.api.maybe_send_offerer_validation_email", return_value=True)
     def test_create_new_offerer_with_validation_token_if_siren_is_not_already_registered(
@@ -478,3 +528,25 @@ class ValidateOffererTest:
         # Then
         assert not applicant.has_pro_role
         assert user_offerer.offerer.validationToken == "TOKEN"
+
+
+class GetVenuesStatsTest:
+    def test_stats_are_cached(self):
+        booking = bookings_factories.BookingFactory()
+        venue = booking.venue
+
+        venues_stats = offerers_api.get_venues_stats(venue.managingOffererId)
+        assert venues_stats[venue.id]["activeBookingsQuantity"] == 1
+
+        with assert_num_queries(0):
+            assert offerers_api.get_venues_stats(venue.managingOffererId) == venues_stats
+
+    def test_cache_is_invalidated_when_booking_an_offer(self):
+        stock = offers_factories.StockFactory()
+        venue = stock.offer.venue
+        beneficiary = users_factories.BeneficiaryGrant18Factory()
+        assert offerers_api.get_venues_stats(venue.managingOffererId)[venue.id]["activeBookingsQuantity"] == 0
+
+        bookings_api.book_offer(beneficiary, stock.id, quantity=1)
+
+        assert offerers_api.get_venues_stats(venue.managingOffererId)[venue.id]["activeBookingsQuantity"] == 1
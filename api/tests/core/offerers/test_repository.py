@@ -3,6 +3,7 @@ from datetime import datetime
 
 import pytest
 
+import pcapi.core.bookings.factories as bookings_factories
 from pcapi.core.offerers.exceptions import CannotFindOffererUserEmail
 import pcapi.core.offerers.factories as offerers_factories
 from pcapi.core.offerers.models import Offerer
@@ -15,9 +16,11 @@ from pcapi.core.offerers.repository import get_all_offerers_for_user
 from pcapi.core.offerers.repository import get_all_venue_labels
 from pcapi.core.offerers.repository import get_all_venue_types
 from pcapi.core.offerers.repository import get_offerers_by_date_validated
+from pcapi.core.offerers.repository import get_venues_stats
 from pcapi.core.offerers.repository import has_digital_venue_with_at_least_one_offer
 from pcapi.core.offerers.repository import has_physical_venue_without_draft_or_accepted_bank_information
 import pcapi.core.offers.factories as offers_factories
+from pcapi.core.testing import assert_num_queries
 from pcapi.core.users import factories as users_factories
 from pcapi.models.bank_information import BankInformationStatus
 
@@ -442,3 +445,35 @@ class HasDigitalVenueWithAtLeastOneOfferTest:
         offers_factories.VirtualVenueFactory(managingOfferer=offerer)
 
         assert not has_digital_venue_with_at_least_one_offer(offerer.id)
+
+
+class GetVenuesStatsTest:
+    def test_venues_stats(self):
+        offerer = offerers_factories.OffererFactory()
+        venue = offers_factories.VenueFactory(managingOfferer=offerer)
+        venue_without_offers = offers_factories.VenueFactory(managingOfferer=offerer)
+        offers_factories.StockFactory(offer__venue=venue)
+        sold_out_stock = offers_factories.StockFactory(quantity=3, offer__venue=venue)
+        bookings_factories.BookingFactory(stock=sold_out_stock, quantity=2)
+        bookings_factories.UsedBookingFactory(stock=sold_out_stock)
+        bookings_factories.CancelledBookingFactory(stock=sold_out_stock)
+        offers_factories.StockFactory(offer__venue=venue, offer__isActive=False)
+        bookings_factories.BookingFactory()  # on another offerer
+
+        with assert_num_queries(1):
+            venues_stats = get_venues_stats(offerer.id)
+
+        assert venues_stats == {
+            venue.id: {
+                "activeBookingsQuantity": 2,
+                "validatedBookingsQuantity": 1,
+                "activeOffersCount": 1,
+                "soldOutOffersCount": 1,
+            },
+            venue_without_offers.id: {
+                "activeBookingsQuantity": 0,
+                "validatedBookingsQuantity": 0,
+                "activeOffersCount": 0,
+                "soldOutOffersCount": 0,
+            },
+        }
@@ -6,6 +6,7 @@ from unittest import mock
 
 from freezegun import freeze_time
 import pytest
+from werkzeug.exceptions import NotFound
 
 from pcapi import models
 import pcapi.core.bookings.factories as bookings_factories
@@ -33,6 +34,8 @@ from pcapi.core.offers.factories import ProductFactory
 from pcapi.core.offers.factories import StockFactory
 from pcapi.core.offers.factories import ThingProductFactory
 from pcapi.core.offers.factories import VenueFactory
+from pcapi.core.offers.models import ActivationCode
+from pcapi.core.offers.models import ActivationCodeRejectionReason
 from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import OfferValidationConfig
 from pcapi.core.offers.models import OfferValidationStatus
@@ -85,6 +88,39 @@ class UpsertStocksTest:
         assert edited_stock.quantity == 7
         mocked_async_index_offer_ids.assert_called_once_with([offer.id])
 
+    def test_upsert_many_stocks_with_activation_codes(self):
+        user = users_factories.ProFactory()
+        offer = factories.DigitalOfferFactory()
+        existing_stocks = factories.StockFactory.create_batch(3, offer=offer, price=10)
+        stock_data_list = []
+        for i, existing_stock in enumerate(existing_stocks):
+            stock_data_list.append(
+                StockCreationBodyModel(price=i, activationCodes=[f"CODE-{i}-1", f"CODE-{i}-2"]),
+            )
+            stock_data_list.append(StockEditionBodyModel(id=existing_stock.id, price=i, quantity=5))
+
+        stocks = api.upsert_stocks(offer_id=offer.id, stock_data_list=stock_data_list, user=user)
+
+        assert len(stocks) == 6
+        for i in range(3):
+            created_stock, edited_stock = stocks[2 * i], stocks[2 * i + 1]
+            assert created_stock.offer == offer
+            assert created_stock.price == i
+            assert created_stock.quantity == 2
+            assert {code.code for code in created_stock.activationCodes} == {f"CODE-{i}-1", f"CODE-{i}-2"}
+            assert edited_stock == existing_stocks[i]
+            assert edited_stock.price == i
+            assert edited_stock.quantity == 5
+
+    def test_upsert_unknown_stock(self):
+        user = users_factories.ProFactory()
+        offer = factories.ThingOfferFactory()
+        existing_stock = factories.StockFactory(offer=offer, isSoftDeleted=True)
+        edited_stock_data = StockEditionBodyModel(id=existing_stock.id, price=5, quantity=7)
+
+        with pytest.raises(NotFound):
+            api.upsert_stocks(offer_id=offer.id, stock_data_list=[edited_stock_data], user=user)
+
     @freeze_time("2020-11-17 15:00:00")
     def test_upsert_stocks_triggers_draft_offer_validation(self):
         # Given draft offers and new stock data
@@ -640,6 +676,50 @@ class UpsertStocksTest:
         assert not mocked_offer_creation_notification_to_admin.called
 
 
+class IngestActivationCodesTest:
+    def test_codes_are_inserted_by_chunks(self):
+        stock = factories.StockWithActivationCodesFactory(activationCodes=["EXISTING"])
+        expiration = datetime(2030, 1, 1)
+
+        report = api.ingest_activation_codes(
+            stock.id, [" ABC ", "DEF", "ABC", "", "EXISTING", "GHI"], expiration, chunk_size=2
+        )
+
+        assert report.inserted == 3
+        assert report.rejected == {
+            "ABC": ActivationCodeRejectionReason.DUPLICATE,
+            "": ActivationCodeRejectionReason.INVALID,
+            "EXISTING": ActivationCodeRejectionReason.ALREADY_EXISTS,
+        }
+        codes = ActivationCode.query.filter_by(stockId=stock.id).all()
+        assert {code.code for code in codes} == {"EXISTING", "ABC", "DEF", "GHI"}
+        assert {code.expirationDate for code in codes if code.code != "EXISTING"} == {expiration}
+
+    @mock.patch("pcapi.core.search.async_index_offer_ids")
+    def test_import_increases_quantity(self, mocked_async_index_offer_ids):
+        stock = factories.StockWithActivationCodesFactory(activationCodes=["EXISTING"], quantity=1)
+
+        report = api.import_activation_codes(stock, ["EXISTING", "ABC", "DEF"], None)
+
+        assert report.inserted == 2
+        assert Stock.query.get(stock.id).quantity == 3
+        mocked_async_index_offer_ids.assert_called_once_with([stock.offerId])
+
+    def test_upsert_stocks_rejects_duplicate_codes(self):
+        user = users_factories.ProFactory()
+        offer = factories.DigitalOfferFactory()
+        created_stock_data = StockCreationBodyModel(price=0, activationCodes=["ABC", "DEF", "ABC"])
+
+        with pytest.raises(api_errors.ApiErrors) as error:
+            api.upsert_stocks(offer_id=offer.id, stock_data_list=[created_stock_data], user=user)
+
+        assert error.value.errors == {
+            "activationCodes": ["Les codes d'activation suivants sont invalides ou en double : ABC"],
+        }
+        assert Stock.query.count() == 0
+        assert ActivationCode.query.count() == 0
+
+
 class DeleteStockTest:
     @mock.patch("pcapi.core.search.async_index_offer_ids")
     def test_delete_stock_basics(self, mocked_async_index_offer_ids):
@@ -14,6 +14,7 @@ from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import OfferStatus
 from pcapi.core.offers.models import OfferValidationStatus
 from pcapi.core.offers.repository import check_stock_consistency
+from pcapi.core.offers.repository import claim_available_activation_code
 from pcapi.core.offers.repository import delete_past_draft_offers
 from pcapi.core.offers.repository import find_tomorrow_event_stock_ids
 from pcapi.core.offers.repository import get_active_offers_count_for_venue
@@ -22,6 +23,7 @@ from pcapi.core.offers.repository import get_capped_offers_for_filters
 from pcapi.core.offers.repository import get_expired_offers
 from pcapi.core.offers.repository import get_offers_by_ids
 from pcapi.core.offers.repository import get_sold_out_offers_count_for_venue
+from pcapi.core.offers.repository import reserve_stock_quantity
 from pcapi.core.users import factories as users_factories
 from pcapi.domain.pro_offers.offers_recap import OffersRecap
 from pcapi.model_creators.generic_creators import create_offerer
@@ -29,6 +31,7 @@ from pcapi.model_creators.generic_creators import create_provider
 from pcapi.model_creators.generic_creators import create_user_offerer
 from pcapi.model_creators.generic_creators import create_venue
 from pcapi.model_creators.specific_creators import create_offer_with_thing_product
+from pcapi.models import db
 from pcapi.repository import repository
 from pcapi.utils.date import utc_datetime_to_department_timezone
 
@@ -1155,6 +1158,38 @@ class CheckStockConsistenceTest:
         assert stock_ids == {stock2.id, stock4.id, stock6.id}
 
 
+@pytest.mark.usefixtures("db_session")
+class ReserveStockQuantityTest:
+    def test_reserve_remaining_quantity(self):
+        stock = offers_factories.StockFactory(quantity=5, dnBookedQuantity=3)
+
+        assert reserve_stock_quantity(stock.id, 2)
+
+        db.session.refresh(stock)
+        assert stock.dnBookedQuantity == 5
+
+    def test_do_not_reserve_more_than_remaining_quantity(self):
+        stock = offers_factories.StockFactory(quantity=5, dnBookedQuantity=4)
+
+        assert not reserve_stock_quantity(stock.id, 2)
+
+        db.session.refresh(stock)
+        assert stock.dnBookedQuantity == 4
+
+    def test_reserve_unlimited_stock(self):
+        stock = offers_factories.StockFactory(quantity=None, dnBookedQuantity=10)
+
+        assert reserve_stock_quantity(stock.id, 1)
+
+        db.session.refresh(stock)
+        assert stock.dnBookedQuantity == 11
+
+    def test_do_not_reserve_soft_deleted_stock(self):
+        stock = offers_factories.StockFactory(quantity=5, isSoftDeleted=True)
+
+        assert not reserve_stock_quantity(stock.id, 1)
+
+
 @pytest.mark.usefixtures("db_session")
 class TomorrowStockTest:
     def test_find_tomorrow_event_stock_ids(self):
@@ -1266,3 +1301,12 @@ class AvailableActivationCodeTest:
         ActivationCodeFactory(stock=stock2)
 
         assert not get_available_activation_code(stock)
+
+    def test_claim_available_activation_code(self):
+        booking = bookings_factories.BookingFactory()
+        stock = booking.stock
+        ActivationCodeFactory(booking=booking, stock=stock)  # booked_code
+        first_code = ActivationCodeFactory(stock=stock)
+        ActivationCodeFactory(stock=stock)
+
+        assert claim_available_activation_code(stock) == first_code
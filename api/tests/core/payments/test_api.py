@@ -8,6 +8,7 @@ from freezegun import freeze_time
 import pytest
 import pytz
 
+import pcapi.core.bookings.factories as bookings_factories
 import pcapi.core.offerers.factories as offerers_factories
 from pcapi.core.payments import api
 from pcapi.core.payments import exceptions
@@ -108,6 +109,32 @@ class CreateDepositTest:
         assert error.value.errors["user"] == ['Cet utilisateur a déjà été crédité de la subvention "GRANT_18".']
 
 
+class CopyPaymentsTest:
+    def test_copy_payments(self):
+        booking = bookings_factories.UsedIndividualBookingFactory(amount=10)
+        batch_date = datetime(2021, 11, 16, 9, 0)
+        row = dict(
+            bookingId=booking.id,
+            amount=Decimal("9.5"),
+            reimbursementRule="Remboursement à 95%, entre deux seuils",
+            reimbursementRate=Decimal("0.95"),
+            customReimbursementRuleId=None,
+            author="batch",
+            transactionLabel="pass Culture Pro - remboursement 2nde quinzaine 11-2021",
+            batchDate=batch_date,
+            iban=None,
+            bic=None,
+            recipientName="Le Petit Rintintin",
+            recipientSiren="123456789",
+        )
+
+        api.copy_payments([[row[column] for column in api.PAYMENT_COPY_COLUMNS]])
+
+        payment = Payment.query.one()
+        for column, value in row.items():
+            assert getattr(payment, column) == value
+
+
 class BulkCreatePaymentStatusesTest:
     def test_without_detail(self):
         p1 = payments_factories.PaymentFactory(statuses=[])
@@ -0,0 +1,86 @@
+import pytest
+
+import pcapi.core.bookings.factories as bookings_factories
+from pcapi.core.categories import subcategories
+from pcapi.core.payments import repository
+from pcapi.core.payments.models import Deposit
+import pcapi.core.users.factories as users_factories
+from pcapi.models import db
+
+
+def get_spending(deposit):
+    db.session.refresh(deposit)
+    return {
+        "spent": deposit.dnSpentAmount,
+        "digital": deposit.dnDigitalSpentAmount,
+        "physical": deposit.dnPhysicalSpentAmount,
+        "used": deposit.dnUsedAmount,
+    }
+
+
+@pytest.mark.usefixtures("db_session")
+class DepositSpendingTest:
+    def test_booking_changes_update_spending(self):
+        booking = bookings_factories.IndividualBookingFactory(
+            amount=10,
+            quantity=2,
+            stock__offer__subcategoryId=subcategories.JEU_SUPPORT_PHYSIQUE.id,
+        )
+        deposit = booking.individualBooking.deposit
+        assert get_spending(deposit) == {"spent": 20, "digital": 0, "physical": 20, "used": 0}
+
+        booking.mark_as_used()
+        db.session.commit()
+        assert get_spending(deposit) == {"spent": 20, "digital": 0, "physical": 20, "used": 20}
+
+        booking.mark_as_unused_set_confirmed()
+        db.session.commit()
+        assert get_spending(deposit) == {"spent": 20, "digital": 0, "physical": 20, "used": 0}
+
+        booking.cancel_booking()
+        db.session.commit()
+        assert get_spending(deposit) == {"spent": 0, "digital": 0, "physical": 0, "used": 0}
+
+        booking.uncancel_booking_set_used()
+        db.session.commit()
+        assert get_spending(deposit) == {"spent": 20, "digital": 0, "physical": 20, "used": 20}
+
+        assert repository.check_deposit_spending_consistency() == []
+
+    def test_digital_booking(self):
+        booking = bookings_factories.IndividualBookingFactory(
+            amount=15,
+            stock__offer__subcategoryId=subcategories.JEU_EN_LIGNE.id,
+            stock__offer__url="http://on.line",
+        )
+
+        deposit = booking.individualBooking.deposit
+        assert get_spending(deposit) == {"spent": 15, "digital": 15, "physical": 0, "used": 0}
+
+
+@pytest.mark.usefixtures("db_session")
+class RecomputeDepositSpendingTest:
+    def test_recompute_spending(self):
+        user = users_factories.BeneficiaryGrant18Factory()
+        bookings_factories.UsedIndividualBookingFactory(
+            individualBooking__user=user,
+            amount=10,
+            stock__offer__subcategoryId=subcategories.JEU_SUPPORT_PHYSIQUE.id,
+        )
+        bookings_factories.IndividualBookingFactory(
+            individualBooking__user=user,
+            amount=5,
+            stock__offer__subcategoryId=subcategories.JEU_EN_LIGNE.id,
+            stock__offer__url="http://on.line",
+        )
+        bookings_factories.CancelledIndividualBookingFactory(individualBooking__user=user, amount=50)
+        deposit_without_bookings = users_factories.BeneficiaryGrant18Factory().deposit
+        Deposit.query.update({"dnSpentAmount": 1, "dnUsedAmount": 1}, synchronize_session=False)
+
+        assert repository.check_deposit_spending_consistency() == sorted([user.deposit.id, deposit_without_bookings.id])
+
+        repository.recompute_deposit_spending([user.deposit.id, deposit_without_bookings.id])
+
+        assert get_spending(user.deposit) == {"spent": 15, "digital": 5, "physical": 10, "used": 10}
+        assert get_spending(deposit_without_bookings) == {"spent": 0, "digital": 0, "physical": 0, "used": 0}
+        assert repository.check_deposit_spending_consistency() == []
@@ -5,7 +5,9 @@ import pytest
 from pcapi.core import search
 import pcapi.core.offers.factories as offers_factories
 import pcapi.core.search.testing as search_testing
+from pcapi.core.testing import assert_num_queries
 from pcapi.core.testing import override_settings
+from pcapi.models import db
 
 
 pytestmark = pytest.mark.usefixtures("db_session")
@@ -97,6 +99,27 @@ class ReindexOfferIdsTest:
         search.reindex_offer_ids([offer.id])
         assert search_testing.search_store["offers"] == {}
 
+    @pytest.mark.parametrize("batch_size", [1, 10])
+    def test_number_of_sql_queries_does_not_depend_on_batch_size(self, batch_size):
+        offer_ids = []
+        for _ in range(batch_size):
+            stock = offers_factories.EventStockFactory(offer__product__thumbCount=1)
+            offers_factories.StockFactory(offer=stock.offer)
+            offers_factories.MediationFactory(offer=stock.offer)
+            offers_factories.OfferCriterionFactory(offer=stock.offer)
+            offer_ids.append(stock.offer.id)
+        # Make sure that nothing is served from the identity map.
+        db.session.expire_all()
+
+        n_queries = 1  # select offers, venues, offerers and products
+        n_queries += 1  # select stocks
+        n_queries += 1  # select criteria
+        n_queries += 1  # select mediations
+        with assert_num_queries(n_queries):
+            search.reindex_offer_ids(offer_ids)
+
+        assert set(search_testing.search_store["offers"]) == set(offer_ids)
+
     @mock.patch("pcapi.core.search.backends.testing.FakeClient.create_or_update_documents", fail)
     def test_handle_indexation_error(self, app):
         offer = make_bookable_offer()
@@ -1,8 +1,11 @@
 import dataclasses
+import unittest.mock
 
 import pytest
+import requests
 import requests_mock
 
+from pcapi import settings
 import pcapi.core.offers.factories as offers_factories
 from pcapi.core.search.backends import appsearch
 from pcapi.core.testing import override_settings
@@ -159,6 +162,139 @@ def test_index_offers(app):
                 assert item["id"] % 12 == i
 
 
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_reuses_session(app):
+    backend = get_backend()
+    offers = [stock.offer for stock in offers_factories.StockFactory.create_batch(6)]
+    with requests_mock.Mocker() as mock:
+        mock.post(requests_mock.ANY, json=[{"errors": []}])
+        with unittest.mock.patch("pcapi.utils.requests.Session") as new_session:
+            backend.index_offers(offers[:3])
+            backend.index_offers(offers[3:])
+        assert mock.call_count == 6
+    new_session.assert_not_called()
+
+
+def test_backends_share_session(app):
+    backend = get_backend()
+    other_backend = get_backend()
+
+    assert other_backend.offers_engine.session is backend.offers_engine.session
+    assert other_backend.venues_engine.session is backend.offers_engine.session
+
+
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_raises_error_of_any_engine(app):
+    backend = get_backend()
+    offers = [stock.offer for stock in offers_factories.StockFactory.create_batch(24)]
+    with requests_mock.Mocker() as mock:
+        posted_by_engine = {
+            i: mock.post(f"https://appsearch.example.com/api/as/v1/engines/offers-{i}/documents", json=[{"errors": []}])
+            for i in range(len(appsearch.OFFERS_ENGINE_NAMES))
+        }
+        mock.post("https://appsearch.example.com/api/as/v1/engines/offers-3/documents", status_code=500)
+        with pytest.raises(requests.exceptions.HTTPError):
+            backend.index_offers(offers)
+    # Batches of other engines have been sent anyway.
+    for i in range(12):
+        if i != 3:
+            assert posted_by_engine[i].call_count == 1
+
+
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_logs_document_errors(app, caplog):
+    backend = get_backend()
+    offer = offers_factories.StockFactory().offer
+    errors = [{"id": str(offer.id), "errors": ["Invalid field type"]}]
+    with requests_mock.Mocker() as mock:
+        mock.post(requests_mock.ANY, json=errors)
+        backend.index_offers([offer])
+    assert caplog.records[-1].message == "Some documents could not be indexed, possible typing bug"
+    assert caplog.records[-1].extra["errors"] == errors
+
+
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_skips_unchanged_documents(app):
+    backend = get_backend()
+    offer1 = offers_factories.StockFactory().offer
+    offer2 = offers_factories.StockFactory().offer
+    with requests_mock.Mocker() as mock:
+        posted = mock.post(requests_mock.ANY, json=[{"errors": []}])
+
+        def get_posted_ids():
+            posted_ids = {item["id"] for request in posted.request_history for item in request.json()}
+            posted.reset()
+            return posted_ids
+
+        backend.index_offers([offer1, offer2])
+        assert get_posted_ids() == {offer1.id, offer2.id}
+
+        backend.index_offers([offer1, offer2])
+        assert get_posted_ids() == set()
+
+        offer2.name = "New name"
+        backend.index_offers([offer1, offer2])
+        assert get_posted_ids() == {offer2.id}
+
+
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_does_not_store_hashes_on_error(app):
+    backend = get_backend()
+    offer = offers_factories.StockFactory().offer
+    with requests_mock.Mocker() as mock:
+        mock.post(requests_mock.ANY, status_code=500)
+        with pytest.raises(requests.exceptions.HTTPError):
+            backend.index_offers([offer])
+    assert not app.redis_client.exists(f"search:appsearch:offer-document-hash:{offer.id}")
+
+
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_does_not_store_hashes_of_rejected_documents(app):
+    backend = get_backend()
+    offer1 = offers_factories.StockFactory().offer
+    offer2 = offers_factories.StockFactory().offer
+    with requests_mock.Mocker() as mock:
+        mock.post(
+            requests_mock.ANY,
+            json=[{"id": str(offer1.id), "errors": []}, {"id": str(offer2.id), "errors": ["Invalid field type"]}],
+        )
+        backend.index_offers([offer1, offer2])
+    ttl = app.redis_client.ttl(f"search:appsearch:offer-document-hash:{offer1.id}")
+    assert 0 < ttl <= settings.APPSEARCH_DOCUMENT_HASHES_TTL
+    assert not app.redis_client.exists(f"search:appsearch:offer-document-hash:{offer2.id}")
+
+
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_with_force_sends_unchanged_documents(app):
+    backend = get_backend()
+    offer = offers_factories.StockFactory().offer
+    with requests_mock.Mocker() as mock:
+        posted = mock.post(requests_mock.ANY, json=[{"errors": []}])
+        backend.index_offers([offer])
+        backend.index_offers([offer], force=True)
+    assert posted.call_count == 2
+
+
+def test_unindex_offer_ids_forgets_hashes(app):
+    backend = get_backend()
+    app.redis_client.set("search:appsearch:offer-document-hash:1", "abc")
+    app.redis_client.set("search:appsearch:offer-document-hash:2", "def")
+    with requests_mock.Mocker() as mock:
+        mock.delete(requests_mock.ANY)
+        backend.unindex_offer_ids([1])
+    assert not app.redis_client.exists("search:appsearch:offer-document-hash:1")
+    assert app.redis_client.get("search:appsearch:offer-document-hash:2") == "def"
+
+
+def test_forget_all_document_hashes(app):
+    backend = get_backend()
+    app.redis_client.set("search:appsearch:offer-document-hash:1", "abc")
+    app.redis_client.set("search:appsearch:venue-document-hash:1", "def")
+    backend._forget_all_document_hashes(appsearch.REDIS_OFFER_DOCUMENT_HASH)
+    assert not app.redis_client.exists("search:appsearch:offer-document-hash:1")
+    assert app.redis_client.exists("search:appsearch:venue-document-hash:1")
+
+
 def test_unindex_offer_ids(app):
     backend = get_backend()
     app.redis_client.sadd("search:appsearch:indexed-offer-ids", "1")
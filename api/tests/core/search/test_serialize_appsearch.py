@@ -3,14 +3,12 @@ import decimal
 import json
 
 import pytest
-from sqlalchemy.orm import joinedload
 
 from pcapi.core.categories import subcategories
-import pcapi.core.offerers.models as offerers_models
 import pcapi.core.offers.factories as offers_factories
-import pcapi.core.offers.models as offers_models
 from pcapi.core.search.backends import appsearch
 from pcapi.core.testing import assert_num_queries
+from pcapi.repository import offer_queries
 from pcapi.utils.human_ids import humanize
 
 
@@ -123,22 +121,10 @@ def test_app_search_json_encoder_dates():
 
 def test_check_number_of_sql_queries():
     offer = offers_factories.OfferFactory()
-    # FIXME (dbaty, 2021-07-05): we should put these `joinedload` in a
-    # function, and call that function from `_reindex_offer_ids()`
-    # where we fetch offers.
-    offer = (
-        offers_models.Offer.query.options(
-            joinedload(offers_models.Offer.venue).joinedload(offerers_models.Venue.managingOfferer)
-        )
-        .options(joinedload(offers_models.Offer.criteria))
-        .options(joinedload(offers_models.Offer.mediations))
-        .options(joinedload(offers_models.Offer.product))
-        .options(joinedload(offers_models.Offer.stocks))
-        .one()
-    )
+    offer = offer_queries.get_offers_for_indexation([offer.id])[0]
 
-    # Make sure that the JOINs above are enough to avoid any extra SQL
-    # query below where serializing an offer.
+    # Make sure that the loader fetches everything needed to avoid
+    # any extra SQL query below when serializing an offer.
     with assert_num_queries(0):
         appsearch.AppSearchBackend().serialize_offer(offer)
 
@@ -36,9 +36,15 @@ def test_update_external_user():
     n_query_get_deposit = 1
     n_query_is_pro = 1
     n_query_get_last_favorite = 1
+    n_query_get_feature = 1  # USE_DENORMALIZED_DEPOSIT_SPENDING
 
     with assert_num_queries(
-        n_query_get_user + n_query_get_bookings + n_query_get_deposit + n_query_is_pro + n_query_get_last_favorite
+        n_query_get_user
+        + n_query_get_bookings
+        + n_query_get_deposit
+        + n_query_is_pro
+        + n_query_get_last_favorite
+        + n_query_get_feature
     ):
         update_external_user(user)
 
@@ -77,9 +83,15 @@ def test_get_user_attributes():
     n_query_get_deposit = 1
     n_query_is_pro = 1
     n_query_get_last_favorite = 1
+    n_query_get_feature = 1  # USE_DENORMALIZED_DEPOSIT_SPENDING
 
     with assert_num_queries(
-        n_query_get_user + n_query_get_bookings + n_query_get_deposit + n_query_is_pro + n_query_get_last_favorite
+        n_query_get_user
+        + n_query_get_bookings
+        + n_query_get_deposit
+        + n_query_is_pro
+        + n_query_get_last_favorite
+        + n_query_get_feature
     ):
         attributes = get_user_attributes(user)
 
@@ -736,6 +736,35 @@ class DomainsCreditTest:
 
         assert not get_domains_credit(user)
 
+    @override_features(USE_DENORMALIZED_DEPOSIT_SPENDING=True)
+    def test_get_domains_credit_from_denormalized_spending(self):
+        user = users_factories.BeneficiaryGrant18Factory(deposit__version=1)
+        bookings_factories.IndividualBookingFactory(
+            individualBooking__user=user,
+            amount=80,
+            stock__offer__subcategoryId=subcategories.JEU_EN_LIGNE.id,
+            stock__offer__url="http://on.line",
+        )
+        booking = bookings_factories.IndividualBookingFactory(
+            individualBooking__user=user,
+            amount=150,
+            stock__offer__subcategoryId=subcategories.JEU_SUPPORT_PHYSIQUE.id,
+        )
+        booking.cancel_booking()
+        bookings_factories.UsedIndividualBookingFactory(
+            individualBooking__user=user,
+            amount=20,
+            stock__offer__subcategoryId=subcategories.JEU_SUPPORT_PHYSIQUE.id,
+        )
+
+        assert get_domains_credit(user) == DomainsCredit(
+            all=Credit(initial=Decimal(500), remaining=Decimal(400)),
+            digital=Credit(initial=Decimal(200), remaining=Decimal(120)),
+            physical=Credit(initial=Decimal(200), remaining=Decimal(180)),
+        )
+        assert user.wallet_balance == 400
+        assert user.real_wallet_balance == 480
+
 
 @pytest.mark.usefixtures("db_session")
 class UpdateBeneficiaryMandatoryInformationTest:
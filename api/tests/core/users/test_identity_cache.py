@@ -0,0 +1,37 @@
+import pytest
+
+from pcapi.core import testing
+from pcapi.core.users import api as users_api
+from pcapi.core.users import constants as users_constants
+from pcapi.core.users import factories as users_factories
+from pcapi.core.users import identity_cache
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+class UserSessionExistsTest:
+    def test_session_is_cached(self, app):
+        user = users_factories.UserFactory()
+        session = users_factories.UserSessionFactory(user=user)
+
+        assert identity_cache.user_session_exists(user.id, session.uuid)
+        with testing.assert_num_queries(0):
+            assert identity_cache.user_session_exists(user.id, session.uuid)
+
+    def test_unknown_session(self, app):
+        user = users_factories.UserFactory()
+        other_session = users_factories.UserSessionFactory(user=users_factories.UserFactory())
+
+        assert not identity_cache.user_session_exists(user.id, other_session.uuid)
+        assert not identity_cache.user_session_exists(user.id, None)
+
+    def test_sessions_are_forgotten_on_suspension(self, app):
+        admin = users_factories.AdminFactory()
+        user = users_factories.UserFactory()
+        session = users_factories.UserSessionFactory(user=user)
+        assert identity_cache.user_session_exists(user.id, session.uuid)
+
+        users_api.suspend_account(user, users_constants.SuspensionReason.FRAUD, admin)
+
+        assert not identity_cache.user_session_exists(user.id, session.uuid)
@@ -11,6 +11,7 @@ import pcapi.core.payments.factories as payments_factories
 from pcapi.core.testing import assert_num_queries
 from pcapi.domain.payments import generate_payment_details_csv
 from pcapi.domain.payments import generate_wallet_balances_csv
+from pcapi.domain.payments import iter_wallet_balances_csv
 from pcapi.models.payment import Payment
 from pcapi.models.wallet_balance import WalletBalance
 from pcapi.utils.human_ids import humanize
@@ -205,6 +206,16 @@ class WalletBalancesCSVTest:
         # Then
         assert _count_non_empty_lines(csv) == 4
 
+    def test_iter_wallet_balances_csv_yields_header_then_batches(self):
+        balances = (WalletBalance(user_id, Decimal(100), Decimal(50)) for user_id in (1, 2, 3))
+
+        chunks = list(iter_wallet_balances_csv(balances, batch_size=2))
+
+        assert [_count_non_empty_lines(chunk) for chunk in chunks] == [1, 2, 1]
+        assert "".join(chunks) == generate_wallet_balances_csv(
+            [WalletBalance(user_id, Decimal(100), Decimal(50)) for user_id in (1, 2, 3)]
+        )
+
 
 def _get_header(csv):
     return csv.split("\n")[0]
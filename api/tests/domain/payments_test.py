@@ -6,21 +6,21 @@ from freezegun import freeze_time
 import pytest
 
 import pcapi.core.bookings.factories as bookings_factories
+import pcapi.core.bookings.repository as booking_repository
 from pcapi.core.offerers.models import Offerer
 import pcapi.core.offers.factories as offers_factories
+import pcapi.core.payments.api as payments_api
 import pcapi.core.payments.factories as payments_factories
 import pcapi.core.users.factories as users_factories
 from pcapi.domain.payments import PaymentDetails
 from pcapi.domain.payments import UnmatchedPayments
 from pcapi.domain.payments import _set_end_to_end_id_and_group_into_transactions
 from pcapi.domain.payments import apply_banishment
-from pcapi.domain.payments import create_payment_for_booking
-from pcapi.domain.payments import filter_out_already_paid_for_bookings
-from pcapi.domain.payments import filter_out_bookings_without_cost
+from pcapi.domain.payments import create_payment_row_for_booking_row
 from pcapi.domain.payments import generate_venues_csv
 from pcapi.domain.payments import keep_only_not_processable_payments
 from pcapi.domain.payments import make_transaction_label
-from pcapi.domain.reimbursement import BookingReimbursement
+from pcapi.domain.reimbursement import BookingRowReimbursement
 from pcapi.domain.reimbursement import PhysicalOffersReimbursement
 from pcapi.model_creators.generic_creators import create_booking
 from pcapi.model_creators.generic_creators import create_offerer
@@ -35,137 +35,67 @@ from pcapi.repository import payment_queries
 from pcapi.utils.human_ids import humanize
 
 
+def _get_payment_row(booking, rule, reimbursed_amount):
+    (row,) = booking_repository.find_booking_rows_eligible_for_payment_for_venue(
+        booking.venueId, datetime.utcnow() + timedelta(days=1)
+    )
+    reimbursement = BookingRowReimbursement(row, rule, reimbursed_amount)
+    batch_date = datetime.utcnow()
+    payment_row = create_payment_row_for_booking_row(reimbursement, batch_date, make_transaction_label(batch_date))
+    return dict(zip(payments_api.PAYMENT_COPY_COLUMNS, payment_row))
+
+
 @freeze_time("2021-01-01 12:00:00")
 @pytest.mark.usefixtures("db_session")
-class CreatePaymentForBookingTest:
+class CreatePaymentRowForBookingRowTest:
     def test_basics(self):
         offerer = offers_factories.OffererFactory(name="offerer", siren="123456")
-        booking = bookings_factories.IndividualBookingFactory(stock__offer__venue__managingOfferer=offerer)
-        reimbursement = BookingReimbursement(booking, PhysicalOffersReimbursement(), Decimal(10))
-        batch_date = datetime.utcnow()
-
-        payment = create_payment_for_booking(reimbursement, batch_date)
-
-        assert payment.bookingId == booking.id
-        assert payment.amount == 10
-        assert payment.reimbursementRule == PhysicalOffersReimbursement().description
-        assert payment.reimbursementRate == PhysicalOffersReimbursement().rate
-        assert payment.comment is None
-        assert payment.author == "batch"
-        assert payment.transactionLabel == "pass Culture Pro - remboursement 1ère quinzaine 01-2021"
-        assert payment.batchDate == batch_date
-        assert payment.iban is None
-        assert payment.bic is None
-        assert payment.recipientName == "offerer"
-        assert payment.recipientSiren == "123456"
+        booking = bookings_factories.UsedIndividualBookingFactory(stock__offer__venue__managingOfferer=offerer)
+
+        payment = _get_payment_row(booking, PhysicalOffersReimbursement(), Decimal(10))
+
+        assert payment["bookingId"] == booking.id
+        assert payment["amount"] == 10
+        assert payment["reimbursementRule"] == PhysicalOffersReimbursement().description
+        assert payment["reimbursementRate"] == PhysicalOffersReimbursement().rate
+        assert payment["customReimbursementRuleId"] is None
+        assert payment["author"] == "batch"
+        assert payment["transactionLabel"] == "pass Culture Pro - remboursement 1ère quinzaine 01-2021"
+        assert payment["batchDate"] == datetime.utcnow()
+        assert payment["iban"] is None
+        assert payment["bic"] is None
+        assert payment["recipientName"] == "offerer"
+        assert payment["recipientSiren"] == "123456"
 
     def test_use_iban_and_bic_from_venue(self):
-        booking = bookings_factories.IndividualBookingFactory()
+        booking = bookings_factories.UsedIndividualBookingFactory()
         offers_factories.BankInformationFactory(venue=booking.venue, iban="iban1", bic="bic1")
         offers_factories.BankInformationFactory(offerer=booking.offerer, iban="iban2", bic="bic2")
-        reimbursement = BookingReimbursement(booking, PhysicalOffersReimbursement(), Decimal(10))
-        batch_date = datetime.utcnow()
 
-        payment = create_payment_for_booking(reimbursement, batch_date)
+        payment = _get_payment_row(booking, PhysicalOffersReimbursement(), Decimal(10))
 
-        assert payment.iban == "IBAN1"
-        assert payment.bic == "BIC1"
+        assert payment["iban"] == "IBAN1"
+        assert payment["bic"] == "BIC1"
 
     def test_use_iban_and_bic_from_offerer(self):
-        booking = bookings_factories.IndividualBookingFactory()
+        booking = bookings_factories.UsedIndividualBookingFactory()
         offers_factories.BankInformationFactory(offerer=booking.offerer, iban="iban", bic="bic")
-        reimbursement = BookingReimbursement(booking, PhysicalOffersReimbursement(), Decimal(10))
-        batch_date = datetime.utcnow()
 
-        payment = create_payment_for_booking(reimbursement, batch_date)
+        payment = _get_payment_row(booking, PhysicalOffersReimbursement(), Decimal(10))
 
-        assert payment.iban == "IBAN"
-        assert payment.bic == "BIC"
+        assert payment["iban"] == "IBAN"
+        assert payment["bic"] == "BIC"
 
     def test_with_custom_reimbursement_rule(self):
-        booking = bookings_factories.IndividualBookingFactory()
+        booking = bookings_factories.UsedIndividualBookingFactory()
         rule = payments_factories.CustomReimbursementRuleFactory(offer=booking.stock.offer, amount=2)
-        reimbursement = BookingReimbursement(booking, rule, Decimal(2))
-        batch_date = datetime.utcnow()
-
-        payment = create_payment_for_booking(reimbursement, batch_date)
-        assert payment.amount == 2
-        assert payment.customReimbursementRuleId == rule.id
-        assert payment.reimbursementRate is None
-        assert payment.reimbursementRule is None
-
-
-class FilterOutAlreadyPaidForBookingsTest:
-    def test_it_returns_reimbursements_on_bookings_with_no_existing_payments(self):
-        # Given
-        booking_paid = Booking()
-        booking_paid.payments = [Payment()]
-        booking_reimbursement1 = BookingReimbursement(booking_paid, PhysicalOffersReimbursement(), Decimal(10))
-        booking_not_paid = Booking()
-        booking_reimbursement2 = BookingReimbursement(booking_not_paid, PhysicalOffersReimbursement(), Decimal(10))
-        booking_reimbursements = [booking_reimbursement1, booking_reimbursement2]
-
-        # When
-        bookings_not_paid = filter_out_already_paid_for_bookings(booking_reimbursements)
-
-        # Then
-        assert len(bookings_not_paid) == 1
-        assert not bookings_not_paid[0].booking.payments
 
-    def test_it_returns_an_empty_list_if_everything_has_been_reimbursed(self):
-        # Given
-        booking_paid1 = Booking()
-        booking_paid1.payments = [Payment()]
-        booking_reimbursement1 = BookingReimbursement(booking_paid1, PhysicalOffersReimbursement(), Decimal(10))
+        payment = _get_payment_row(booking, rule, Decimal(2))
 
-        booking_paid2 = Booking()
-        booking_paid2.payments = [Payment()]
-        booking_reimbursement2 = BookingReimbursement(booking_paid2, PhysicalOffersReimbursement(), Decimal(10))
-
-        # When
-        bookings_not_paid = filter_out_already_paid_for_bookings([booking_reimbursement1, booking_reimbursement2])
-
-        # Then
-        assert bookings_not_paid == []
-
-    def test_it_returns_an_empty_list_if_an_empty_list_is_given(self):
-        # When
-        bookings_not_paid = filter_out_already_paid_for_bookings([])
-
-        # Then
-        assert bookings_not_paid == []
-
-
-class FilterOutBookingsWithoutCostTest:
-    def test_it_returns_reimbursements_on_bookings_with_reimbursed_value_greater_than_zero(self):
-        # given
-        reimbursement1 = BookingReimbursement(Booking(), PhysicalOffersReimbursement(), Decimal(10))
-        reimbursement2 = BookingReimbursement(Booking(), PhysicalOffersReimbursement(), Decimal(0))
-
-        # when
-        bookings_reimbursements_with_cost = filter_out_bookings_without_cost([reimbursement1, reimbursement2])
-
-        # then
-        assert len(bookings_reimbursements_with_cost) == 1
-        assert bookings_reimbursements_with_cost[0].reimbursed_amount > Decimal(0)
-
-    def test_it_returns_an_empty_list_if_everything_has_a_cost(self):
-        # given
-        reimbursement1 = BookingReimbursement(Booking(), PhysicalOffersReimbursement(), Decimal(0))
-        reimbursement2 = BookingReimbursement(Booking(), PhysicalOffersReimbursement(), Decimal(0))
-
-        # when
-        bookings_reimbursements_with_cost = filter_out_bookings_without_cost([reimbursement1, reimbursement2])
-
-        # then
-        assert bookings_reimbursements_with_cost == []
-
-    def test_it_returns_an_empty_list_if_an_empty_list_is_given(self):
-        # when
-        bookings_reimbursements_with_cost = filter_out_bookings_without_cost([])
-
-        # then
-        assert bookings_reimbursements_with_cost == []
+        assert payment["amount"] == 2
+        assert payment["customReimbursementRuleId"] == rule.id
+        assert payment["reimbursementRate"] is None
+        assert payment["reimbursementRule"] is None
 
 
 class KeepOnlyNotProcessablePaymentsTest:
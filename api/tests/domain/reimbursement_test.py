@@ -1,3 +1,4 @@
+import collections
 from datetime import datetime
 from datetime import timedelta
 from decimal import Decimal
@@ -16,6 +17,33 @@ from pcapi.models import Booking
 from pcapi.repository import repository
 
 
+BookingRow = collections.namedtuple(
+    "BookingRow", ["offerId", "offererId", "subcategoryId", "isEducational", "dateUsed", "amount", "quantity"]
+)
+
+
+def find_reimbursements(bookings):
+    # Compute reimbursements on rows, as `generate_new_payments()`
+    # does, but return them along with each booking.
+    rows = [
+        BookingRow(
+            booking.stock.offerId,
+            booking.offererId,
+            booking.stock.offer.subcategoryId,
+            booking.stock.offer.isEducational,
+            booking.dateUsed,
+            booking.amount,
+            booking.quantity,
+        )
+        for booking in bookings
+    ]
+    row_reimbursements = reimbursement.find_all_booking_row_reimbursements(rows, reimbursement.CustomRuleFinder())
+    return [
+        reimbursement.BookingReimbursement(booking, r.rule, r.reimbursed_amount)
+        for booking, r in zip(bookings, row_reimbursements)
+    ]
+
+
 def create_non_digital_thing_booking(quantity=1, price=10, user=None, date_used=None, product_subcategory_id=None):
     booking_kwargs = {}
     if user:
@@ -408,8 +436,9 @@ class ReimbursementRuleIsActiveTest:
 @pytest.mark.usefixtures("db_session")
 class FindAllBookingsReimbursementsTest:
     # In all tests below, bookings do not have the same venue.
-    # However, we call `find_all_booking_reimbursements()` with these
-    # bookings, which tricks the function into thinking that they do.
+    # However, we compute reimbursements of these bookings together,
+    # which tricks `find_all_booking_row_reimbursements()` into
+    # thinking that they do.
     # It makes tests code simpler (since we don't have to specify
     # the venue for each booking).
 
@@ -422,7 +451,7 @@ class FindAllBookingsReimbursementsTest:
         educational = bookings_factories.UsedEducationalBookingFactory()
         bookings = [event, thing, digital, book, educational]
 
-        reimbursements = reimbursement.find_all_booking_reimbursements(bookings, reimbursement.CustomRuleFinder())
+        reimbursements = find_reimbursements(bookings)
 
         assert_total_reimbursement(reimbursements[0], reimbursement.PhysicalOffersReimbursement, event)
         assert_total_reimbursement(reimbursements[1], reimbursement.PhysicalOffersReimbursement, thing)
@@ -441,7 +470,7 @@ class FindAllBookingsReimbursementsTest:
         educational = bookings_factories.UsedEducationalBookingFactory()
         bookings = [event1, event2, thing, digital, book, educational]
 
-        reimbursements = reimbursement.find_all_booking_reimbursements(bookings, reimbursement.CustomRuleFinder())
+        reimbursements = find_reimbursements(bookings)
 
         assert_total_reimbursement(reimbursements[0], reimbursement.PhysicalOffersReimbursement, event1)
         rule = reimbursement.LegacyPreSeptember2021ReimbursementRateByVenueBetween20000And40000
@@ -462,7 +491,7 @@ class FindAllBookingsReimbursementsTest:
         educational = bookings_factories.UsedEducationalBookingFactory()
         bookings = [event1, event2, thing, digital, book, educational]
 
-        reimbursements = reimbursement.find_all_booking_reimbursements(bookings, reimbursement.CustomRuleFinder())
+        reimbursements = find_reimbursements(bookings)
 
         assert_partial_reimbursement(
             reimbursements[0],
@@ -497,7 +526,7 @@ class FindAllBookingsReimbursementsTest:
         educational = bookings_factories.UsedEducationalBookingFactory()
         bookings = [event1, event2, thing, digital, book, educational]
 
-        reimbursements = reimbursement.find_all_booking_reimbursements(bookings, reimbursement.CustomRuleFinder())
+        reimbursements = find_reimbursements(bookings)
 
         assert_partial_reimbursement(
             reimbursements[0],
@@ -524,7 +553,7 @@ class FindAllBookingsReimbursementsTest:
         educational = bookings_factories.UsedEducationalBookingFactory()
         bookings = [event, thing, digital, book, educational]
 
-        reimbursements = reimbursement.find_all_booking_reimbursements(bookings, reimbursement.CustomRuleFinder())
+        reimbursements = find_reimbursements(bookings)
 
         assert_total_reimbursement(reimbursements[0], reimbursement.PhysicalOffersReimbursement, event)
         assert_total_reimbursement(reimbursements[1], reimbursement.PhysicalOffersReimbursement, thing)
@@ -550,7 +579,7 @@ class FindAllBookingsReimbursementsTest:
         educational = bookings_factories.UsedEducationalBookingFactory()
         bookings = [reimbursed_digital1, reimbursed_digital2, thing, digital, book, educational]
 
-        reimbursements = reimbursement.find_all_booking_reimbursements(bookings, reimbursement.CustomRuleFinder())
+        reimbursements = find_reimbursements(bookings)
 
         assert_total_reimbursement(
             reimbursements[0],
@@ -575,7 +604,7 @@ class FindAllBookingsReimbursementsTest:
         educational = bookings_factories.UsedEducationalBookingFactory()
         bookings = [event1, event2, thing, digital, book, educational]
 
-        reimbursements = reimbursement.find_all_booking_reimbursements(bookings, reimbursement.CustomRuleFinder())
+        reimbursements = find_reimbursements(bookings)
 
         assert_partial_reimbursement(
             reimbursements[0], event1, reimbursement.ReimbursementRateByVenueBetween20000And40000, 0.95 * 40000
@@ -601,7 +630,7 @@ class FindAllBookingsReimbursementsTest:
         educational = bookings_factories.UsedEducationalBookingFactory()
         bookings = [event1, event2, thing, digital, book, educational]
 
-        reimbursements = reimbursement.find_all_booking_reimbursements(bookings, reimbursement.CustomRuleFinder())
+        reimbursements = find_reimbursements(bookings)
 
         assert_partial_reimbursement(
             reimbursements[0], event1, reimbursement.ReimbursementRateByVenueBetween40000And150000, 0.92 * 150000
@@ -619,7 +648,7 @@ class FindAllBookingsReimbursementsTest:
         educational = bookings_factories.UsedEducationalBookingFactory()
         bookings = [booking1, booking2, educational]
 
-        reimbursements = reimbursement.find_all_booking_reimbursements(bookings, reimbursement.CustomRuleFinder())
+        reimbursements = find_reimbursements(bookings)
 
         assert_total_reimbursement(reimbursements[0], reimbursement.PhysicalOffersReimbursement, booking1)
         assert_total_reimbursement(reimbursements[1], reimbursement.PhysicalOffersReimbursement, booking2)
@@ -637,7 +666,7 @@ class FindAllBookingsReimbursementsTest:
         )
         educational = bookings_factories.UsedEducationalBookingFactory()
         bookings = [booking1, booking2, educational]
-        reimbursements = reimbursement.find_all_booking_reimbursements(bookings, reimbursement.CustomRuleFinder())
+        reimbursements = find_reimbursements(bookings)
 
         assert reimbursements[0].booking == booking1
         assert reimbursements[0].rule == rule1
@@ -699,6 +728,62 @@ class CustomRuleFinderTest:
         assert finder.get_rule(booking4) is None  # no rule for this offerer
 
 
+class FindAllBookingRowReimbursementsTest:
+    def test_same_reimbursements_as_trying_every_rule(self):
+        # Go through all revenue brackets, before and after the new
+        # rules of September 2021, with all kinds of offers.
+        offers = [
+            (subcategories.SEANCE_CINE.id, False),
+            (subcategories.LIVRE_PAPIER.id, False),
+            (subcategories.LIVRE_PAPIER.id, True),
+            (subcategories.VOD.id, False),
+            (subcategories.ATELIER_PRATIQUE_ART.id, True),
+        ]
+        rows = []
+        # The cumulative revenue is reset every year.
+        for date_used in (reimbursement.SEPTEMBER_2021 - timedelta(days=1), datetime(2022, 1, 15)):
+            for i in range(300):
+                subcategory_id, is_educational = offers[i % len(offers)]
+                rows.append(BookingRow(1, 2, subcategory_id, is_educational, date_used, Decimal(1000), i % 2 + 1))
+        bookings = [reimbursement._make_fake_booking(*row) for row in rows]
+        finder = reimbursement.CustomRuleFinder(rules=[])
+
+        expected = []
+        revenue_per_year = collections.defaultdict(Decimal)
+        for row, booking in zip(rows, bookings):
+            offer = booking.stock.offer
+            if (
+                reimbursement.is_relevant_for_standard_reimbursement_rule(offer)
+                or offer.subcategory.reimbursement_rule == subcategories.ReimbursementRuleChoices.BOOK.value
+            ):
+                revenue_per_year[row.dateUsed.year] += booking.total_amount
+            rule = reimbursement.get_reimbursement_rule(booking, finder, revenue_per_year[row.dateUsed.year])
+            expected.append((row, type(rule), rule.apply(booking)))
+
+        reimbursements = reimbursement.find_all_booking_row_reimbursements(rows, finder)
+
+        assert [(r.row, type(r.rule), r.reimbursed_amount) for r in reimbursements] == expected
+        assert {type(r.rule) for r in reimbursements} == {type(rule) for rule in reimbursement.REGULAR_RULES}
+
+    @pytest.mark.usefixtures("db_session")
+    def test_custom_rule(self):
+        date_used = datetime.utcnow()
+        offer = offers_factories.ThingOfferFactory(subcategoryId=subcategories.SEANCE_CINE.id)
+        rule = payments_factories.CustomReimbursementRuleFactory(offer=offer, amount=7)
+        finder = reimbursement.CustomRuleFinder()
+        rows = [
+            BookingRow(offer.id, 2, subcategories.SEANCE_CINE.id, False, date_used, Decimal(10), 2),
+            BookingRow(offer.id + 1, 2, subcategories.SEANCE_CINE.id, False, date_used, Decimal(10), 2),
+        ]
+
+        reimbursements = reimbursement.find_all_booking_row_reimbursements(rows, finder)
+
+        assert reimbursements[0].rule == rule
+        assert reimbursements[0].reimbursed_amount == 14  # 2 (quantity) * 7 (rule.amount)
+        assert isinstance(reimbursements[1].rule, reimbursement.PhysicalOffersReimbursement)
+        assert reimbursements[1].reimbursed_amount == 20
+
+
 def assert_total_reimbursement(booking_reimbursement, rule, booking):
     assert booking_reimbursement.booking == booking
     assert isinstance(booking_reimbursement.rule, rule)
@@ -28,3 +28,13 @@ def test_make_wallet_balances_email():
         assert zf.namelist() == [expected_csv_name]
         csv_in_zip_file = zf.open(expected_csv_name).read().decode("utf-8")
         assert csv_in_zip_file == csv
+
+
+def test_make_wallet_balances_email_from_csv_chunks():
+    chunks = ['"header A","header B"\n', '"part A","part B"\n', '"part C","part D"\n']
+
+    email = make_wallet_balances_email(iter(chunks))
+
+    zip_content = base64.b64decode(email["Attachments"][0]["Content"])
+    with zipfile.ZipFile(io.BytesIO(zip_content)) as zf:
+        assert zf.read(zf.namelist()[0]).decode("utf-8") == "".join(chunks)
@@ -7,6 +7,7 @@ import pcapi.core.bookings.factories as booking_factories
 from pcapi.core.categories import subcategories
 from pcapi.core.offers.factories import EventOfferFactory
 from pcapi.core.offers.factories import EventStockFactory
+from pcapi.core.offers.factories import MediationFactory
 from pcapi.core.offers.factories import ThingOfferFactory
 from pcapi.core.offers.factories import ThingStockFactory
 from pcapi.core.users.factories import BeneficiaryGrant18Factory
@@ -165,6 +166,31 @@ class BeneficiaryBookingsSQLRepositoryTest:
         assert len(result.bookings) == 3
         assert set(booking.id for booking in result.bookings) == {booking1.id, booking2.id, booking3.id}
 
+    @pytest.mark.usefixtures("db_session")
+    def test_should_group_mediations_and_stocks_by_offer(self, app):
+        # Given
+        beneficiary = BeneficiaryGrant18Factory()
+        offer1 = ThingOfferFactory()
+        offer2 = ThingOfferFactory()
+        stock1 = ThingStockFactory(offer=offer1)
+        stock2 = ThingStockFactory(offer=offer2)
+        deleted_stock = ThingStockFactory(offer=offer2, isSoftDeleted=True)
+        mediation1 = MediationFactory(offer=offer1)
+        MediationFactory(offer=offer1, isActive=False)
+        booking_factories.IndividualBookingFactory(individualBooking__user=beneficiary, stock=stock1)
+        booking_factories.IndividualBookingFactory(individualBooking__user=beneficiary, stock=stock2)
+
+        # When
+        result = BeneficiaryBookingsSQLRepository().get_beneficiary_bookings(beneficiary_id=beneficiary.id)
+
+        # Then
+        bookings = {booking.offerId: booking for booking in result.bookings}
+        assert [mediation.identifier for mediation in bookings[offer1.id].active_mediations] == [mediation1.id]
+        assert bookings[offer2.id].active_mediations == []
+        assert [stock.id for stock in result.get_stocks_of_offer(offer1.id)] == [stock1.id]
+        # Deleted stocks are listed too (as not bookable).
+        assert {stock.id for stock in result.get_stocks_of_offer(offer2.id)} == {stock2.id, deleted_stock.id}
+
 
 class GetStocksInformationTest:
     @pytest.mark.usefixtures("db_session")
@@ -1,13 +1,18 @@
 import pytest
 from sqlalchemy import Sequence
 
+import pcapi.core.offers.factories as offers_factories
+from pcapi.core.testing import assert_num_queries
+from pcapi.local_providers.chunk_manager import get_existing_pc_objs
 from pcapi.local_providers.chunk_manager import save_chunks
 from pcapi.model_creators.generic_creators import create_offerer
 from pcapi.model_creators.generic_creators import create_stock
 from pcapi.model_creators.generic_creators import create_venue
+from pcapi.model_creators.provider_creators import create_providable_info
 from pcapi.model_creators.specific_creators import create_offer_with_thing_product
 from pcapi.model_creators.specific_creators import create_product_with_thing_subcategory
 from pcapi.models import Offer
+from pcapi.models import Product
 from pcapi.models import Stock
 from pcapi.models.db import db
 from pcapi.repository import repository
@@ -127,3 +132,27 @@ class SaveChunksTest:
         assert len(offers) == 2
         assert any(offer.isDuo for offer in offers)
         assert Stock.query.count() == 1
+
+
+class GetExistingPcObjsTest:
+    @pytest.mark.usefixtures("db_session")
+    def test_fetch_objects_of_each_type_in_one_query(self):
+        # Given
+        product = offers_factories.ThingProductFactory(idAtProviders="1")
+        offer = offers_factories.OfferFactory(idAtProviders="1")
+        providable_infos = [
+            create_providable_info(Product, id_at_providers="1"),
+            create_providable_info(Product, id_at_providers="2"),
+            create_providable_info(Offer, id_at_providers="1"),
+        ]
+
+        # When
+        with assert_num_queries(2):
+            existing_objects = get_existing_pc_objs(providable_infos)
+
+        # Then
+        assert existing_objects == {
+            "1|Product": product,
+            "2|Product": None,
+            "1|Offer": offer,
+        }
@@ -169,6 +169,61 @@ class UpdateObjectsTest:
         assert new_product.name == "New Product"
         assert new_product.subcategoryId == subcategories.LIVRE_PAPIER.id
 
+    @patch("pcapi.core.object_storage.store_public_object")
+    @patch("tests.local_providers.provider_test_utils.TestLocalProviderWithThumb.__next__")
+    def test_restores_thumb_count_when_thumb_could_not_be_stored(self, next_function, mocked_store_public_object):
+        # Given
+        provider = offerers_factories.AllocineProviderFactory(localClass="TestLocalProviderWithThumb")
+        providable_info = create_providable_info(date_modified=datetime(2018, 1, 1))
+        offers_factories.ThingProductFactory(
+            dateModifiedAtLastProvider=datetime(2020, 1, 1),
+            lastProvider=provider,
+            idAtProviders=providable_info.id_at_providers,
+            thumbCount=0,
+        )
+        local_provider = provider_test_utils.TestLocalProviderWithThumb()
+        next_function.side_effect = [[providable_info]]
+        mocked_store_public_object.side_effect = ValueError("Storage is down")
+
+        # When
+        local_provider.updateObjects()
+
+        # Then
+        assert Product.query.one().thumbCount == 0
+        assert local_provider.checkedThumbs == 1
+        assert local_provider.createdThumbs == 0
+        assert local_provider.erroredThumbs == 1
+
+    def test_reads_ahead_and_restores_line_state(self):
+        # Given
+        provider = offerers_factories.AllocineProviderFactory(localClass="TestLocalProviderWithLineState")
+        offers_factories.ThingProductFactory(
+            dateModifiedAtLastProvider=datetime(2000, 1, 1),
+            lastProvider=provider,
+            idAtProviders="1",
+            name="Old product name",
+        )
+        lines = [
+            (create_providable_info(id_at_providers="1"), "Updated product"),
+            (create_providable_info(id_at_providers="2"), "Created product"),
+            (create_providable_info(id_at_providers="3"), "Another created product"),
+        ]
+        local_provider = provider_test_utils.TestLocalProviderWithLineState(lines)
+
+        # When
+        local_provider.updateObjects()
+
+        # Then
+        products = Product.query.order_by(Product.idAtProviders).all()
+        assert [(product.idAtProviders, product.name) for product in products] == [
+            ("1", "Updated product"),
+            ("2", "Created product"),
+            ("3", "Another created product"),
+        ]
+        assert local_provider.checkedObjects == 3
+        assert local_provider.createdObjects == 2
+        assert local_provider.updatedObjects == 1
+
 
 @pytest.mark.usefixtures("db_session")
 class CreateObjectTest:
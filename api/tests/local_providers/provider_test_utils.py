@@ -23,6 +23,26 @@ class TestLocalProvider(LocalProvider):
         pass
 
 
+class TestLocalProviderWithLineState(LocalProvider):
+    name = "LocalProvider Test With Line State"
+    can_create = True
+    line_state_attributes = ("product_name",)
+
+    def __init__(self, lines: list, venue_provider: VenueProvider = None):
+        super().__init__(venue_provider)
+        self.venue_provider = venue_provider
+        self.lines = iter(lines)
+        self.product_name = None
+
+    def fill_object_attributes(self, obj):
+        obj.name = self.product_name
+        obj.subcategoryId = subcategories.LIVRE_PAPIER.id
+
+    def __next__(self):
+        providable_info, self.product_name = next(self.lines)
+        return [providable_info]
+
+
 class TestLocalProviderWithApiErrors(LocalProvider):
     name = "LocalProvider Test"
     can_create = True
@@ -0,0 +1,102 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from pcapi.connectors.thumb_storage import ThumbPool
+from pcapi.core.offerers.factories import APIProviderFactory
+from pcapi.core.offerers.factories import VenueProviderFactory
+from pcapi.core.testing import override_settings
+from pcapi.local_providers import sync_scheduler
+from pcapi.models import db
+
+from tests.conftest import clean_database
+from tests.connectors.thumb_storage_test import IMAGE_PATH
+
+
+class SynchronizeVenueProvidersTest:
+    @pytest.mark.usefixtures("db_session")
+    def test_slowest_venue_providers_come_first(self, app):
+        provider = APIProviderFactory()
+        fast, slow, unknown = VenueProviderFactory.create_batch(3, provider=provider)
+        sync_scheduler.record_duration(fast.id, 1)
+        sync_scheduler.record_duration(slow.id, 10)
+        synchronized = []
+
+        sync_scheduler.synchronize_venue_providers([fast, slow, unknown], synchronized.append, workers=1)
+
+        assert synchronized == [unknown, slow, fast]
+        durations = sync_scheduler.get_estimated_durations([fast.id, slow.id, unknown.id])
+        assert set(durations) == {fast.id, slow.id, unknown.id}
+        assert durations[slow.id] < 10  # average of 10 and the duration of the last synchronization
+
+    def test_duration_history_is_bounded(self, app):
+        for duration in range(sync_scheduler.SYNC_DURATIONS_HISTORY_SIZE + 5):
+            sync_scheduler.record_duration(1, duration)
+
+        key = sync_scheduler.REDIS_SYNC_DURATIONS.format(venue_provider_id=1)
+        assert app.redis_client.llen(key) == sync_scheduler.SYNC_DURATIONS_HISTORY_SIZE
+
+    def test_concurrency_is_limited_per_provider(self, app):
+        venue_providers = [SimpleNamespace(id=i, providerId=i % 2) for i in range(10)]
+        lock = threading.Lock()
+        running = {0: 0, 1: 0}
+        max_running = {0: 0, 1: 0}
+        synchronized = []
+
+        def synchronize_in_worker(app, venue_provider_id, synchronize):
+            provider_id = venue_provider_id % 2
+            with lock:
+                running[provider_id] += 1
+                max_running[provider_id] = max(max_running[provider_id], running[provider_id])
+            time.sleep(0.01)
+            with lock:
+                running[provider_id] -= 1
+                synchronized.append(venue_provider_id)
+
+        with patch("pcapi.local_providers.sync_scheduler._synchronize_in_worker", synchronize_in_worker):
+            sync_scheduler.synchronize_venue_providers(
+                venue_providers, lambda venue_provider: None, workers=4, max_workers_per_provider=1
+            )
+
+        assert sorted(synchronized) == list(range(10))
+        assert max_running == {0: 1, 1: 1}
+
+    @override_settings(PROVIDERS_SYNC_MAX_WORKERS_PER_PROVIDER=0)
+    def test_limit_per_provider_is_at_least_one(self, app):
+        venue_providers = [SimpleNamespace(id=i, providerId=1) for i in range(3)]
+        synchronized = []
+
+        def synchronize_in_worker(app, venue_provider_id, synchronize):
+            synchronized.append(venue_provider_id)
+
+        with patch("pcapi.local_providers.sync_scheduler._synchronize_in_worker", synchronize_in_worker):
+            sync_scheduler.synchronize_venue_providers(venue_providers, lambda venue_provider: None, workers=2)
+
+        assert sorted(synchronized) == [0, 1, 2]
+
+    @clean_database
+    @patch("pcapi.core.object_storage.store_public_object")
+    def test_create_thumbs_in_worker_threads(self, mocked_store_public_object, app):
+        # Synchronizations create thumbs in worker processes, started
+        # from the worker threads (while other threads hold database
+        # connections and locks).
+        provider = APIProviderFactory()
+        venue_providers = VenueProviderFactory.create_batch(4, provider=provider)
+        db.session.commit()
+        lock = threading.Lock()
+        results = {}
+
+        def synchronize(venue_provider):
+            with ThumbPool(processes=1, threads=1, max_pending=1) as pool:
+                pool.submit(IMAGE_PATH.read_bytes(), [f"products/{venue_provider.id}"], context=venue_provider.id)
+                with lock:
+                    results.update(pool.collect())
+
+        sync_scheduler.synchronize_venue_providers(venue_providers, synchronize, workers=4, max_workers_per_provider=4)
+
+        assert results == {venue_provider.id: None for venue_provider in venue_providers}
+        stored_ids = {call.kwargs["object_id"] for call in mocked_store_public_object.call_args_list}
+        assert stored_ids == {f"products/{venue_provider.id}" for venue_provider in venue_providers}
@@ -5,11 +5,16 @@ import flask
 import pytest
 
 from pcapi.core.testing import assert_num_queries
+from pcapi.core.testing import override_settings
 from pcapi.models import db
+from pcapi.models import feature as feature_module
 from pcapi.models.feature import FEATURES_DISABLED_BY_DEFAULT
 from pcapi.models.feature import Feature
+from pcapi.models.feature import FeatureNotInstalled
 from pcapi.models.feature import FeatureToggle
 from pcapi.models.feature import install_feature_flags
+from pcapi.models.feature import invalidate_features_snapshot
+from pcapi.models.feature import publish_features_change
 from pcapi.repository import repository
 
 
@@ -22,6 +27,17 @@ class TestingFeatureToggle(enum.Enum):
 FEATURES_DISABLED_BY_DEFAULT_TEST = [TestingFeatureToggle.ENABLE_LANDING]
 
 
+@pytest.fixture(name="features_subscriber")
+def features_subscriber_fixture():
+    # The process snapshot subscribes to changes of feature flags from
+    # a daemon thread: stop it, so that it does not outlive the test.
+    yield
+    if feature_module._subscriber:
+        feature_module._subscriber.stop()
+        feature_module._subscriber.join()
+        feature_module._subscriber = None
+
+
 @pytest.mark.usefixtures("db_session")
 class FeatureToggleTest:
     def test_is_active_returns_true_when_feature_is_active(self):
@@ -57,7 +73,7 @@ class FeatureToggleTest:
         repository.save(feature)
         context = flask._request_ctx_stack.pop()
 
-        # we don't cache yet outside the scope of a request so it'll be 3 DB queries
+        # the snapshot of features is disabled in tests, so it'll be 3 DB queries
         try:
             with assert_num_queries(3):
                 FeatureToggle.WEBAPP_SIGNUP.is_active()
@@ -67,6 +83,55 @@ class FeatureToggleTest:
         finally:
             flask._request_ctx_stack.push(context)
 
+    @override_settings(FEATURES_SNAPSHOT_TTL=60)
+    def test_is_active_uses_process_snapshot(self, app, features_subscriber):
+        invalidate_features_snapshot()
+        context = flask._request_ctx_stack.pop()
+
+        try:
+            with assert_num_queries(1):
+                FeatureToggle.WEBAPP_SIGNUP.is_active()
+                FeatureToggle.QR_CODE.is_active()
+                FeatureToggle.WEBAPP_SIGNUP.is_active()
+        finally:
+            flask._request_ctx_stack.push(context)
+
+    @override_settings(FEATURES_SNAPSHOT_TTL=60)
+    def test_snapshot_is_reloaded_after_change(self, app, features_subscriber):
+        invalidate_features_snapshot()
+        feature = Feature.query.filter_by(name=FeatureToggle.WEBAPP_SIGNUP.name).first()
+        feature.isActive = True
+        repository.save(feature)
+        assert FeatureToggle.WEBAPP_SIGNUP.is_active()
+
+        feature.isActive = False
+        repository.save(feature)
+        assert FeatureToggle.WEBAPP_SIGNUP.is_active()  # snapshot has not expired yet
+
+        publish_features_change()
+        assert not FeatureToggle.WEBAPP_SIGNUP.is_active()
+
+    @override_settings(FEATURES_SNAPSHOT_TTL=60)
+    def test_snapshot_is_reloaded_when_feature_is_missing(self, app, features_subscriber):
+        invalidate_features_snapshot()
+        feature = Feature.query.filter_by(name=FeatureToggle.WEBAPP_SIGNUP.name).one()
+        db.session.delete(feature)
+        db.session.flush()
+        FeatureToggle.QR_CODE.is_active()  # take a snapshot without WEBAPP_SIGNUP
+
+        db.session.add(Feature(name=feature.name, description=feature.description, isActive=True))
+        db.session.flush()
+
+        assert FeatureToggle.WEBAPP_SIGNUP.is_active()
+
+    def test_is_active_raises_explicit_error_when_feature_is_not_installed(self):
+        Feature.query.filter_by(name=FeatureToggle.WEBAPP_SIGNUP.name).delete()
+
+        with pytest.raises(FeatureNotInstalled) as error:
+            FeatureToggle.WEBAPP_SIGNUP.is_active()
+
+        assert str(error.value) == "Feature flag WEBAPP_SIGNUP is not installed in the database"
+
 
 @pytest.mark.usefixtures("db_session")
 class FeatureTest:
@@ -22,10 +22,10 @@ from pcapi.models import Offer
 from pcapi.models import Stock
 from pcapi.repository import repository
 from pcapi.repository.offer_queries import _build_bookings_quantity_subquery
+from pcapi.repository.offer_queries import get_active_offer_id_batches
+from pcapi.repository.offer_queries import get_offer_id_batches_by_venue_id
 from pcapi.repository.offer_queries import get_offers_by_ids
 from pcapi.repository.offer_queries import get_offers_by_venue_id
-from pcapi.repository.offer_queries import get_paginated_active_offer_ids
-from pcapi.repository.offer_queries import get_paginated_offer_ids_by_venue_id
 
 
 class FindOffersTest:
@@ -199,86 +199,55 @@ class GetOffersByIdsTest:
         assert offer2 in offers
 
 
-class GetPaginatedActiveOfferIdsTest:
+class GetActiveOfferIdBatchesTest:
     @pytest.mark.usefixtures("db_session")
-    def test_should_return_two_offer_ids_from_first_page_when_limit_is_two_and_two_active_offers(self, app):
-        # Given
-        offerer = create_offerer()
-        venue = create_venue(offerer=offerer)
-        offer1 = create_offer_with_event_product(is_active=True, venue=venue)
-        offer2 = create_offer_with_event_product(is_active=True, venue=venue)
-        create_offer_with_thing_product(is_active=True, venue=venue)
-        create_offer_with_thing_product(is_active=True, venue=venue)
-        repository.save(offer1, offer2)
-
-        # When
-        offer_ids = get_paginated_active_offer_ids(limit=2, page=0)
-
-        # Then
-        assert set(offer_ids) == {offer1.id, offer2.id}
-
-    @pytest.mark.usefixtures("db_session")
-    def test_should_return_one_offer_id_from_second_page_when_limit_is_1_and_three_active_offers(self, app):
+    def test_should_return_active_offer_ids_by_batches(self, app):
         # Given
         offerer = create_offerer()
         venue = create_venue(offerer=offerer)
         offer1 = create_offer_with_event_product(is_active=True, venue=venue)
         offer2 = create_offer_with_event_product(is_active=False, venue=venue)
         offer3 = create_offer_with_thing_product(is_active=True, venue=venue)
-        create_offer_with_thing_product(is_active=True, venue=venue)
-        repository.save(offer1, offer2)
+        offer4 = create_offer_with_thing_product(is_active=True, venue=venue)
+        repository.save(offer1, offer2, offer3, offer4)
 
         # When
-        offer_ids = get_paginated_active_offer_ids(limit=1, page=1)
+        batches = list(get_active_offer_id_batches(batch_size=2))
 
         # Then
-        assert offer_ids == [offer3.id]
+        assert batches == [[offer1.id, offer3.id], [offer4.id]]
 
     @pytest.mark.usefixtures("db_session")
-    def test_should_return_one_offer_id_from_third_page_when_limit_is_1_and_three_active_offers(self, app):
+    def test_should_skip_offset_first_offers(self, app):
         # Given
         offerer = create_offerer()
         venue = create_venue(offerer=offerer)
         offer1 = create_offer_with_event_product(is_active=True, venue=venue)
         offer2 = create_offer_with_event_product(is_active=False, venue=venue)
-        create_offer_with_thing_product(is_active=True, venue=venue)
+        offer3 = create_offer_with_thing_product(is_active=True, venue=venue)
         offer4 = create_offer_with_thing_product(is_active=True, venue=venue)
-        repository.save(offer1, offer2)
+        repository.save(offer1, offer2, offer3, offer4)
 
         # When
-        offer_ids = get_paginated_active_offer_ids(limit=1, page=2)
+        batches = list(get_active_offer_id_batches(batch_size=1, offset=1))
 
         # Then
-        assert offer_ids == [offer4.id]
-
+        assert batches == [[offer3.id], [offer4.id]]
 
-class GetPaginatedOfferIdsByVenueIdTest:
-    @pytest.mark.usefixtures("db_session")
-    def test_should_return_one_offer_id_in_two_offers_from_first_page_when_limit_is_one(self, app):
-        # Given
-        offerer = create_offerer()
-        venue = create_venue(offerer=offerer)
-        offer1 = create_offer_with_event_product(venue=venue)
-        offer2 = create_offer_with_event_product(venue=venue)
-        repository.save(offer1, offer2)
-
-        # When
-        offer_ids = get_paginated_offer_ids_by_venue_id(venue_id=venue.id, limit=1, page=0)
-
-        # Then
-        assert offer_ids == [offer1.id]
 
+class GetOfferIdBatchesByVenueIdTest:
     @pytest.mark.usefixtures("db_session")
-    def test_should_return_one_offer_id_in_two_offers_from_second_page_when_limit_is_one(self, app):
+    def test_should_return_offer_ids_of_venue_by_batches(self, app):
         # Given
         offerer = create_offerer()
         venue = create_venue(offerer=offerer)
         offer1 = create_offer_with_event_product(venue=venue)
         offer2 = create_offer_with_event_product(venue=venue)
+        ThingOfferFactory()  # offer of another venue
         repository.save(offer1, offer2)
 
         # When
-        offer_ids = get_paginated_offer_ids_by_venue_id(venue_id=venue.id, limit=1, page=1)
+        batches = list(get_offer_id_batches_by_venue_id(venue.id, batch_size=1))
 
         # Then
-        assert offer_ids == [offer2.id]
+        assert batches == [[offer1.id], [offer2.id]]
@@ -2,6 +2,7 @@ from datetime import date
 from datetime import datetime
 from datetime import timedelta
 from decimal import Decimal
+from unittest import mock
 
 import pytest
 
@@ -13,6 +14,7 @@ from pcapi.core.payments import factories as payments_factories
 from pcapi.core.users import factories as users_factories
 from pcapi.models.payment_status import TransactionStatus
 from pcapi.repository.reimbursement_queries import find_all_offerer_payments
+from pcapi.repository.reimbursement_queries import find_all_offerers_payments_by_batches
 from pcapi.repository.reimbursement_queries import legacy_find_all_offerer_payments
 
 
@@ -296,6 +298,25 @@ class FindAllOffererPaymentsTest:
         assert payment_1.booking.token in payments[0]
         assert venue_1.name in payments[0]
 
+    @mock.patch("pcapi.repository.reimbursement_queries.PAYMENTS_BATCH_SIZE", 2)
+    def test_should_return_payments_by_batches(self, app):
+        # Given
+        offerer = OffererFactory()
+        statuses = payments_factories.PaymentStatusFactory.create_batch(
+            5, payment__booking__stock__offer__venue__managingOfferer=offerer, status=TransactionStatus.SENT
+        )
+        payments_factories.PaymentStatusFactory(
+            payment=statuses[0].payment, status=TransactionStatus.ERROR, date=datetime.utcnow() - timedelta(days=1)
+        )
+
+        # When
+        batches = list(find_all_offerers_payments_by_batches([offerer.id], reimbursement_period))
+
+        # Then
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        payment_ids = [payment.payment_id for batch in batches for payment in batch]
+        assert payment_ids == sorted((status.paymentId for status in statuses), reverse=True)
+
 
 class LegacyFindAllOffererPaymentsTest:
     @pytest.mark.usefixtures("db_session")
@@ -24,7 +24,7 @@ class GetAllUsersWalletBalancesTest:
         user2 = users_factories.BeneficiaryGrant18Factory()
 
         # when
-        balances = get_all_users_wallet_balances()
+        balances = list(get_all_users_wallet_balances())
 
         # then
         assert len(balances) == 2
@@ -38,7 +38,7 @@ class GetAllUsersWalletBalancesTest:
         repository.delete(user2.deposit)
 
         # when
-        balances = get_all_users_wallet_balances()
+        balances = list(get_all_users_wallet_balances())
 
         # then
         assert len(balances) == 1
@@ -58,13 +58,38 @@ class GetAllUsersWalletBalancesTest:
         bookings_factories.UsedIndividualBookingFactory(individualBooking__user=user, stock=stock3, quantity=2)
 
         # when
-        balances = get_all_users_wallet_balances()
+        balances = list(get_all_users_wallet_balances())
 
         # then
         balance = balances[0]
         assert balance.current_balance == 500 - (20 + 40 * 2)
         assert balance.real_balance == 500 - (40 * 2)
 
+    @pytest.mark.usefixtures("db_session")
+    def test_balances_are_zero_if_deposit_is_expired(self):
+        # given
+        user = users_factories.BeneficiaryGrant18Factory(deposit__expirationDate=datetime.now() - timedelta(days=1))
+        bookings_factories.UsedIndividualBookingFactory(individualBooking__user=user, stock__price=20)
+
+        # when
+        balances = list(get_all_users_wallet_balances())
+
+        # then
+        assert [(b.user_id, b.current_balance, b.real_balance) for b in balances] == [(user.id, 0, 0)]
+
+    @pytest.mark.usefixtures("db_session")
+    def test_balances_are_streamed_by_batches(self):
+        # given
+        users = users_factories.BeneficiaryGrant18Factory.create_batch(3)
+
+        # when
+        balances = list(get_all_users_wallet_balances(batch_size=2))
+
+        # then
+        assert [(b.user_id, b.current_balance, b.real_balance) for b in balances] == [
+            (user.id, user.deposit.amount, user.deposit.amount) for user in users
+        ]
+
 
 class FindProUsersByEmailProviderTest:
     @pytest.mark.usefixtures("db_session")
@@ -79,3 +79,27 @@ class SettingsTest:
             "isWebappV2Enabled": True,
             "enableNativeEacIndividual": True,
         }
+
+    def test_get_settings_not_modified(self, app):
+        client = TestClient(app.test_client())
+        response = client.get("/native/v1/settings")
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert response.headers["Cache-Control"] == "public, no-cache"
+
+        response = client.get("/native/v1/settings", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert not response.data
+
+    def test_get_settings_after_feature_change(self, app):
+        client = TestClient(app.test_client())
+        with override_features(WEBAPP_V2_ENABLED=False):
+            etag = client.get("/native/v1/settings").headers["ETag"]
+
+        with override_features(WEBAPP_V2_ENABLED=True):
+            response = client.get("/native/v1/settings", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert response.json["isWebappV2Enabled"] is True
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import pytest
+
+import pcapi.core.bookings.factories as bookings_factories
+import pcapi.core.offers.factories as offers_factories
+
+from tests.conftest import TestClient
+
+
+BOOKING_PERIOD_PARAMS = "bookingPeriodBeginningDate=2020-08-10&bookingPeriodEndingDate=2020-08-12"
+
+
+@pytest.mark.usefixtures("db_session")
+def test_should_stream_csv_report(app):
+    user_offerer = offers_factories.UserOffererFactory()
+    bookings_factories.BookingFactory.create_batch(
+        2,
+        dateCreated=datetime(2020, 8, 11, 12, 0),
+        stock__offer__venue__managingOfferer=user_offerer.offerer,
+    )
+
+    client = TestClient(app.test_client()).with_session_auth(user_offerer.user.email)
+    response = client.get(f"/bookings/csv?{BOOKING_PERIOD_PARAMS}")
+
+    assert response.status_code == 200
+    assert response.headers.getlist("Content-Type") == ["text/csv; charset=utf-8;"]
+    assert response.headers["Content-Disposition"] == "attachment; filename=reservations_pass_culture.csv"
+    assert response.data.startswith("\ufeff".encode("utf-8"))
+    rows = response.data.decode("utf-8-sig").splitlines()
+    assert len(rows) == 1 + 2  # header + bookings
@@ -0,0 +1,38 @@
+import pytest
+
+import pcapi.core.bookings.factories as bookings_factories
+import pcapi.core.offers.factories as offers_factories
+from pcapi.core.testing import override_features
+from pcapi.utils.human_ids import humanize
+
+from tests.conftest import TestClient
+
+
+@pytest.mark.usefixtures("db_session")
+@override_features(PERF_VENUE_STATS=True)
+def test_get_venues_stats(app):
+    user_offerer = offers_factories.UserOffererFactory()
+    venue = offers_factories.VenueFactory(managingOfferer=user_offerer.offerer)
+    other_venue = offers_factories.VenueFactory(managingOfferer=user_offerer.offerer)
+    booking = bookings_factories.BookingFactory(stock__offer__venue=venue)
+    bookings_factories.UsedBookingFactory(stock=booking.stock)
+
+    client = TestClient(app.test_client()).with_session_auth(user_offerer.user.email)
+    response = client.get(f"/offerers/{humanize(user_offerer.offerer.id)}/stats")
+
+    assert response.status_code == 200
+    stats_by_venue_id = {venue["id"]: venue["stats"] for venue in response.json["managedVenues"]}
+    assert stats_by_venue_id == {
+        humanize(venue.id): {
+            "activeBookingsQuantity": 1,
+            "validatedBookingsQuantity": 1,
+            "activeOffersCount": 1,
+            "soldOutOffersCount": 0,
+        },
+        humanize(other_venue.id): {
+            "activeBookingsQuantity": 0,
+            "validatedBookingsQuantity": 0,
+            "activeOffersCount": 0,
+            "soldOutOffersCount": 0,
+        },
+    }
@@ -85,6 +85,7 @@ class Returns200Test:
                     "name": offererVenue.name,
                     "postalCode": offererVenue.postalCode,
                     "publicName": offererVenue.publicName,
+                    "stats": None,
                     "venueLabelId": humanize(offererVenue.venueLabelId),
                     "venueTypeId": humanize(offererVenue.venueTypeId),
                     "visualDisabilityCompliant": False,
@@ -33,8 +33,9 @@ def test_with_user_linked_to_offerers(app):
 
     # Then
     assert response.status_code == 200
-    assert response.headers["Content-type"] == "text/csv; charset=utf-8;"
+    assert response.headers.getlist("Content-type") == ["text/csv; charset=utf-8;"]
     assert response.headers["Content-Disposition"] == "attachment; filename=remboursements_pass_culture.csv"
+    assert response.data.startswith("\ufeff".encode("utf-8"))
     rows = response.data.decode("utf-8").splitlines()
     assert len(rows) == 1 + 4  # header + payments
 
@@ -1,5 +1,6 @@
 from datetime import datetime
 from datetime import timedelta
+from unittest import mock
 
 import pytest
 
@@ -13,7 +14,9 @@ from pcapi.repository.reimbursement_queries import find_all_offerer_payments
 from pcapi.routes.serialization.reimbursement_csv_serialize import ReimbursementDetails
 from pcapi.routes.serialization.reimbursement_csv_serialize import _get_reimbursement_current_status_in_details
 from pcapi.routes.serialization.reimbursement_csv_serialize import find_all_offerer_reimbursement_details
+from pcapi.routes.serialization.reimbursement_csv_serialize import find_all_offerers_reimbursement_details_by_batches
 from pcapi.routes.serialization.reimbursement_csv_serialize import generate_reimbursement_details_csv
+from pcapi.routes.serialization.reimbursement_csv_serialize import stream_reimbursement_details_csv
 
 
 today = datetime.utcnow().date()
@@ -212,6 +215,28 @@ def test_generate_reimbursement_details_csv_educational_booking():
     )
 
 
+@pytest.mark.usefixtures("db_session")
+@mock.patch("pcapi.repository.reimbursement_queries.PAYMENTS_BATCH_SIZE", 2)
+def test_stream_reimbursement_details_csv_by_batches():
+    offerer = offers_factories.OffererFactory()
+    payments_factories.PaymentStatusFactory.create_batch(
+        3,
+        payment__booking__stock__offer__venue__managingOfferer=offerer,
+        payment__transactionLabel="pass Culture Pro - remboursement 1ère quinzaine 07-2019",
+        status=TransactionStatus.SENT,
+    )
+    reimbursement_details = find_all_offerers_reimbursement_details_by_batches([offerer.id], reimbursement_period)
+
+    chunks = list(stream_reimbursement_details_csv(reimbursement_details))
+
+    assert len(chunks) == 1 + 2  # header + 2 batches
+    assert chunks[0].startswith("\ufeff".encode("utf-8"))
+    assert [len(chunk.decode("utf-8-sig").splitlines()) for chunk in chunks] == [1, 2, 1]
+    assert b"".join(chunks).decode("utf-8-sig") == generate_reimbursement_details_csv(
+        find_all_offerer_reimbursement_details(offerer.id, reimbursement_period)
+    )
+
+
 @pytest.mark.usefixtures("db_session")
 def test_find_all_offerer_reimbursement_details():
     offerer = offers_factories.OffererFactory()
@@ -249,6 +249,8 @@ class CancelExpiredBookingsTest:
                 + 1  # release savepoint/COMMIT
                 + 1  # select stock
                 + 1  # recompute dnBookedQuantity
+                + 1  # select deposits
+                + 1  # recompute deposit spending
                 + 1  # select next ids
             )
         )
@@ -272,6 +274,7 @@ class CancelExpiredBookingsTest:
                 + 1  # release savepoint/COMMIT
                 + 1  # select stock
                 + 1  # recompute dnBookedQuantity
+                + 1  # select deposits (none, educational bookings have no deposit)
                 + 1  # select next ids
             )
         )
@@ -0,0 +1,94 @@
+from unittest import mock
+
+import pytest
+
+import pcapi.core.offers.factories as offers_factories
+from pcapi.core.search.backends.testing import TestingBackend
+import pcapi.core.search.testing as search_testing
+from pcapi.scripts import full_index_offers
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+def test_get_partitions():
+    offers = [offers_factories.OfferFactory() for _ in range(6)]
+    start, end = offers[0].id, offers[-1].id + 10
+
+    partitions = full_index_offers._get_partitions(start, end, 3)
+
+    assert partitions == [
+        (start, offers[1].id),
+        (offers[1].id + 1, offers[3].id),
+        (offers[3].id + 1, end),
+    ]
+
+
+@mock.patch("pcapi.scripts.full_index_offers._get_backend", lambda name: TestingBackend())
+def test_index_partition_resumes_from_checkpoint(app):
+    offer1 = offers_factories.StockFactory().offer
+    offer2 = offers_factories.StockFactory().offer
+    offer3 = offers_factories.StockFactory().offer
+    partition = (offer1.id, offer3.id)
+    checkpoints_key = full_index_offers._get_checkpoints_key("appsearch", offer1.id, offer3.id)
+    app.redis_client.hset(checkpoints_key, f"{offer1.id}-{offer3.id}", offer1.id)
+
+    failed = full_index_offers._index_partition("appsearch", checkpoints_key, partition)
+
+    assert failed == []
+    assert set(search_testing.search_store["offers"]) == {offer2.id, offer3.id}
+    checkpoint = app.redis_client.hget(checkpoints_key, f"{offer1.id}-{offer3.id}")
+    assert int(checkpoint) == offer3.id
+
+
+def test_prepare_run_resumes_only_the_same_range(app):
+    offers = [offers_factories.OfferFactory() for _ in range(6)]
+    start, end = offers[0].id, offers[-1].id
+    checkpoints_key, _ = full_index_offers._prepare_run("appsearch", start, end, 2, restart=False)
+    app.redis_client.hset(checkpoints_key, f"{start}-{offers[2].id}", offers[1].id)
+
+    # Run again on a failed sub-range: it has its own partitions.
+    sub_key, sub_checkpoints = full_index_offers._prepare_run("appsearch", offers[3].id, offers[4].id, 2, restart=False)
+    assert sub_key != checkpoints_key
+    assert sub_checkpoints == {
+        (offers[3].id, offers[3].id): offers[3].id - 1,
+        (offers[3].id + 1, offers[4].id): offers[3].id,
+    }
+
+    # Resume the first run.
+    _, resumed_checkpoints = full_index_offers._prepare_run("appsearch", start, end, 2, restart=False)
+    assert resumed_checkpoints == {
+        (start, offers[2].id): offers[1].id,
+        (offers[2].id + 1, end): offers[2].id,
+    }
+
+    # Restarting the sub-range does not touch the first run.
+    full_index_offers._prepare_run("appsearch", offers[3].id, offers[4].id, 2, restart=True)
+    assert full_index_offers._get_checkpoints(checkpoints_key) == resumed_checkpoints
+
+
+@mock.patch("pcapi.scripts.full_index_offers.RETRY_DELAY", 0)
+@mock.patch("pcapi.scripts.full_index_offers._get_backend")
+def test_index_partition_retries_failed_batches(mocked_get_backend, app):
+    offer = offers_factories.StockFactory().offer
+    backend = mocked_get_backend.return_value
+    backend.index_offers.side_effect = [ValueError("It does not work"), None]
+
+    failed = full_index_offers._index_partition("appsearch", "checkpoints", (offer.id, offer.id))
+
+    assert failed == []
+    assert backend.index_offers.call_count == 2
+    backend.index_offers.assert_called_with([offer], force=True)
+
+
+@mock.patch("pcapi.scripts.full_index_offers.RETRY_DELAY", 0)
+@mock.patch("pcapi.scripts.full_index_offers._get_backend")
+def test_index_partition_reports_batches_that_still_fail(mocked_get_backend, app):
+    offer = offers_factories.StockFactory().offer
+    backend = mocked_get_backend.return_value
+    backend.index_offers.side_effect = ValueError("It does not work")
+
+    failed = full_index_offers._index_partition("appsearch", "checkpoints", (offer.id, offer.id))
+
+    assert failed == [(offer.id, offer.id)]
+    assert backend.index_offers.call_count == full_index_offers.MAX_ATTEMPTS
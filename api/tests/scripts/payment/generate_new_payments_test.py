@@ -53,8 +53,8 @@ class GenerateNewPaymentsTest:
         # When
         n_queries = 1  # get_venue_ids_to_reimburse()
         n_queries += 1  # fetch custom reimbursement rules
-        n_queries += 1  # find_bookings_eligible_for_payment_for_venue()
-        n_queries += 1  # insert payments
+        n_queries += 1  # find_booking_rows_eligible_for_payment_for_venue()
+        # Payments are inserted with COPY, which is not captured here.
         n_queries += 1  # release savepoint (commit)
         n_queries += 1  # insert PENDING payment statuses
         n_queries += 1  # release savepoint (commit)
@@ -27,3 +27,40 @@ class GetBatchesTest:
     def test_empty(self):
         batches = db_utils.get_batches(users_models.User.query, users_models.User.id, 10)
         assert list(batches) == []
+
+
+@pytest.mark.usefixtures("db_session")
+class GetKeysetBatchesTest:
+    def test_basics(self):
+        users = users_factories.UserFactory.create_batch(5)
+        ids = [user.id for user in users]
+
+        batches = db_utils.get_keyset_batches(users_models.User.query, users_models.User.id, 2)
+
+        assert isinstance(batches, types.GeneratorType)
+        assert list(batches) == [ids[0:2], ids[2:4], ids[4:5]]
+
+    def test_filters_are_kept(self):
+        users = users_factories.UserFactory.create_batch(5)
+        query = users_models.User.query.filter(users_models.User.id != users[1].id)
+
+        batches = db_utils.get_keyset_batches(query, users_models.User.id, 2)
+
+        assert list(batches) == [[users[0].id, users[2].id], [users[3].id, users[4].id]]
+
+    def test_after_and_offset(self):
+        users = users_factories.UserFactory.create_batch(5)
+        ids = [user.id for user in users]
+
+        assert list(db_utils.get_keyset_batches(users_models.User.query, users_models.User.id, 2, after=ids[1])) == [
+            ids[2:4],
+            ids[4:5],
+        ]
+        assert list(db_utils.get_keyset_batches(users_models.User.query, users_models.User.id, 2, offset=3)) == [
+            ids[3:5]
+        ]
+        assert list(db_utils.get_keyset_batches(users_models.User.query, users_models.User.id, 2, offset=5)) == []
+
+    def test_empty(self):
+        batches = db_utils.get_keyset_batches(users_models.User.query, users_models.User.id, 10)
+        assert list(batches) == []